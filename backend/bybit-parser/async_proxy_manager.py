@@ -0,0 +1,364 @@
+"""
+Асинхронный вариант менеджера прокси на aiohttp
+Разделяет со своим синхронным предком список прокси, выбор прокси и статистику
+"""
+
+import asyncio
+import random
+import time
+from typing import Optional, Dict, Any, Tuple
+
+import json_backend
+from proxy_manager import ProxyManager
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp не установлен - работает только синхронный путь
+    aiohttp = None
+
+
+class AsyncResponse:
+    """
+    Минимальный ответ, совместимый с requests.Response в той части,
+    которую использует парсер (status_code, headers, content, json())
+    """
+
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self) -> Any:
+        return json_backend.loads(self.content)
+
+
+class AsyncProxyManager(ProxyManager):
+    """
+    Менеджер прокси с асинхронным make_request_async поверх aiohttp:
+    - Та же ротация, retry и fallback на DIRECT, что и в make_request
+    - Отдельная aiohttp-сессия с keep-alive коннектором на каждый прокси
+    - Счётчики новых/переиспользованных соединений через TraceConfig
+
+    Сессии aiohttp привязаны к event loop, поэтому make_request_async
+    должен вызываться из одного долгоживущего цикла (см. fetch_engine.py)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._async_sessions: Dict[str, Any] = {}
+        self._async_connection_stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def is_available() -> bool:
+        """Установлен ли aiohttp"""
+        return aiohttp is not None
+
+    def _create_trace_config(self, key: str):
+        """TraceConfig, считающий новые и переиспользованные соединения сессии"""
+        counters = self._async_connection_stats.setdefault(key, {
+            'requests': 0,
+            'new_connections': 0,
+            'reused_connections': 0
+        })
+
+        async def on_request_start(session, ctx, params):
+            counters['requests'] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            counters['new_connections'] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            counters['reused_connections'] += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def _get_async_session(self, proxy: Optional[Dict]):
+        """
+        Возвращает aiohttp-сессию для прокси (создаёт при первом обращении)
+
+        Args:
+            proxy: Словарь прокси или None для прямого подключения
+
+        Returns:
+            aiohttp.ClientSession с keep-alive коннектором
+        """
+        key = self._session_key(proxy)
+        session = self._async_sessions.get(key)
+        if session is not None and not session.closed:
+            return session
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_maxsize,
+            limit_per_host=self.pool_maxsize,
+            keepalive_timeout=60
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[self._create_trace_config(key)]
+        )
+        self._async_sessions[key] = session
+
+        if self.enable_logging:
+            print(f"[ProxyManager] Created async session for {key} (pool_maxsize={self.pool_maxsize})")
+
+        return session
+
+    async def _send_async(
+        self,
+        proxy: Optional[Dict],
+        method: str,
+        url: str,
+        **kwargs
+    ) -> AsyncResponse:
+        """Один HTTP-запрос через сессию прокси, тело читается целиком"""
+        session = self._get_async_session(proxy)
+
+        async with session.request(
+            method,
+            url,
+            proxy=proxy['http'] if proxy else None,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            **kwargs
+        ) as response:
+            content = await response.read()
+            return AsyncResponse(response.status, response.headers.copy(), content)
+
+    async def _send_hedged_async(
+        self,
+        proxy: Optional[Dict],
+        tried: set,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> Tuple[Optional[Dict], float, AsyncResponse]:
+        """
+        Асинхронный аналог _send_hedged: проигравший запрос отменяется
+
+        Returns:
+            (прокси победителя, время ответа, AsyncResponse)
+
+        Raises:
+            Исключение основного запроса, если не удался ни один
+        """
+        async def send(current_proxy: Optional[Dict]) -> Tuple:
+            await self._wait_rate_limit_async(current_proxy, url)
+            started = time.time()
+            try:
+                response = await self._send_async(current_proxy, method, url, **kwargs)
+                return (current_proxy, time.time() - started, response, None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                return (current_proxy, time.time() - started, None, e)
+
+        primary = asyncio.ensure_future(send(proxy))
+        secondary = None
+        hedge_proxy = None
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self._hedge_delay(proxy))
+
+            if not done and self._hedge_allowed():
+                hedge_proxy = self._select_hedge_proxy(proxy, tried)
+                secondary = asyncio.ensure_future(send(hedge_proxy))
+
+                if self.enable_logging:
+                    hedge_display = self._session_key(hedge_proxy)
+                    print(f"[ProxyManager] HEDGE: {self._session_key(proxy)} is slow, duplicating via {hedge_display}")
+
+                # Ждём первый успешный ответ или завершения обоих запросов
+                results = {}
+                winner = None
+                pending = {primary, secondary}
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        results[future] = future.result()
+                    winner = next((
+                        future for future in (primary, secondary)
+                        if future in results
+                        and results[future][2] is not None
+                        and results[future][2].status_code in [200, 201]
+                    ), None)
+
+                if winner is secondary:
+                    self._count('hedge_wins')
+
+                # Результат chosen учтёт make_request_async, остальные - здесь
+                chosen = winner or primary
+                for future, result in results.items():
+                    if future is not chosen:
+                        self._record_outcome(result, url)
+                outcome = results[chosen]
+            else:
+                outcome = await primary
+        finally:
+            # Проигравший запрос больше не нужен - отменяем и освобождаем пробный слот
+            for future, future_proxy in ((primary, proxy), (secondary, hedge_proxy)):
+                if future is not None and not future.done():
+                    future.cancel()
+                    self._release_proxy(future_proxy)
+
+        winner_proxy, response_time, response, error = outcome
+        if error is not None:
+            raise error
+        return winner_proxy, response_time, response
+
+    async def make_request_async(
+        self,
+        method: str,
+        url: str,
+        hedge: bool = False,
+        **kwargs
+    ) -> Optional[AsyncResponse]:
+        """
+        Асинхронный аналог make_request с автоматической ротацией прокси
+
+        Args:
+            method: HTTP метод (GET, POST, etc.)
+            url: URL для запроса
+            hedge: Хеджировать первую попытку дублем через другой прокси
+            **kwargs: Дополнительные параметры для aiohttp (json, headers, ...)
+
+        Returns:
+            AsyncResponse или None при неудаче
+        """
+        self._count('total_requests')
+        tried = set()
+
+        for attempt in range(self.max_retries):
+            proxy = self._select_proxy(exclude=tried)
+
+            if proxy:
+                tried.add(proxy['_meta']['display'])
+                self._count('proxy_requests')
+            else:
+                self._count('direct_requests')
+
+            try:
+                start_time = time.time()
+                if hedge and attempt == 0:
+                    proxy, response_time, response = await self._send_hedged_async(
+                        proxy, tried, method, url, **kwargs
+                    )
+                else:
+                    # Ждём токен rate limiter (не входит во время ответа прокси)
+                    await self._wait_rate_limit_async(proxy, url)
+                    start_time = time.time()
+                    response = await self._send_async(proxy, method, url, **kwargs)
+                    response_time = time.time() - start_time
+                self._record_result(proxy, response_time, response.status_code)
+                self._record_rate(proxy, url, response)
+
+                if response.status_code in [200, 201]:
+                    self._count('successful_requests')
+                    self._log_request(
+                        url=url,
+                        proxy=proxy,
+                        status="SUCCESS",
+                        status_code=response.status_code,
+                        response_time=response_time
+                    )
+                    return response
+
+                self._log_request(
+                    url=url,
+                    proxy=proxy,
+                    status="ERROR",
+                    status_code=response.status_code,
+                    error=f"HTTP {response.status_code}"
+                )
+
+                # 429 (rate limit) уже уменьшил скорость ведра в _record_rate:
+                # следующая попытка подождёт токен вместо слепой паузы
+
+            except asyncio.CancelledError:
+                # Отменённый запрос ничего не говорит о здоровье прокси
+                self._release_proxy(proxy)
+                raise
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._count('proxy_errors')
+                self._record_result(
+                    proxy,
+                    time.time() - start_time,
+                    timeout=isinstance(e, asyncio.TimeoutError)
+                )
+
+                self._log_request(
+                    url=url,
+                    proxy=proxy,
+                    status="ERROR",
+                    error=type(e).__name__
+                )
+
+                # Если это последняя попытка - пробуем без прокси
+                if attempt == self.max_retries - 1 and proxy:
+                    try:
+                        await self._wait_rate_limit_async(None, url)
+                        response = await self._send_async(None, method, url, **kwargs)
+                        self._record_rate(None, url, response)
+
+                        if response.status_code in [200, 201]:
+                            self._count('successful_requests')
+                            self._log_request(
+                                url=url,
+                                proxy=None,
+                                status="SUCCESS (FALLBACK)",
+                                status_code=response.status_code
+                            )
+                            return response
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        pass
+
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(random.uniform(1, 3))
+
+            except Exception as e:
+                self._record_result(proxy, time.time() - start_time)
+                self._log_request(
+                    url=url,
+                    proxy=proxy,
+                    status="ERROR",
+                    error=str(e)
+                )
+
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(random.uniform(1, 3))
+
+        print(f"[ProxyManager] ERROR: All {self.max_retries} attempts failed for {url}")
+        return None
+
+    async def _wait_rate_limit_async(self, proxy: Optional[Dict], url: str):
+        """Асинхронно ждёт токен в ведре прокси и хоста перед запросом"""
+        wait = self._reserve_rate_limit(proxy, url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _is_timeout(self, error: Optional[BaseException]) -> bool:
+        """Таймаут синхронного (requests) или асинхронного (aiohttp) запроса"""
+        return super()._is_timeout(error) or isinstance(error, asyncio.TimeoutError)
+
+    def _get_connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """Счётчики соединений синхронных и асинхронных сессий вместе"""
+        result = super()._get_connection_stats()
+
+        for key, counters in self._async_connection_stats.items():
+            merged = result.setdefault(key, {
+                'requests': 0,
+                'new_connections': 0,
+                'reused_connections': 0
+            })
+            for name, value in counters.items():
+                merged[name] += value
+
+        return result
+
+    async def close_async(self):
+        """Закрывает все aiohttp-сессии (вызывать из того же event loop)"""
+        for session in self._async_sessions.values():
+            if not session.closed:
+                await session.close()
+        self._async_sessions.clear()
@@ -0,0 +1,130 @@
+"""
+Лента изменений стакана (?since=<seq>)
+Каждая публикация стакана стороны получает следующий номер версии (seq) и дельту
+к предыдущей версии по id оффера: добавленные, удалённые и изменившиеся офферы.
+Последние дельты хранятся в кольцевом буфере, клиент с известной версией получает
+только дельты после неё, а слишком отставший - полный стакан.
+Ожидающие новую версию (long-poll ?wait=) ждут одно условие ленты и просыпаются
+одним notify_all при публикации
+"""
+
+import threading
+import time
+from collections import deque
+from operator import attrgetter
+from typing import Any, Dict, List, Optional
+
+from models import Offer
+
+# Поля оффера, изменение которых - новая версия стакана (то же, что хранит БД).
+# Стакан, перечитанный из БД, с теми же значениями - та же версия, а не пустая дельта
+CONTENT_FIELDS = (
+    'price', 'quantity', 'min_amount', 'max_amount', 'maker', 'maker_id', 'payment_methods',
+    'completion_rate', 'total_orders', 'is_merchant', 'merchant_type', 'is_online', 'is_triangle'
+)
+
+offer_content = attrgetter(*CONTENT_FIELDS)
+
+
+def diff_offers(previous: Dict[str, Offer], current: Dict[str, Offer]) -> Dict[str, Any]:
+    """
+    Дельта между версиями стакана по id оффера
+
+    Returns:
+        {'added': [Offer], 'removed': [id], 'changed': [Offer]}:
+        changed - офферы, у которых изменилось поле из CONTENT_FIELDS (цена, количество, лимиты, ...)
+    """
+    added = []
+    changed = []
+    for offer_id, offer in current.items():
+        before = previous.get(offer_id)
+        if before is None:
+            added.append(offer)
+        elif offer_content(before) != offer_content(offer):
+            changed.append(offer)
+
+    removed = [offer_id for offer_id in previous if offer_id not in current]
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+class BookFeed:
+    """
+    Версии и дельты стакана одной стороны рынка
+
+    Номера версий начинаются с времени создания ленты в миллисекундах * 1000:
+    после перезапуска или на другом инстансе старые номера клиента не совпадают
+    с номерами ленты, и клиент получает полный стакан, а не чужие дельты
+    """
+
+    def __init__(self, capacity: int = 64):
+        """
+        Args:
+            capacity: Сколько последних дельт хранить
+        """
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.deltas: deque = deque(maxlen=capacity)
+        self.offers: Dict[str, Offer] = {}
+        self.seq = int(time.time() * 1000) * 1000
+        self.has_book = False
+        self.checked_at = 0.0
+
+    def publish(self, offers: List[Offer]) -> int:
+        """
+        Новая версия стакана: считает дельту к предыдущей и будит ожидающих.
+        Стакан без изменений (пустая дельта) версию не меняет и никого не будит
+
+        Returns:
+            Номер версии (seq)
+        """
+        current = {offer.id: offer for offer in offers}
+        with self.lock:
+            if self.has_book:
+                delta = diff_offers(self.offers, current)
+                if not (delta['added'] or delta['removed'] or delta['changed']):
+                    self.offers = current
+                    return self.seq
+                delta['seq'] = self.seq + 1
+                self.deltas.append(delta)
+            self.seq += 1
+            self.offers = current
+            self.has_book = True
+            self.changed.notify_all()
+            return self.seq
+
+    def wait(self, seq: int, timeout: float) -> bool:
+        """
+        Ждёт версию новее seq не дольше timeout секунд
+
+        Returns:
+            True, если новая версия опубликована
+        """
+        with self.changed:
+            return self.changed.wait_for(lambda: self.seq > seq, timeout)
+
+    def claim_check(self, interval: float) -> bool:
+        """
+        Очередь проверки источника новых версий среди ожидающих:
+        True получает один ожидающий не чаще раза в interval секунд
+        """
+        now = time.monotonic()
+        with self.lock:
+            if now - self.checked_at < interval:
+                return False
+            self.checked_at = now
+            return True
+
+    def since(self, seq: int, upto: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Дельты версий (seq, upto] по порядку
+
+        Returns:
+            Список дельт ([] - версия клиента актуальна) или None,
+            если нужных дельт уже (или ещё) нет в буфере - нужен полный стакан
+        """
+        with self.lock:
+            if seq == upto:
+                return []
+            if seq > upto or not self.deltas or self.deltas[0]['seq'] > seq + 1:
+                return None
+            return [delta for delta in self.deltas if seq < delta['seq'] <= upto]
@@ -0,0 +1,121 @@
+"""
+Метрики стакана для лёгкого ответа ?metrics=true
+Лучшая цена, VWAP для лестницы сумм, кривая глубины и лучшая цена по способам
+оплаты считаются одним проходом по стакану от лучшей цены к худшей:
+префиксные суммы объёма и количества, суммы лестницы - бинарным поиском по ним
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from order_book import OrderBook
+
+# Уровни кривой глубины: % от лучшей цены
+DEPTH_PERCENTS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+
+def ladder_vwap(price: np.ndarray, liquidity: np.ndarray, amounts: Sequence[float]) -> List[Dict[str, Any]]:
+    """
+    VWAP для каждой суммы лестницы (как OrderBook.vwap, но за один проход)
+
+    Args:
+        price, liquidity: Цены и доступный объём офферов от лучшей цены к худшей
+        amounts: Суммы сделки в фиате
+
+    Returns:
+        [{'amount', 'price'}, ...]; price = None, если ликвидности не хватает
+    """
+    if not len(amounts):
+        return []
+    amounts = np.asarray(amounts, dtype=np.float64)
+    count = len(price)
+    if not count:
+        return [{'amount': float(amount), 'price': None} for amount in amounts]
+
+    filled = np.cumsum(liquidity)
+    bought = np.cumsum(liquidity / price)
+
+    # Оффер, на котором набирается сумма: первый с накопленным объёмом >= суммы
+    position = np.searchsorted(filled, amounts - 1e-9, side='left')
+    last = np.minimum(position, count - 1)
+    filled_before = np.where(last > 0, filled[last - 1], 0.0)
+    bought_before = np.where(last > 0, bought[last - 1], 0.0)
+    vwap = amounts / (bought_before + (amounts - filled_before) / price[last])
+
+    return [
+        {'amount': float(amount), 'price': float(value) if fits else None}
+        for amount, value, fits in zip(amounts, vwap, position < count)
+    ]
+
+
+def depth_curve(book: OrderBook, indices: np.ndarray, liquidity: np.ndarray,
+                percents: Sequence[float] = DEPTH_PERCENTS) -> List[Dict[str, Any]]:
+    """
+    Накопленная глубина в пределах percent % от лучшей цены для каждого уровня
+
+    Returns:
+        [{'percent', 'price' (граница), 'offers', 'quantity', 'amount'}, ...]
+    """
+    if not len(indices):
+        return []
+
+    price = book.price[indices]
+    best = price[0]
+    quantity = np.cumsum(book.quantity[indices])
+    amount = np.cumsum(liquidity)
+
+    # Ключ сортировки по возрастанию: цена продавцов, минус цена покупателей
+    sign = 1.0 if book.side == 'sell' else -1.0
+    limits = np.array([best * (1 + sign * percent / 100) for percent in percents])
+    counts = np.searchsorted(sign * price, sign * limits, side='right')
+
+    return [
+        {
+            'percent': float(percent),
+            'price': round(float(limit), 2),
+            'offers': int(count),
+            'quantity': float(quantity[count - 1]),
+            'amount': float(amount[count - 1])
+        }
+        for percent, limit, count in zip(percents, limits, counts)
+    ]
+
+
+def book_metrics(book: OrderBook, ladder: Sequence[float], mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Метрики стакана (или его части под маской фильтров)
+
+    Args:
+        book: Стакан стороны
+        ladder: Суммы сделки в фиате для VWAP
+        mask: Маска фильтров (None - весь стакан)
+
+    Returns:
+        {'best_price', 'offers', 'liquidity', 'vwap', 'depth', 'payments'}:
+        payments - лучшая цена, число офферов, объём и VWAP по каждому способу оплаты
+    """
+    indices = book.indices(mask)
+    liquidity = book.liquidity(indices)
+
+    payments = {}
+    for name, payment_mask in book.payment_index.items():
+        selected = book.indices(payment_mask if mask is None else payment_mask & mask)
+        if not len(selected):
+            continue
+        selected_liquidity = book.liquidity(selected)
+        payments[name] = {
+            'best_price': float(book.price[selected[0]]),
+            'offers': int(len(selected)),
+            'liquidity': float(selected_liquidity.sum()),
+            'vwap': ladder_vwap(book.price[selected], selected_liquidity, ladder)
+        }
+
+    return {
+        'best_price': float(book.price[indices[0]]) if len(indices) else None,
+        'offers': int(len(indices)),
+        'liquidity': float(liquidity.sum()),
+        'vwap': ladder_vwap(book.price[indices], liquidity, ladder),
+        'depth': depth_curve(book, indices, liquidity),
+        'payments': payments
+    }
@@ -0,0 +1,226 @@
+"""
+Фильтрация и постраничная выдача стакана по параметрам запроса
+Отвечает из OrderBook в памяти: payment, merchant_type, online, amount,
+min_completion и limit/cursor без полного перебора офферов,
+а metrics=true - метриками стакана (book_metrics) вместо офферов.
+since=<seq> - запрос ленты изменений (дельты после версии клиента, см. book_feed)
+"""
+
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from book_metrics import book_metrics
+from models import PAYMENT_METHOD_MAP
+from order_book import OTHER_PAYMENT, OrderBook
+
+# Параметры фильтров (query string)
+FILTER_PARAMS = ('payment', 'merchant_type', 'online', 'amount', 'min_completion')
+
+MERCHANT_TYPES = ('gold', 'silver', 'bronze', 'merchant', 'none')
+
+# Значения limit, которые выбирают режим загрузки, а не размер страницы
+LOAD_MODES = ('quick', 'full')
+
+# ID способов оплаты Bybit по названию (для фильтра в payload Bybit)
+PAYMENT_IDS = {name: payment_id for payment_id, name in PAYMENT_METHOD_MAP.items()}
+
+# Сколько сумм можно передать в amounts (лестница VWAP)
+MAX_LADDER_AMOUNTS = 20
+
+
+class BookQuery:
+    """
+    Фильтр и страница стакана
+
+    cursor - смещение в отфильтрованном стакане (от лучшей цены к худшей),
+    next_cursor из ответа передаётся в следующий запрос.
+    metrics - лестница сумм VWAP, если запрошены метрики (тогда без офферов и пагинации).
+    since - версия стакана клиента для ленты изменений (только без фильтров, пагинации и метрик)
+    """
+
+    __slots__ = ('filters', 'limit', 'cursor', 'metrics', 'since')
+
+    def __init__(self, filters: Dict[str, Any], limit: Optional[int] = None, cursor: int = 0,
+                 metrics: Optional[Tuple[float, ...]] = None, since: Optional[int] = None):
+        self.filters = filters
+        self.limit = limit
+        self.cursor = cursor
+        self.metrics = metrics
+        self.since = since
+
+    @classmethod
+    def from_params(cls, params: Dict[str, str], max_limit: int, ladder: Sequence[float] = ()) -> Optional['BookQuery']:
+        """
+        Разбирает параметры запроса
+
+        Args:
+            params: queryStringParameters
+            max_limit: Максимальный размер страницы
+            ladder: Лестница сумм VWAP рынка для metrics=true (amounts её заменяет)
+
+        Returns:
+            BookQuery или None, если фильтров, пагинации, метрик и since в запросе нет
+
+        Raises:
+            ValueError: Некорректное значение параметра
+        """
+        filters: Dict[str, Any] = {}
+
+        payment = params.get('payment')
+        if payment:
+            # Названия или ID Bybit через запятую: payment=Sberbank,378
+            names = [PAYMENT_METHOD_MAP.get(value.strip(), value.strip()) for value in payment.split(',')]
+            names = [name for name in names if name]
+            if not names:
+                raise ValueError('payment must list payment methods by name or Bybit ID')
+            unknown = [name for name in names if name not in PAYMENT_IDS and name != OTHER_PAYMENT]
+            if unknown:
+                # Неизвестное название совпало бы с любым способом вне PAYMENT_METHOD_MAP (бит 'other')
+                raise ValueError(f'unknown payment method: {", ".join(unknown)} (use a name or Bybit ID, or {OTHER_PAYMENT})')
+            filters['payment'] = names
+
+        merchant_type = params.get('merchant_type')
+        if merchant_type:
+            merchant_type = merchant_type.strip().lower()
+            if merchant_type not in MERCHANT_TYPES:
+                raise ValueError(f'merchant_type must be one of {", ".join(MERCHANT_TYPES)}')
+            filters['merchant_type'] = merchant_type
+
+        online = params.get('online')
+        if online:
+            if online not in ('true', 'false'):
+                raise ValueError('online must be true or false')
+            filters['online'] = online == 'true'
+
+        amount = params.get('amount')
+        if amount:
+            try:
+                filters['amount'] = float(amount)
+            except ValueError:
+                raise ValueError('amount must be a number')
+            if filters['amount'] <= 0:
+                raise ValueError('amount must be positive')
+
+        min_completion = params.get('min_completion')
+        if min_completion:
+            try:
+                filters['min_completion'] = int(min_completion)
+            except ValueError:
+                raise ValueError('min_completion must be an integer')
+
+        limit = params.get('limit')
+        if limit in LOAD_MODES:
+            limit = None
+        if limit:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ValueError(f'limit must be an integer (1-{max_limit}) or one of {", ".join(LOAD_MODES)}')
+            if not 1 <= limit <= max_limit:
+                raise ValueError(f'limit must be between 1 and {max_limit}')
+
+        cursor = params.get('cursor')
+        if cursor:
+            try:
+                cursor = int(cursor)
+            except ValueError:
+                raise ValueError('cursor must be a value of next_cursor')
+            if cursor < 0:
+                raise ValueError('cursor must be a value of next_cursor')
+
+        metrics = params.get('metrics')
+        if metrics and metrics not in ('true', 'false'):
+            raise ValueError('metrics must be true or false')
+        metrics = tuple(ladder) if metrics == 'true' else None
+
+        amounts = params.get('amounts')
+        if amounts:
+            if metrics is None:
+                raise ValueError('amounts requires metrics=true')
+            try:
+                metrics = tuple(float(value) for value in amounts.split(','))
+            except ValueError:
+                raise ValueError('amounts must be comma-separated numbers')
+            if not 1 <= len(metrics) <= MAX_LADDER_AMOUNTS or min(metrics) <= 0:
+                raise ValueError(f'amounts must be 1-{MAX_LADDER_AMOUNTS} positive numbers')
+
+        since = params.get('since')
+        if since:
+            try:
+                since = int(since)
+            except ValueError:
+                raise ValueError('since must be a value of seq')
+            if since < 0:
+                raise ValueError('since must be a value of seq')
+            if filters or limit or cursor or metrics is not None:
+                raise ValueError('since cannot be combined with filters, limit, cursor or metrics')
+        else:
+            since = None
+
+        if not filters and not limit and not cursor and metrics is None and since is None:
+            return None
+
+        return cls(filters, limit or None, cursor or 0, metrics, since)
+
+    def run(self, book: OrderBook) -> Dict[str, Any]:
+        """
+        Выполняет запрос по стакану
+
+        Returns:
+            Поля ответа: offers (страница), total (всего подходящих),
+            side, filters, next_cursor (None на последней странице).
+            С metrics - side, filters и metrics (book_metrics)
+        """
+        if self.metrics is not None:
+            return {
+                'side': book.side,
+                'filters': self.filters,
+                'metrics': book_metrics(book, self.metrics, self.mask(book))
+            }
+
+        indices = book.indices(self.mask(book))
+        page, next_cursor = self.page(indices)
+        offers = book.offers
+
+        return {
+            'offers': [offers[i] for i in page],
+            'total': len(indices),
+            'side': book.side,
+            'filters': self.filters,
+            'next_cursor': next_cursor
+        }
+
+    def upstream(self) -> Optional[Dict[str, Any]]:
+        """
+        Фильтры, которые можно передать Bybit в payload item/online
+
+        Returns:
+            {'payment': [ID], 'amount': 'сумма'} или None, если передавать нечего.
+            payment передаётся, только если все способы известны (есть ID Bybit)
+        """
+        upstream: Dict[str, Any] = {}
+
+        payment = self.filters.get('payment')
+        if payment and all(name in PAYMENT_IDS for name in payment):
+            upstream['payment'] = sorted({PAYMENT_IDS[name] for name in payment})
+
+        amount = self.filters.get('amount')
+        if amount is not None:
+            upstream['amount'] = str(int(amount)) if amount.is_integer() else str(amount)
+
+        return upstream or None
+
+    def mask(self, book: OrderBook) -> Optional[np.ndarray]:
+        """Маска фильтров по стакану (None - фильтров нет)"""
+        return book.mask(**self.filters) if self.filters else None
+
+    def page(self, items: Sequence[Any]) -> Tuple[Sequence[Any], Optional[str]]:
+        """
+        Страница последовательности (список офферов, массив индексов) по limit/cursor
+
+        Returns:
+            (элементы страницы, next_cursor или None на последней странице)
+        """
+        end = len(items) if self.limit is None else min(self.cursor + self.limit, len(items))
+        return items[self.cursor:end], (str(end) if end < len(items) else None)
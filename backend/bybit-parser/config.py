@@ -21,6 +21,20 @@ MAX_RETRIES = 2
 # С 5 прокси можем делать запросы быстрее
 REQUEST_DELAY_RANGE = (0.2, 0.5)
 
+# Token bucket на каждый прокси и на хост (см. rate_limiter.py)
+# Базовая скорость прокси - один запрос за средний REQUEST_DELAY_RANGE.
+# 429 уменьшает скорость (decrease_factor), каждый успех возвращает recovery_step
+RATE_LIMIT_CONFIG = {
+    'proxy_rate': 2 / sum(REQUEST_DELAY_RANGE),  # ~5.7 запроса/сек через один прокси
+    'proxy_burst': 5,                             # Всплеск через один прокси
+    'host_rate': 20.0,                            # Суммарно на api2.bybit.com
+    'host_burst': 10,
+    'decrease_factor': 0.5,                       # Скорость прокси x0.5 на каждый 429
+    'host_decrease_factor': 0.8,                  # Скорость хоста x0.8 на каждый 429
+    'recovery_step': 0.05,                        # +5% максимума за успешный ответ
+    'min_rate_ratio': 0.1                         # Не ниже 10% максимума
+}
+
 # Вероятность использования прокси (0.0 - 1.0)
 # 0.95 = 95% запросов через прокси (равномерно распределяем нагрузку)
 PROXY_USE_PROBABILITY = 0.95
@@ -28,5 +42,172 @@ PROXY_USE_PROBABILITY = 0.95
 # Параллельная загрузка страниц (количество одновременных запросов)
 PARALLEL_REQUESTS = 5  # У нас 5 прокси - используем все
 
+# Адаптивный выбор прокси (см. proxy_health.py)
+# Прокси с breaker в состоянии OPEN пропускаются до окончания остывания
+PROXY_HEALTH_CONFIG = {
+    'ewma_alpha': 0.3,          # Вес нового замера в EWMA задержки и доли успехов
+    'failure_threshold': 3,     # Ошибок подряд до открытия circuit breaker
+    'cooldown': 30.0,           # Начальное остывание breaker (секунды)
+    'max_cooldown': 300.0,      # Максимальное остывание при повторных срывах
+    'window': 60.0,             # Окно учёта недавних 429 и таймаутов (секунды)
+    'initial_latency': 1.0      # Оценка задержки нового прокси (секунды)
+}
+
+# Хеджирование отстающих страниц (opt-in, только FULL mode)
+# Если прокси не ответил за percentile своей задержки, дубль уходит через другой прокси
+HEDGE_ENABLED = False
+HEDGE_CONFIG = {
+    'percentile': 0.9,      # Порог - p90 задержки успешных ответов прокси
+    'max_ratio': 0.1,       # Не больше 10% запросов получают дубль
+    'default_delay': 3.0,   # Порог для прокси без истории (секунды)
+    'min_delay': 0.5,       # Нижняя граница порога (секунды)
+    'min_samples': 10       # Замеров до использования перцентиля
+}
+
+# Движок загрузки страниц: 'async' (aiohttp, скользящее окно) или 'threads'
+# Без установленного aiohttp автоматически используется 'threads'
+FETCH_ENGINE = 'async'
+
+# Keep-alive пул соединений на каждый прокси (и на DIRECT)
+# Все запросы идут на один хост (api2.bybit.com), поэтому пул хостов маленький,
+# а размер пула покрывает все параллельные запросы через один прокси
+HTTP_POOL_CONNECTIONS = 2
+HTTP_POOL_MAXSIZE = PARALLEL_REQUESTS
+
+# Режим хранения офферов в БД:
+# 'snapshot' - каждое обновление пишет новый снимок, указатель в update_metadata
+#              переключается атомарно (читатели не конкурируют с писателем)
+# 'incremental' - пишутся только новые/изменившиеся/исчезнувшие офферы (по content_hash)
+# 'replace' - сторона перезаписывается целиком
+DB_STORAGE_MODE = 'snapshot'
+
+# Сколько последних снимков каждой стороны хранить (режим 'snapshot')
+SNAPSHOT_RETENTION = 3
+
+# Максимум соединений в пуле Postgres (ThreadedConnectionPool): БД одновременно
+# используют поток запроса, фоновые обновления (stale-while-revalidate) и ожидающие long-poll.
+# При исчерпании пула открывается отдельное соединение
+DB_POOL_MAXCONN = 8
+
+# История стакана (p2p_offer_snapshots + book_summary, секции по дням)
+# Пишется при каждой полной записи стакана в той же транзакции; старые секции
+# удаляет POST action=prune_history (раз в сутки по расписанию)
+HISTORY_CONFIG = {
+    'enabled': True,
+    'raw_retention_days': 7,        # Офферы каждого обновления
+    'summary_retention_days': 180,  # Сводки (лучшая цена, глубина, спред)
+    'days_ahead': 2                 # Секции создаются заранее
+}
+
+# Метрики стакана (?metrics=true): VWAP для лестницы сумм в фиате рынка
+# (?amounts=500000 заменяет лестницу), кривая глубины, лучшая цена по способам оплаты.
+# Для фиата без своей лестницы берётся лестница RUB
+METRICS_CONFIG = {
+    'vwap_ladders': {
+        'RUB': [10000, 50000, 100000, 250000, 500000, 1000000],
+        'KZT': [50000, 250000, 500000, 1250000, 2500000, 5000000],
+        'UAH': [5000, 20000, 50000, 100000, 250000, 500000]
+    }
+}
+
+# Лента изменений стакана (?since=<seq>): дельты между версиями стакана стороны.
+# Клиент, отставший больше чем на capacity версий, получает полный стакан
+FEED_CONFIG = {
+    'capacity': 64              # Сколько последних дельт хранить на сторону рынка
+}
+
+# Long-poll (?wait=<секунды>): запрос ждёт новую версию стакана стороны и отдаёт её
+# (с since - дельтами). Ожидающие в процессе просыпаются от одной публикации, а один
+# из них раз в poll_seconds проверяет БД (стакан, записанный другим инстансом)
+# и запускает фоновое обновление, если стакан пора обновлять
+PUSH_CONFIG = {
+    'enabled': True,
+    'max_wait_seconds': 25,     # Должно быть меньше таймаута функции
+    'poll_seconds': 5
+}
+
+# История цен и спреда (?history=spread|price|depth&window=24h&step=5m)
+# Ряды строятся из минутных роллапов book_rollup_minute, результаты - в LRU-кеше
+HISTORY_QUERY_CONFIG = {
+    'max_points': 2000,         # Точек в ряду (window / step)
+    'max_window_days': 30,      # Максимальное окно
+    'cache_size': 128,          # Результатов в LRU-кеше
+    'cache_ttl_seconds': 30     # Последний шаг ряда дописывается с каждым обновлением
+}
+
+# Уровень gzip для тел ответов со стаканом (1-9), сжатие строится один раз при заполнении кеша
+RESPONSE_GZIP_LEVEL = 6
+
+# JSON-бэкенд: 'auto' (orjson > msgspec > json), 'orjson', 'msgspec' или 'json'
+# Страницы Bybit декодируются в типизированные структуры, если установлен msgspec
+JSON_BACKEND = 'auto'
+
+# Максимальный размер страницы при фильтрации стакана (?limit=N&cursor=...)
+QUERY_MAX_LIMIT = 500
+
+# Матрица рынков P2P: tokenId x currencyId Bybit (?token=BTC&fiat=KZT)
+# weight - доля ёмкости прокси (страниц) рынка при фоновом обновлении,
+# max_pages - страниц на сторону за одно обновление
+MARKETS = [
+    {'token': 'USDT', 'fiat': 'RUB', 'weight': 16, 'max_pages': 8},
+    {'token': 'BTC', 'fiat': 'RUB', 'weight': 3, 'max_pages': 3},
+    {'token': 'ETH', 'fiat': 'RUB', 'weight': 2, 'max_pages': 2},
+    {'token': 'USDT', 'fiat': 'KZT', 'weight': 4, 'max_pages': 4},
+    {'token': 'USDT', 'fiat': 'UAH', 'weight': 4, 'max_pages': 4},
+    {'token': 'BTC', 'fiat': 'KZT', 'weight': 1, 'max_pages': 2},
+    {'token': 'BTC', 'fiat': 'UAH', 'weight': 1, 'max_pages': 2},
+    {'token': 'ETH', 'fiat': 'KZT', 'weight': 1, 'max_pages': 2},
+    {'token': 'ETH', 'fiat': 'UAH', 'weight': 1, 'max_pages': 2}
+]
+
+# Загрузка стороны рынка: полная - до max_pages рынка из MARKETS с записью в БД,
+# quick (?limit=quick) - только первые страницы без записи, для быстрого ответа
+BOOK_FETCH_CONFIG = {
+    'timeout_seconds': 15,        # Общий таймаут полной загрузки всех страниц
+    'quick_max_pages': 2,         # Страниц в quick mode (топ-200)
+    'quick_timeout_seconds': 5
+}
+
+# Фоновое обновление рынков (POST action=refresh_markets, например по cron)
+# Стороны рынков выбираются stride-планировщиком: каждый получает долю страниц
+# по weight, редкие рынки не голодают, горячие обновляются чаще
+MARKET_SCHEDULER_CONFIG = {
+    'page_budget': 24,            # Страниц Bybit на один вызов (все рынки)
+    'time_budget_seconds': 20,    # Дедлайн обновления в одном вызове
+    'min_interval_seconds': 60    # Сторона рынка обновляется не чаще
+}
+
+# Схлопывание конкурентных обновлений стакана: в процессе одна загрузка
+# на рынок/сторону (остальные ждут её результат), между инстансами - advisory lock
+# Postgres (инстансы без блокировки отдают устаревший стакан из памяти или БД)
+SINGLE_FLIGHT_CONFIG = {
+    'lock_enabled': True,       # Advisory lock между инстансами
+    'wait_timeout_seconds': 30  # Сколько ждать чужую загрузку, потом - устаревший стакан
+}
+
+# Stale-while-revalidate: если стакан пора обновлять, запрос сразу получает
+# последний стакан (X-Cache: STALE-REVALIDATING), а загрузка с Bybit идёт в фоне
+# 'thread' - фоновый поток в этом инстансе, 'scheduled' - только плановый
+# вызов action=refresh_markets. Стакан старше max_stale_seconds грузится синхронно
+STALE_WHILE_REVALIDATE_CONFIG = {
+    'enabled': True,
+    'mode': 'thread',
+    'max_stale_seconds': 900
+}
+
+# Точечная загрузка под фильтры запроса: payment/amount уходят в payload Bybit,
+# узкий запрос занимает 1-2 страницы вместо 8. Результат кешируется по ключу
+# фильтра со своим TTL и вливается в общий стакан в памяти
+TARGETED_FETCH_CONFIG = {
+    'enabled': True,
+    'max_pages': 2,             # Страниц на один фильтр
+    'timeout_seconds': 5,       # Общий таймаут загрузки
+    'ttl_seconds': {            # TTL ключа - минимальный по фильтрам в нём
+        'payment': 30,
+        'amount': 15            # Лимиты и остатки офферов меняются чаще состава способов оплаты
+    },
+    'max_keys': 64              # Ключей фильтров в памяти (старые вытесняются)
+}
+
 # Включить логирование прокси
 ENABLE_PROXY_LOGGING = True
\ No newline at end of file
@@ -1,27 +1,51 @@
+import hashlib
+import io
 import os
 import psycopg2
 import psycopg2.extras
 import psycopg2.pool
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-from decimal import Decimal
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Optional
+from datetime import date, datetime, timedelta
+
+from models import DEFAULT_MARKET, Market, Offer
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     _pool = None
     
-    def __init__(self):
+    # Режимы хранения офферов (см. store_offers)
+    STORAGE_MODES = ('snapshot', 'incremental', 'replace')
+    
+    def __init__(self, storage_mode: str = 'snapshot', snapshot_retention: int = 3, pool_maxconn: int = 8):
+        """
+        Args:
+            storage_mode: 'snapshot' - версионированные снимки с указателем,
+                          'incremental' - синхронизация p2p_offers по content_hash,
+                          'replace' - перезапись стороны в p2p_offers целиком
+            snapshot_retention: Сколько последних снимков стороны хранить
+            pool_maxconn: Максимум соединений в пуле (пул общий для процесса, создаётся первым экземпляром)
+        """
+        if storage_mode not in self.STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {storage_mode}")
+        
         self.dsn = os.environ.get('DATABASE_URL')
         self.schema = os.environ.get('MAIN_DB_SCHEMA', 't_p69186337_bybit_p2p_scraper')
+        self.storage_mode = storage_mode
+        self.snapshot_retention = max(snapshot_retention, 1)
         
-        # Инициализируем connection pool один раз
+        # Дни, для которых секции истории уже есть в БД (см. _ensure_history_partition)
+        self._history_days = set()
+        
+        # Инициализируем connection pool один раз. Соединения берут поток запроса,
+        # фоновые обновления и ожидающие long-poll - нужен потокобезопасный пул
         if DatabaseManager._pool is None:
             try:
-                DatabaseManager._pool = psycopg2.pool.SimpleConnectionPool(
+                DatabaseManager._pool = psycopg2.pool.ThreadedConnectionPool(
                     minconn=1,
-                    maxconn=3,  # Ограничиваем максимум 3 соединения
+                    maxconn=max(pool_maxconn, 1),
                     dsn=self.dsn
                 )
                 logger.info("Database connection pool created")
@@ -34,7 +58,7 @@ class DatabaseManager:
             try:
                 return DatabaseManager._pool.getconn()
             except Exception as e:
-                logger.error(f"Failed to get connection from pool: {e}")
+                logger.warning(f"Failed to get connection from pool: {e}")
                 # Fallback к прямому подключению
                 return psycopg2.connect(self.dsn)
         return psycopg2.connect(self.dsn)
@@ -43,6 +67,9 @@ class DatabaseManager:
         if DatabaseManager._pool:
             try:
                 DatabaseManager._pool.putconn(conn)
+            except psycopg2.pool.PoolError:
+                # Соединение открыто мимо пула (пул был исчерпан) - просто закрываем
+                conn.close()
             except Exception as e:
                 logger.error(f"Failed to return connection to pool: {e}")
                 try:
@@ -55,71 +82,414 @@ class DatabaseManager:
             except:
                 pass
     
-    def save_offers(self, offers: List[Dict[str, Any]], side: str) -> int:
-        """Сохранение офферов в базу данных. Возвращает количество сохраненных записей."""
+    # Колонки p2p_offers, которые пишет парсер (порядок = порядок значений в строке)
+    OFFER_COLUMNS = (
+        'id', 'token', 'fiat', 'side', 'price', 'min_amount', 'max_amount', 'available_amount',
+        'nickname', 'maker_id', 'is_merchant', 'merchant_type', 'is_online', 'is_triangle',
+        'completion_rate', 'completed_orders', 'payment_methods', 'content_hash',
+        'updated_at'
+    )
+    
+    # Знаков после запятой в колонках офферов: price - DECIMAL(10, 2),
+    # min_amount/max_amount/available_amount - NUMERIC(28, 8) (V0011, дробные BTC/ETH)
+    PRICE_SCALE = 2
+    AMOUNT_SCALE = 8
+    
+    @classmethod
+    def _offer_hash(cls, offer: Offer) -> str:
+        """
+        Хеш содержимого оффера (всё, кроме id/рынка/side/updated_at).
+        Числа округляются до точности колонок, чтобы шум float не менял хеш.
+        maker_id (V0012) входит в хеш: строки, записанные до миграции без ID,
+        перезаписываются первой синхронизацией.
+        """
+        payload = '|'.join((
+            f"{offer.price:.{cls.PRICE_SCALE}f}",
+            f"{offer.min_amount:.{cls.AMOUNT_SCALE}f}",
+            f"{offer.max_amount:.{cls.AMOUNT_SCALE}f}",
+            f"{offer.quantity:.{cls.AMOUNT_SCALE}f}",
+            str(offer.maker),
+            str(offer.maker_id or ''),
+            str(bool(offer.is_merchant)),
+            str(offer.merchant_type),
+            str(bool(offer.is_online)),
+            str(bool(offer.is_triangle)),
+            str(offer.completion_rate),
+            str(offer.total_orders),
+            ','.join(offer.payment_methods or [])
+        ))
+        return hashlib.md5(payload.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def _offer_row(cls, offer: Offer, side: str, updated_at: datetime, market: Market = DEFAULT_MARKET) -> tuple:
+        """Преобразует оффер в кортеж значений в порядке OFFER_COLUMNS."""
+        return (
+            offer.id,
+            market.token,
+            market.fiat,
+            side,
+            offer.price,
+            offer.min_amount,
+            offer.max_amount,
+            offer.quantity,
+            offer.maker,
+            offer.maker_id or None,
+            offer.is_merchant,
+            offer.merchant_type,
+            offer.is_online,
+            offer.is_triangle,
+            offer.completion_rate,
+            offer.total_orders,
+            ','.join(offer.payment_methods) if offer.payment_methods else None,
+            cls._offer_hash(offer),
+            updated_at
+        )
+    
+    @staticmethod
+    def _copy_value(value: Any) -> str:
+        """Значение в текстовом формате COPY (NULL = \\N, спецсимволы экранируются)."""
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return (
+            str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r')
+        )
+    
+    def _copy_rows(self, cur, table: str, columns: tuple, rows: List[tuple]):
+        """Загружает строки в таблицу одним COPY FROM STDIN."""
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(self._copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        cur.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN",
+            buffer
+        )
+    
+    def _unique_offer_rows(self, offers: List[Offer], side: str, market: Market = DEFAULT_MARKET) -> List[tuple]:
+        """
+        Строки для записи в порядке OFFER_COLUMNS.
+        Дубликаты id (сдвиг страниц во время загрузки) отбрасываются.
+        """
+        now = datetime.now()
+        seen = set()
+        rows = []
+        for offer in offers:
+            if offer.id in seen:
+                continue
+            seen.add(offer.id)
+            rows.append(self._offer_row(offer, side, now, market))
+        return rows
+    
+    def _stage_rows(self, cur, rows: List[tuple]):
+        """Загружает строки во временную staging-таблицу текущего соединения."""
+        # Временная таблица живёт в сессии соединения из пула и очищается на COMMIT
+        cur.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS p2p_offers_staging
+            (LIKE {self.schema}.p2p_offers INCLUDING DEFAULTS)
+            ON COMMIT DELETE ROWS
+        """)
+        self._copy_rows(cur, 'p2p_offers_staging', self.OFFER_COLUMNS, rows)
+    
+    def _upsert_metadata(self, cur, side: str, market: Market, count: int, snapshot_id: Optional[int] = None):
+        """Время обновления и число офферов стороны рынка (и указатель на снимок)."""
+        if snapshot_id is None:
+            cur.execute(f"""
+                INSERT INTO {self.schema}.update_metadata (token, fiat, side, last_update, offers_count)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (token, fiat, side) 
+                DO UPDATE SET last_update = EXCLUDED.last_update, offers_count = EXCLUDED.offers_count
+            """, (market.token, market.fiat, side, datetime.now(), count))
+        else:
+            cur.execute(f"""
+                INSERT INTO {self.schema}.update_metadata (token, fiat, side, last_update, offers_count, snapshot_id)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (token, fiat, side) 
+                DO UPDATE SET last_update = EXCLUDED.last_update,
+                              offers_count = EXCLUDED.offers_count,
+                              snapshot_id = EXCLUDED.snapshot_id
+            """, (market.token, market.fiat, side, datetime.now(), count, snapshot_id))
+    
+    # История стакана (V0009, V0010): секционированные по дням таблицы
+    HISTORY_TABLES = ('p2p_offer_snapshots', 'book_summary', 'book_rollup_minute')
+    
+    # Колонки p2p_offer_snapshots, кроме captured_at (берутся из строки OFFER_COLUMNS)
+    HISTORY_COLUMNS = (
+        'token', 'fiat', 'side', 'id', 'price', 'min_amount', 'max_amount', 'available_amount',
+        'nickname', 'is_merchant', 'merchant_type', 'is_online', 'completion_rate',
+        'completed_orders', 'payment_methods'
+    )
+    
+    # Колонки book_summary, кроме ключа (ключи OrderBook.summary())
+    SUMMARY_COLUMNS = (
+        'best_price', 'offers_count', 'total_quantity', 'depth_05_quantity', 'depth_05_amount',
+        'depth_1_quantity', 'depth_1_amount', 'merchant_share', 'online_count'
+    )
+    
+    @staticmethod
+    def _partition_name(table: str, day: date) -> str:
+        """Имя дневной секции таблицы истории: book_summary_20260117."""
+        return f"{table}_{day:%Y%m%d}"
+    
+    # Класс advisory lock создания секций истории (первый ключ pg_advisory_xact_lock)
+    HISTORY_LOCK_CLASS = 0x62797033
+    
+    def _create_history_partitions(self, cur, day: date):
+        """
+        Создаёт дневные секции таблиц истории (если их ещё нет).
+        Секции дня создаются по очереди под advisory lock до конца транзакции:
+        без него одновременный CREATE TABLE IF NOT EXISTS падает на дубле relation.
+        """
+        cur.execute(
+            "SELECT pg_advisory_xact_lock(%s, hashtext(%s))",
+            (self.HISTORY_LOCK_CLASS, day.isoformat())
+        )
+        for table in self.HISTORY_TABLES:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.schema}.{self._partition_name(table, day)}
+                PARTITION OF {self.schema}.{table}
+                FOR VALUES FROM (%s) TO (%s)
+            """, (day, day + timedelta(days=1)))
+    
+    def _ensure_history_partition(self, day: date) -> bool:
+        """
+        Секции истории на день - до транзакции записи стакана, в своей короткой транзакции.
+        CREATE TABLE ... PARTITION OF держит AccessExclusive на родительской таблице
+        до коммита: внутри записи стакана он задерживал бы get_history на всю запись.
+        Проверка без блокировок (to_regclass), в кеш попадают только зафиксированные секции.
+        Ошибка DDL не роняет запись стакана - пропускается только история обновления.
+        Возвращает True, если секции дня есть.
+        """
+        if day in self._history_days:
+            return True
+        
+        conn = None
+        try:
+            conn = self.get_connection()
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT to_regclass(%s) IS NOT NULL",
+                    (f"{self.schema}.{self._partition_name(self.HISTORY_TABLES[-1], day)}",)
+                )
+                if not cur.fetchone()[0]:
+                    self._create_history_partitions(cur, day)
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to create history partitions for {day}: {e}")
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            return False
+        finally:
+            if conn is not None:
+                self.put_connection(conn)
+        
+        self._history_days.add(day)
+        return True
+    
+    def _captured_at(self, rows: List[tuple]) -> datetime:
+        """Время обновления стакана в истории - updated_at его строк."""
+        return rows[0][self.OFFER_COLUMNS.index('updated_at')] if rows else datetime.now()
+    
+    def _prepare_history(self, rows: List[tuple], summary: Optional[Dict[str, Any]]) -> bool:
+        """Пишется ли история обновления: есть сводка и секции дня (создаются здесь, до записи стакана)."""
+        return summary is not None and self._ensure_history_partition(self._captured_at(rows).date())
+    
+    def _record_history(self, cur, rows: List[tuple], side: str, market: Market, summary: Dict[str, Any]):
+        """
+        Дописывает офферы обновления в p2p_offer_snapshots, сводку в book_summary
+        и колонки стороны в минутный роллап рынка book_rollup_minute
+        (в транзакции записи стакана: история и стакан фиксируются вместе).
+        Ошибка записи истории откатывается до точки сохранения - стакан сохраняется без неё.
+        """
+        cur.execute("SAVEPOINT record_history")
+        try:
+            self._write_history(cur, rows, side, market, summary)
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT record_history")
+            logger.error(f"Failed to record history for {market.key} side {side}: {e}")
+        else:
+            cur.execute("RELEASE SAVEPOINT record_history")
+    
+    def _write_history(self, cur, rows: List[tuple], side: str, market: Market, summary: Dict[str, Any]):
+        """Строки истории обновления (см. _record_history)."""
+        captured_at = self._captured_at(rows)
+        
+        if rows:
+            positions = [self.OFFER_COLUMNS.index(column) for column in self.HISTORY_COLUMNS]
+            self._copy_rows(
+                cur,
+                f"{self.schema}.p2p_offer_snapshots",
+                ('captured_at',) + self.HISTORY_COLUMNS,
+                [(captured_at,) + tuple(row[i] for i in positions) for row in rows]
+            )
+        
+        columns = ('captured_at', 'token', 'fiat', 'side') + self.SUMMARY_COLUMNS
+        cur.execute(f"""
+            INSERT INTO {self.schema}.book_summary ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+        """, (captured_at, market.token, market.fiat, side) + tuple(summary[column] for column in self.SUMMARY_COLUMNS))
+        
+        # Последнее обновление стороны в эту минуту перезаписывает её колонки
+        prefix = 'sell' if side == '1' else 'buy'
+        cur.execute(f"""
+            INSERT INTO {self.schema}.book_rollup_minute
+                (token, fiat, minute, {prefix}_price, {prefix}_depth_1_amount, {prefix}_offers)
+            VALUES (%s, %s, date_trunc('minute', %s::timestamp), %s, %s, %s)
+            ON CONFLICT (token, fiat, minute) DO UPDATE SET
+                {prefix}_price = EXCLUDED.{prefix}_price,
+                {prefix}_depth_1_amount = EXCLUDED.{prefix}_depth_1_amount,
+                {prefix}_offers = EXCLUDED.{prefix}_offers
+        """, (
+            market.token, market.fiat, captured_at,
+            summary['best_price'], summary['depth_1_amount'], summary['offers_count']
+        ))
+    
+    def prune_history(self, raw_retention_days: int, summary_retention_days: int, days_ahead: int = 1) -> Dict[str, List[str]]:
+        """
+        Обслуживание истории: заранее создаёт секции на days_ahead дней вперёд
+        и удаляет целиком секции старше срока хранения (офферы - raw_retention_days,
+        сводки - summary_retention_days).
+        Возвращает {'created': [...], 'dropped': [...]} (имена секций).
+        """
+        today = datetime.now().date()
+        retention = {
+            'p2p_offer_snapshots': raw_retention_days,
+            'book_summary': summary_retention_days,
+            'book_rollup_minute': summary_retention_days
+        }
+        result = {'created': [], 'dropped': []}
+        
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                for offset in range(days_ahead + 1):
+                    day = today + timedelta(days=offset)
+                    cur.execute(
+                        "SELECT to_regclass(%s) IS NULL",
+                        (f"{self.schema}.{self._partition_name(self.HISTORY_TABLES[-1], day)}",)
+                    )
+                    if cur.fetchone()[0]:
+                        result['created'].extend(self._partition_name(table, day) for table in self.HISTORY_TABLES)
+                    self._create_history_partitions(cur, day)
+                
+                for table in self.HISTORY_TABLES:
+                    cur.execute("""
+                        SELECT child.relname
+                        FROM pg_inherits
+                        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                        JOIN pg_namespace ns ON ns.oid = parent.relnamespace
+                        WHERE ns.nspname = %s AND parent.relname = %s
+                    """, (self.schema, table))
+                    
+                    cutoff = today - timedelta(days=retention[table])
+                    for (name,) in cur.fetchall():
+                        try:
+                            day = datetime.strptime(name[len(table) + 1:], '%Y%m%d').date()
+                        except ValueError:
+                            continue  # Секция не по схеме имён - не трогаем
+                        if day < cutoff:
+                            cur.execute(f"DROP TABLE IF EXISTS {self.schema}.{name}")
+                            self._history_days.discard(day)
+                            result['dropped'].append(name)
+                
+                conn.commit()
+                logger.info(f"History partitions: created {result['created']}, dropped {result['dropped']}")
+                return result
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error pruning history: {e}")
+            raise
+        finally:
+            self.put_connection(conn)
+    
+    def get_history(self, market: Market, start: datetime, end: datetime, step_seconds: int) -> List[tuple]:
+        """
+        Ряд истории рынка из минутных роллапов, прореженный до шага step_seconds.
+        Читаются только секции периода [start, end) по первичному ключу.
+        Возвращает [(bucket, ask, bid, spread, ask_depth, bid_depth), ...] по возрастанию bucket:
+        средние за шаг, spread - среднее по минутам, где есть обе стороны.
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT 'epoch'::timestamp
+                               + floor(extract(epoch FROM minute) / %(step)s) * %(step)s * interval '1 second' AS bucket,
+                           avg(sell_price)::float8,
+                           avg(buy_price)::float8,
+                           avg(sell_price - buy_price)::float8,
+                           avg(sell_depth_1_amount)::float8,
+                           avg(buy_depth_1_amount)::float8
+                    FROM {self.schema}.book_rollup_minute
+                    WHERE token = %(token)s AND fiat = %(fiat)s
+                      AND minute >= %(start)s AND minute < %(end)s
+                    GROUP BY bucket
+                    ORDER BY bucket
+                """, {
+                    'token': market.token,
+                    'fiat': market.fiat,
+                    'start': start,
+                    'end': end,
+                    'step': step_seconds
+                })
+                return cur.fetchall()
+        finally:
+            self.put_connection(conn)
+    
+    def save_offers(self, offers: List[Offer], side: str, market: Market = DEFAULT_MARKET,
+                    summary: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Сохранение офферов в базу данных. Возвращает количество сохраненных записей.
+        
+        Офферы загружаются одним COPY во временную таблицу, затем данные стороны
+        заменяются одним INSERT ... SELECT - всё в одной транзакции.
+        """
         if not offers:
             return 0
             
+        rows = self._unique_offer_rows(offers, side, market)
+        # Секции истории - до транзакции записи стакана (см. _ensure_history_partition)
+        history = self._prepare_history(rows, summary)
+        
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
-                # Удаляем старые данные для этой стороны (атомарно)
-                cur.execute(f"DELETE FROM {self.schema}.p2p_offers WHERE side = %s", (side,))
-                
-                # Используем UPSERT для предотвращения race condition
-                upsert_query = f"""
-                    INSERT INTO {self.schema}.p2p_offers 
-                    (id, side, price, min_amount, max_amount, available_amount, 
-                     nickname, is_merchant, merchant_type, is_online, is_triangle,
-                     completion_rate, completed_orders, payment_methods, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id, side) 
-                    DO UPDATE SET 
-                        price = EXCLUDED.price,
-                        min_amount = EXCLUDED.min_amount,
-                        max_amount = EXCLUDED.max_amount,
-                        available_amount = EXCLUDED.available_amount,
-                        nickname = EXCLUDED.nickname,
-                        is_merchant = EXCLUDED.is_merchant,
-                        merchant_type = EXCLUDED.merchant_type,
-                        is_online = EXCLUDED.is_online,
-                        is_triangle = EXCLUDED.is_triangle,
-                        completion_rate = EXCLUDED.completion_rate,
-                        completed_orders = EXCLUDED.completed_orders,
-                        payment_methods = EXCLUDED.payment_methods,
-                        updated_at = EXCLUDED.updated_at
-                """
-                
-                for offer in offers:
-                    cur.execute(upsert_query, (
-                        offer['id'],
-                        side,
-                        offer['price'],
-                        offer['min_amount'],
-                        offer['max_amount'],
-                        offer['available_amount'],
-                        offer['nickname'],
-                        offer['is_merchant'],
-                        offer.get('merchant_type'),
-                        offer['is_online'],
-                        offer['is_triangle'],
-                        offer['completion_rate'],
-                        offer['completed_orders'],
-                        ','.join(offer['payment_methods']) if offer['payment_methods'] else None,
-                        datetime.now()
-                    ))
+                count = len(rows)
+                self._stage_rows(cur, rows)
+                columns = ', '.join(self.OFFER_COLUMNS)
                 
-                # Обновляем метаданные
+                # Заменяем данные стороны рынка целиком (атомарно в рамках транзакции)
+                cur.execute(
+                    f"DELETE FROM {self.schema}.p2p_offers WHERE token = %s AND fiat = %s AND side = %s",
+                    (market.token, market.fiat, side)
+                )
                 cur.execute(f"""
-                    INSERT INTO {self.schema}.update_metadata (side, last_update, offers_count)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (side) 
-                    DO UPDATE SET last_update = EXCLUDED.last_update, offers_count = EXCLUDED.offers_count
-                """, (side, datetime.now(), len(offers)))
+                    INSERT INTO {self.schema}.p2p_offers ({columns})
+                    SELECT {columns} FROM p2p_offers_staging
+                    ORDER BY price
+                """)
+                
+                # Обновляем метаданные
+                self._upsert_metadata(cur, side, market, count)
+                
+                if history:
+                    self._record_history(cur, rows, side, market, summary)
                 
                 conn.commit()
-                logger.info(f"Saved {len(offers)} offers for side {side}")
-                return len(offers)
+                logger.info(f"Saved {count} offers for {market.key} side {side}")
+                return count
         except Exception as e:
             conn.rollback()
             logger.error(f"Error saving offers: {e}")
@@ -127,73 +497,357 @@ class DatabaseManager:
         finally:
             self.put_connection(conn)
     
-    def get_offers(self, side: str) -> List[Dict[str, Any]]:
-        """Получение офферов из базы данных."""
+    def sync_offers(self, offers: List[Offer], side: str, market: Market = DEFAULT_MARKET,
+                    summary: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+        """
+        Инкрементальная синхронизация офферов стороны с базой.
+        
+        По content_hash сравнивает новые офферы с сохранёнными и пишет только разницу:
+        новые вставляются, изменившиеся обновляются, исчезнувшие удаляются.
+        Возвращает {'added', 'changed', 'removed', 'unchanged'}.
+        """
+        result = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+        if not offers:
+            return result
+        
+        rows = self._unique_offer_rows(offers, side, market)
+        # Секции истории - до транзакции записи стакана (см. _ensure_history_partition)
+        history = self._prepare_history(rows, summary)
+        
         conn = self.get_connection()
         try:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute(f"""
-                    SELECT id, side, price, min_amount, max_amount, available_amount,
-                           nickname, is_merchant, merchant_type, is_online, is_triangle,
-                           completion_rate, completed_orders, payment_methods, updated_at
-                    FROM {self.schema}.p2p_offers
-                    WHERE side = %s
-                    ORDER BY price {'ASC' if side == '1' else 'DESC'}
-                """, (side,))
+            with conn.cursor() as cur:
+                hash_index = self.OFFER_COLUMNS.index('content_hash')
                 
-                rows = cur.fetchall()
+                cur.execute(
+                    f"SELECT id, content_hash FROM {self.schema}.p2p_offers WHERE token = %s AND fiat = %s AND side = %s",
+                    (market.token, market.fiat, side)
+                )
+                stored = dict(cur.fetchall())
                 
-                offers = []
+                changed_rows = []
                 for row in rows:
-                    # Конвертируем Decimal в float для JSON сериализации
-                    def to_float(val):
-                        if isinstance(val, Decimal):
-                            return float(val)
-                        return val
+                    offer_id = row[0]
+                    if offer_id not in stored:
+                        result['added'] += 1
+                        changed_rows.append(row)
+                    elif stored[offer_id] != row[hash_index]:
+                        result['changed'] += 1
+                        changed_rows.append(row)
+                    else:
+                        result['unchanged'] += 1
+                
+                incoming_ids = {row[0] for row in rows}
+                removed_ids = [offer_id for offer_id in stored if offer_id not in incoming_ids]
+                result['removed'] = len(removed_ids)
+                
+                if changed_rows:
+                    self._stage_rows(cur, changed_rows)
+                    columns = ', '.join(self.OFFER_COLUMNS)
+                    assignments = ', '.join(
+                        f"{column} = EXCLUDED.{column}"
+                        for column in self.OFFER_COLUMNS if column not in ('id', 'token', 'fiat', 'side')
+                    )
                     
-                    offers.append({
-                        'id': row['id'],
-                        'price': to_float(row['price']),
-                        'maker': row['nickname'],
-                        'maker_id': '',
-                        'quantity': to_float(row['available_amount']),
-                        'min_amount': to_float(row['min_amount']),
-                        'max_amount': to_float(row['max_amount']),
-                        'payment_methods': row['payment_methods'].split(',') if row['payment_methods'] else [],
-                        'side': 'sell' if side == '1' else 'buy',
-                        'completion_rate': int(to_float(row['completion_rate'])) if row['completion_rate'] else 0,
-                        'total_orders': int(to_float(row['completed_orders'])) if row['completed_orders'] else 0,
-                        'is_merchant': row['is_merchant'],
-                        'merchant_type': row['merchant_type'],
-                        'merchant_badge': f'va{row["merchant_type"].capitalize()}Icon' if row['merchant_type'] else None,
-                        'is_block_trade': row['merchant_type'] == 'block_trade' if row['merchant_type'] else False,
-                        'is_online': row['is_online'],
-                        'is_triangle': row['is_triangle'],
-                        'last_logout_time': '',
-                        'auth_tags': []
-                    })
-                
-                return offers
+                    # Новые вставляются, изменившиеся обновляются одним UPSERT по ключу (token, fiat, side, id)
+                    cur.execute(f"""
+                        INSERT INTO {self.schema}.p2p_offers ({columns})
+                        SELECT {columns} FROM p2p_offers_staging
+                        ORDER BY price
+                        ON CONFLICT (token, fiat, side, id) DO UPDATE SET {assignments}
+                    """)
+                
+                if removed_ids:
+                    cur.execute(
+                        f"""DELETE FROM {self.schema}.p2p_offers
+                            WHERE token = %s AND fiat = %s AND side = %s AND id = ANY(%s)""",
+                        (market.token, market.fiat, side, removed_ids)
+                    )
+                
+                # Метаданные обновляем всегда: время последней синхронизации
+                self._upsert_metadata(cur, side, market, len(rows))
+                
+                if history:
+                    self._record_history(cur, rows, side, market, summary)
+                
+                conn.commit()
+                logger.info(
+                    f"Synced offers for {market.key} side {side}: +{result['added']} "
+                    f"~{result['changed']} -{result['removed']} ={result['unchanged']}"
+                )
+                return result
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error syncing offers: {e}")
+            raise
+        finally:
+            self.put_connection(conn)
+    
+    def publish_snapshot(self, offers: List[Offer], side: str, market: Market = DEFAULT_MARKET,
+                         summary: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Публикация нового снимка стакана стороны. Возвращает snapshot_id.
+        
+        Офферы пишутся одним COPY в новый неизменяемый снимок, затем указатель
+        update_metadata.snapshot_id переключается на него в той же транзакции.
+        Читатели видят либо старый, либо новый снимок целиком и не ждут писателя.
+        """
+        if not offers:
+            return 0
+        
+        # Строки снимка пишутся по возрастанию цены: индекс (snapshot_id, price)
+        # заполняется только справа, плотными страницами без расщеплений в середине
+        price_index = self.OFFER_COLUMNS.index('price')
+        rows = sorted(self._unique_offer_rows(offers, side, market), key=lambda row: row[price_index])
+        # Секции истории - до транзакции записи стакана (см. _ensure_history_partition)
+        history = self._prepare_history(rows, summary)
+        
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                count = len(rows)
+                
+                cur.execute(f"""
+                    INSERT INTO {self.schema}.offer_book_snapshots (token, fiat, side, offers_count)
+                    VALUES (%s, %s, %s, %s)
+                    RETURNING snapshot_id
+                """, (market.token, market.fiat, side, count))
+                snapshot_id = cur.fetchone()[0]
+                
+                self._copy_rows(
+                    cur,
+                    f"{self.schema}.offer_book_rows",
+                    ('snapshot_id',) + self.OFFER_COLUMNS,
+                    [(snapshot_id,) + row for row in rows]
+                )
+                
+                # Атомарно переключаем указатель на новый снимок
+                self._upsert_metadata(cur, side, market, count, snapshot_id)
+                
+                if history:
+                    self._record_history(cur, rows, side, market, summary)
+                
+                conn.commit()
+                logger.info(f"Published snapshot {snapshot_id} with {count} offers for {market.key} side {side}")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error publishing snapshot: {e}")
+            raise
+        finally:
+            self.put_connection(conn)
+        
+        # Очистка не должна ломать публикацию - ошибки только логируются
+        try:
+            self.gc_snapshots(side, market)
+        except Exception as e:
+            logger.error(f"Error collecting old snapshots: {e}")
+        
+        return snapshot_id
+    
+    def gc_snapshots(self, side: str, market: Market = DEFAULT_MARKET) -> int:
+        """
+        Удаление снимков стороны рынка сверх snapshot_retention последних.
+        Текущий снимок (на который указывает update_metadata) не удаляется никогда.
+        Возвращает количество удалённых снимков.
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                # Строки снимков удаляются каскадно (ON DELETE CASCADE)
+                cur.execute(f"""
+                    DELETE FROM {self.schema}.offer_book_snapshots
+                    WHERE token = %(token)s AND fiat = %(fiat)s AND side = %(side)s
+                      AND snapshot_id < (
+                          SELECT COALESCE(MIN(snapshot_id), 0) FROM (
+                              SELECT snapshot_id FROM {self.schema}.offer_book_snapshots
+                              WHERE token = %(token)s AND fiat = %(fiat)s AND side = %(side)s
+                              ORDER BY snapshot_id DESC
+                              LIMIT %(retention)s
+                          ) AS kept
+                      )
+                      AND snapshot_id IS DISTINCT FROM (
+                          SELECT snapshot_id FROM {self.schema}.update_metadata
+                          WHERE token = %(token)s AND fiat = %(fiat)s AND side = %(side)s
+                      )
+                """, {
+                    'token': market.token,
+                    'fiat': market.fiat,
+                    'side': side,
+                    'retention': self.snapshot_retention
+                })
+                removed = cur.rowcount
+                conn.commit()
+                if removed:
+                    logger.info(f"Removed {removed} old snapshots for {market.key} side {side}")
+                return removed
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_connection(conn)
+    
+    def store_offers(self, offers: List[Offer], side: str, market: Market = DEFAULT_MARKET,
+                     summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Запись офферов стороны рынка в режиме storage_mode.
+        С summary (OrderBook.summary()) в той же транзакции пишется история
+        (p2p_offer_snapshots и book_summary).
+        Возвращает сводку записи для логов.
+        """
+        if self.storage_mode == 'snapshot':
+            return {'snapshot_id': self.publish_snapshot(offers, side, market, summary)}
+        if self.storage_mode == 'incremental':
+            return self.sync_offers(offers, side, market, summary)
+        return {'saved': self.save_offers(offers, side, market, summary)}
+    
+    # Выражения, которые читает get_offers: все колонки входят в покрывающий индекс
+    # (token, fiat, side, price) INCLUDE (...) - стакан отдаётся index-only scan без Sort.
+    # Числа приводятся к float8/int, а способы оплаты к массиву прямо в SQL,
+    # чтобы драйвер сразу отдавал готовые float/int/list без Decimal и split
+    READ_COLUMNS = (
+        'id',
+        'price::float8',
+        'min_amount::float8',
+        'max_amount::float8',
+        'available_amount::float8',
+        'nickname',
+        "COALESCE(maker_id, '')",
+        'is_merchant',
+        'merchant_type',
+        'is_online',
+        'is_triangle',
+        'COALESCE(completion_rate, 0)',
+        'COALESCE(trunc(completed_orders), 0)::int',
+        "COALESCE(string_to_array(payment_methods, ','), '{}')"
+    )
+    
+    # Сколько строк забирать с сервера за один FETCH серверного курсора
+    READ_ITERSIZE = 2000
+    
+    def _offers_source(self) -> str:
+        """
+        FROM/WHERE для чтения офферов стороны рынка (параметры - token, fiat, side).
+        В режиме снимков читается текущий снимок по указателю из update_metadata:
+        один запрос видит указатель и строки в одном MVCC-снимке.
+        """
+        if self.storage_mode == 'snapshot':
+            return f"""{self.schema}.offer_book_rows AS o
+                    WHERE o.snapshot_id = (
+                        SELECT snapshot_id FROM {self.schema}.update_metadata
+                        WHERE token = %s AND fiat = %s AND side = %s
+                    )"""
+        return f"{self.schema}.p2p_offers AS o WHERE o.token = %s AND o.fiat = %s AND o.side = %s"
+    
+    def offers_query(self, side: str, search: bool = False) -> str:
+        """
+        SQL чтения стакана стороны, отсортированного по цене (параметры - offers_params).
+        Сортировка по o.price (колонке таблицы), а не по выходной колонке price::float8 -
+        иначе Postgres сортирует выражение и не использует индекс.
+        
+        search=True добавляет фильтр по нику или ID трейдера (последние параметры - шаблон
+        search_pattern): в p2p_offers его обслуживают GIN-индексы pg_trgm (V0007, V0013),
+        в снимке ник и ID входят в покрывающий индекс (snapshot_id, price)
+        и фильтруются без чтения таблицы.
+        """
+        return f"""
+            SELECT {', '.join(self.READ_COLUMNS)}
+            FROM {self._offers_source()}
+            {'AND (o.nickname ILIKE %s OR o.maker_id ILIKE %s)' if search else ''}
+            ORDER BY o.price {'ASC' if side == '1' else 'DESC'}
+        """
+    
+    def offers_params(self, side: str, market: Market = DEFAULT_MARKET, search: Optional[str] = None) -> tuple:
+        """Параметры offers_query: рынок, сторона и шаблон поиска по нику и ID."""
+        params = (market.token, market.fiat, side)
+        if search is not None:
+            pattern = self.search_pattern(search)
+            params += (pattern, pattern)
+        return params
+    
+    @staticmethod
+    def search_pattern(query: str) -> str:
+        """
+        Шаблон ILIKE для поиска трейдера (та же семантика, что у trader_search):
+        запрос короче 3 символов - префикс ника или ID, иначе подстрока
+        """
+        escaped = query.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return f'{escaped}%' if len(query.strip()) < 3 else f'%{escaped}%'
+    
+    def iter_offers(self, side: str, search: Optional[str] = None, market: Market = DEFAULT_MARKET) -> Iterator[Offer]:
+        """
+        Потоковое чтение офферов стороны в порядке цены.
+        
+        Строки читаются именованным (серверным) курсором пачками по READ_ITERSIZE,
+        так что большой стакан не загружается в память целиком. Соединение
+        возвращается в пул, когда генератор исчерпан или закрыт.
+        
+        search - ник или ID трейдера целиком или частично (только подходящие офферы).
+        """
+        side_name = 'sell' if side == '1' else 'buy'
+        conn = self.get_connection()
+        try:
+            with conn.cursor(name=f'offers_{side_name}') as cur:
+                cur.itersize = self.READ_ITERSIZE
+                cur.execute(
+                    self.offers_query(side, search=search is not None),
+                    self.offers_params(side, market, search)
+                )
+                
+                for (offer_id, price, min_amount, max_amount, quantity, nickname, maker_id,
+                     is_merchant, merchant_type, is_online, is_triangle,
+                     completion_rate, total_orders, payment_methods) in cur:
+                    yield Offer(
+                        offer_id,
+                        price,
+                        nickname,
+                        maker_id,
+                        quantity,
+                        min_amount,
+                        max_amount,
+                        payment_methods,
+                        side_name,
+                        completion_rate,
+                        total_orders,
+                        is_merchant,
+                        merchant_type,
+                        f'va{merchant_type.capitalize()}Icon' if merchant_type else None,
+                        merchant_type == 'block_trade',
+                        is_online,
+                        is_triangle,
+                        '',
+                        []
+                    )
         finally:
+            # Серверный курсор живёт в транзакции - завершаем её перед возвратом в пул
+            conn.rollback()
             self.put_connection(conn)
     
-    def get_last_update(self, side: str) -> Optional[datetime]:
+    def get_offers(self, side: str, market: Market = DEFAULT_MARKET) -> List[Offer]:
+        """Получение офферов из базы данных (список, см. iter_offers)."""
+        return list(self.iter_offers(side, market=market))
+    
+    def search_offers(self, query: str, side: str, market: Market = DEFAULT_MARKET) -> List[Offer]:
+        """Офферы стороны, у которых ник или ID содержит query (см. search_pattern)."""
+        return list(self.iter_offers(side, search=query, market=market))
+    
+    def get_last_update(self, side: str, market: Market = DEFAULT_MARKET) -> Optional[datetime]:
         """Получение времени последнего обновления."""
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
                 cur.execute(f"""
-                    SELECT last_update FROM {self.schema}.update_metadata WHERE side = %s
-                """, (side,))
+                    SELECT last_update FROM {self.schema}.update_metadata
+                    WHERE token = %s AND fiat = %s AND side = %s
+                """, (market.token, market.fiat, side))
                 
                 row = cur.fetchone()
                 return row[0] if row else None
         finally:
             self.put_connection(conn)
     
-    def should_update(self, side: str, interval_minutes: int = 10) -> bool:
+    def should_update(self, side: str, interval_minutes: int = 10, market: Market = DEFAULT_MARKET) -> bool:
         """Проверка необходимости обновления данных (в минутах)."""
-        last_update = self.get_last_update(side)
+        last_update = self.get_last_update(side, market)
         if not last_update:
             return True
         
@@ -201,9 +855,9 @@ class DatabaseManager:
         time_diff = (now - last_update).total_seconds() / 60
         return time_diff >= interval_minutes
     
-    def should_update_seconds(self, side: str, interval_seconds: int = 90) -> bool:
+    def should_update_seconds(self, side: str, interval_seconds: int = 90, market: Market = DEFAULT_MARKET) -> bool:
         """Проверка необходимости обновления данных (в секундах)."""
-        last_update = self.get_last_update(side)
+        last_update = self.get_last_update(side, market)
         if not last_update:
             return True
         
@@ -211,6 +865,60 @@ class DatabaseManager:
         time_diff = (now - last_update).total_seconds()
         return time_diff >= interval_seconds
     
+    # Класс advisory lock обновления стакана (первый ключ pg_try_advisory_lock)
+    REFRESH_LOCK_CLASS = 0x62797032
+    
+    @contextmanager
+    def refresh_lock(self, side: str, market: Market = DEFAULT_MARKET) -> Iterator[bool]:
+        """
+        Блокировка обновления стороны рынка между инстансами (session advisory lock).
+        
+        Отдаёт True, если блокировка взята, False - обновляет другой инстанс.
+        Если БД недоступна, отдаёт True: записи всё равно не будет, гонки тоже.
+        Блокировка живёт на отдельном соединении вне пула: оно держится всю загрузку
+        с Bybit и не должно занимать место записи стакана и истории в пуле.
+        При обрыве соединения Postgres снимает блокировку сам.
+        """
+        conn = None
+        acquired = False
+        available = True
+        try:
+            conn = psycopg2.connect(self.dsn)
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT pg_try_advisory_lock(%s, hashtext(%s))",
+                    (self.REFRESH_LOCK_CLASS, f"{market.key}:{side}")
+                )
+                acquired = cur.fetchone()[0]
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to take refresh lock for {market.key} side {side}: {e}")
+            available = False
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+        
+        try:
+            yield acquired or not available
+        finally:
+            if conn is not None:
+                if acquired:
+                    try:
+                        with conn.cursor() as cur:
+                            cur.execute(
+                                "SELECT pg_advisory_unlock(%s, hashtext(%s))",
+                                (self.REFRESH_LOCK_CLASS, f"{market.key}:{side}")
+                            )
+                        conn.commit()
+                    except Exception as e:
+                        logger.error(f"Failed to release refresh lock for {market.key} side {side}: {e}")
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+    
     def is_auto_update_enabled(self) -> bool:
         """Проверка глобального статуса автообновления."""
         conn = self.get_connection()
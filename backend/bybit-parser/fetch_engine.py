@@ -0,0 +1,199 @@
+"""
+Движок параллельной загрузки страниц со скользящим окном
+Новая страница запускается сразу, как только освобождается слот,
+вместо ожидания всего батча целиком
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (page_number, items_list, success) - формат результата fetch_page
+PageResult = Tuple[int, list, bool]
+
+
+class PageFetchEngine:
+    """
+    Загрузчик страниц поверх asyncio:
+    - Скользящее окно из window одновременных запросов
+    - Отмена оставшихся страниц после первой пустой страницы
+    - Общий дедлайн на всю загрузку
+    - Постоянный event loop в фоновом потоке: aiohttp-сессии и их
+      keep-alive соединения переживают вызовы handler в тёплом контейнере
+
+    Если асинхронная функция загрузки недоступна, слоты окна выполняют
+    синхронную fetch_page в пуле потоков - планирование остаётся тем же.
+    """
+
+    def __init__(self, window: int = 5):
+        """
+        Args:
+            window: Максимум одновременно загружаемых страниц
+        """
+        self.window = window
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Запускает фоновый event loop при первом использовании"""
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name='page-fetch-loop',
+                    daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков для синхронного режима (создаётся один раз)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.window,
+                    thread_name_prefix='page-fetch'
+                )
+            return self._executor
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """
+        Выполняет корутину в фоновом event loop и синхронно ждёт результат
+
+        Args:
+            coro: Корутина
+            timeout: Максимальное время ожидания (секунды)
+
+        Raises:
+            concurrent.futures.TimeoutError: Корутина не завершилась за timeout -
+                она отменяется, чтобы не держать сессии прокси и токены rate limiter
+        """
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    async def _run_window(
+        self,
+        fetch_one: Callable[[int], Awaitable[PageResult]],
+        max_pages: int,
+        timeout_seconds: float
+    ) -> List[Tuple[int, list]]:
+        """Скользящее окно загрузки: всегда держит до window страниц в работе"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_seconds
+
+        pending: Dict[asyncio.Task, int] = {}
+        results: Dict[int, list] = {}
+        next_page = 1
+        last_page = max_pages
+
+        try:
+            while True:
+                # Заполняем свободные слоты окна
+                while next_page <= last_page and len(pending) < self.window:
+                    task = asyncio.ensure_future(fetch_one(next_page))
+                    pending[task] = next_page
+                    next_page += 1
+
+                if not pending:
+                    break
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.warning(
+                        f'Timeout reached after {timeout_seconds:.1f}s, '
+                        f'cancelling pages {sorted(pending.values())}'
+                    )
+                    break
+
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=remaining,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    page = pending.pop(task, None)
+                    if page is None:
+                        # Уже отменена после пустой страницы в этом же наборе
+                        continue
+                    try:
+                        page_num, items, success = task.result()
+                    except Exception as e:
+                        logger.error(f'Error in parallel fetch: {e}')
+                        continue
+
+                    if not success:
+                        continue
+
+                    if not items:
+                        # Пустая страница - дальше объявлений нет
+                        if page - 1 < last_page:
+                            last_page = page - 1
+                            for other, other_page in list(pending.items()):
+                                if other_page > last_page:
+                                    other.cancel()
+                                    pending.pop(other)
+                        continue
+
+                    results[page_num] = items
+
+            if last_page == max_pages and max_pages in results:
+                logger.warning(f'Max pages limit ({max_pages}) reached')
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return [
+            (page, results[page])
+            for page in sorted(results)
+            if page <= last_page
+        ]
+
+    def fetch_pages(
+        self,
+        max_pages: int,
+        timeout_seconds: float,
+        fetch_async: Optional[Callable[[int], Awaitable[PageResult]]] = None,
+        fetch_sync: Optional[Callable[[int], PageResult]] = None
+    ) -> List[Tuple[int, list]]:
+        """
+        Загружает страницы 1..max_pages до первой пустой страницы
+
+        Args:
+            max_pages: Максимальное количество страниц
+            timeout_seconds: Общий дедлайн загрузки
+            fetch_async: Корутина загрузки страницы (приоритетный путь)
+            fetch_sync: Синхронная загрузка страницы (выполняется в пуле потоков)
+
+        Returns:
+            Список (page_number, items) успешно загруженных страниц по порядку
+        """
+        if fetch_async is not None:
+            fetch_one = fetch_async
+        elif fetch_sync is not None:
+            executor = self._get_executor()
+
+            async def fetch_one(page: int) -> PageResult:
+                return await asyncio.get_running_loop().run_in_executor(
+                    executor, fetch_sync, page
+                )
+        else:
+            raise ValueError('fetch_async or fetch_sync is required')
+
+        # Небольшой запас сверх дедлайна на отмену задач
+        return self.run(
+            self._run_window(fetch_one, max_pages, timeout_seconds),
+            timeout=timeout_seconds + 5
+        )
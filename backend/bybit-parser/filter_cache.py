@@ -0,0 +1,52 @@
+"""
+Кеш точечных загрузок стакана по фильтрам Bybit (payment/amount)
+Ключ - рынок, сторона и фильтры payload, у каждого ключа свой TTL
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+class FilterCache:
+    """
+    Записи по ключу фильтра: {'offers', 'book', 'complete', 'timestamp', 'ttl'}
+    complete=True - загружены все офферы под фильтром (последняя страница неполная)
+    """
+
+    def __init__(self, ttl_seconds: Dict[str, int], max_keys: int = 64):
+        """
+        Args:
+            ttl_seconds: TTL по виду фильтра ('payment', 'amount')
+            max_keys: Сколько ключей хранить (вытесняются давно записанные)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+    @staticmethod
+    def key(market: str, side: str, upstream: Dict[str, Any]) -> str:
+        """Ключ кеша: рынок ('USDT/RUB'), сторона, ID способов оплаты и сумма"""
+        return f"{market}|{side}|{','.join(upstream.get('payment', []))}|{upstream.get('amount', '')}"
+
+    def ttl(self, upstream: Dict[str, Any]) -> int:
+        """TTL ключа - минимальный среди фильтров в нём"""
+        return min(self.ttl_seconds[kind] for kind in upstream)
+
+    def get(self, key: str, now: datetime) -> Optional[Dict[str, Any]]:
+        """Свежая запись по ключу или None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if (now - entry['timestamp']).total_seconds() >= entry['ttl']:
+            return None
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any], ttl: int, now: datetime):
+        """Сохраняет запись и вытесняет самые старые ключи сверх max_keys"""
+        entry['timestamp'] = now
+        entry['ttl'] = ttl
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        while len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
@@ -0,0 +1,151 @@
+"""
+История цен и спреда рынка по минутным роллапам (book_rollup_minute)
+?history=spread&window=24h&step=5m - ряд, прореженный до шага step, и LRU-кеш
+результатов по (рынок, ряд, window, step, граница последнего шага)
+"""
+
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Ряды истории: поля точки (кроме t)
+HISTORY_SERIES = {
+    'spread': ('ask', 'bid', 'spread', 'spread_pct'),
+    'price': ('ask', 'bid'),
+    'depth': ('ask_depth', 'bid_depth')
+}
+
+# Длительность: число и единица (m - минуты, h - часы, d - дни)
+DURATION_RE = re.compile(r'^(\d+)([mhd])$')
+DURATION_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value: str, name: str) -> int:
+    """
+    Длительность '5m', '24h', '7d' в секундах
+
+    Raises:
+        ValueError: Неверный формат
+    """
+    match = DURATION_RE.match(value.strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f'{name} must be a duration like 5m, 24h or 7d')
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+class HistoryQuery:
+    """
+    Запрос ряда истории рынка
+
+    Ряд заканчивается на границе текущего шага (включая неполный последний шаг),
+    точки без данных не возвращаются
+    """
+
+    __slots__ = ('series', 'window', 'step', 'window_seconds', 'step_seconds')
+
+    def __init__(self, series: str, window: str, step: str, window_seconds: int, step_seconds: int):
+        self.series = series
+        self.window = window
+        self.step = step
+        self.window_seconds = window_seconds
+        self.step_seconds = step_seconds
+
+    @classmethod
+    def from_params(cls, params: Dict[str, str], max_points: int, max_window_days: int) -> Optional['HistoryQuery']:
+        """
+        Разбирает параметры history, window (по умолчанию 24h), step (по умолчанию 5m)
+
+        Returns:
+            HistoryQuery или None, если history в запросе нет
+
+        Raises:
+            ValueError: Некорректное значение параметра
+        """
+        series = params.get('history')
+        if not series:
+            return None
+        series = series.strip().lower()
+        if series not in HISTORY_SERIES:
+            raise ValueError(f'history must be one of {", ".join(HISTORY_SERIES)}')
+
+        window = params.get('window') or '24h'
+        step = params.get('step') or '5m'
+        window_seconds = parse_duration(window, 'window')
+        step_seconds = parse_duration(step, 'step')
+
+        if window_seconds > max_window_days * 86400:
+            raise ValueError(f'window must not exceed {max_window_days}d')
+        if step_seconds > window_seconds:
+            raise ValueError('step must not exceed window')
+        if window_seconds // step_seconds > max_points:
+            raise ValueError(f'window / step must not exceed {max_points} points')
+
+        return cls(series, window.strip().lower(), step.strip().lower(), window_seconds, step_seconds)
+
+    def bounds(self, now: datetime) -> Tuple[datetime, datetime]:
+        """Начало и конец ряда: конец - граница шага после now"""
+        epoch = datetime(1970, 1, 1)
+        step = self.step_seconds
+        end = epoch + timedelta(seconds=((now - epoch) // timedelta(seconds=step) + 1) * step)
+        return end - timedelta(seconds=self.window_seconds), end
+
+    def key(self, market: str, end: datetime) -> str:
+        """Ключ кеша результата"""
+        return f'{market}|{self.series}|{self.window}|{self.step}|{end.isoformat()}'
+
+    def points(self, rows: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        Точки ряда из строк DatabaseManager.get_history
+        (bucket, ask, bid, spread, ask_depth, bid_depth)
+        """
+        points = []
+        for bucket, ask, bid, spread, ask_depth, bid_depth in rows:
+            point: Dict[str, Any] = {'t': bucket.isoformat()}
+            if self.series == 'depth':
+                point['ask_depth'] = ask_depth
+                point['bid_depth'] = bid_depth
+            else:
+                point['ask'] = ask
+                point['bid'] = bid
+                if self.series == 'spread':
+                    point['spread'] = spread
+                    point['spread_pct'] = (
+                        round(spread / ((ask + bid) / 2) * 100, 4)
+                        if spread is not None and ask and bid else None
+                    )
+            points.append(point)
+        return points
+
+
+class HistoryCache:
+    """
+    LRU-кеш результатов запросов истории
+
+    Последний шаг ряда дописывается с каждым обновлением стакана,
+    поэтому запись живёт не дольше ttl_seconds
+    """
+
+    def __init__(self, max_size: int = 128, ttl_seconds: int = 30):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: 'OrderedDict[str, Tuple[datetime, Any]]' = OrderedDict()
+
+    def get(self, key: str, now: datetime) -> Optional[Any]:
+        """Свежий результат по ключу (становится самым недавним) или None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if (now - stored_at).total_seconds() >= self.ttl_seconds:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any, now: datetime):
+        """Сохраняет результат и вытесняет давно не запрошенные сверх max_size"""
+        self.entries[key] = (now, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
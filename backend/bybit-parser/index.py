@@ -1,24 +1,63 @@
-import json
-import requests
+import asyncio
 import random
+import threading
 import time
 import logging
-from typing import List, Dict, Any
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Импорт модулей прокси-менеджера
-from proxy_manager import ProxyManager
+from async_proxy_manager import AsyncProxyManager
+from fetch_engine import PageFetchEngine
 from config import (
     PROXIES, 
     REQUEST_TIMEOUT, 
     MAX_RETRIES, 
-    REQUEST_DELAY_RANGE,
+    RATE_LIMIT_CONFIG,
     PROXY_USE_PROBABILITY,
     ENABLE_PROXY_LOGGING,
-    PARALLEL_REQUESTS
+    PARALLEL_REQUESTS,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    PROXY_HEALTH_CONFIG,
+    HEDGE_ENABLED,
+    HEDGE_CONFIG,
+    FETCH_ENGINE,
+    DB_STORAGE_MODE,
+    SNAPSHOT_RETENTION,
+    DB_POOL_MAXCONN,
+    RESPONSE_GZIP_LEVEL,
+    JSON_BACKEND,
+    QUERY_MAX_LIMIT,
+    TARGETED_FETCH_CONFIG,
+    MARKETS,
+    BOOK_FETCH_CONFIG,
+    MARKET_SCHEDULER_CONFIG,
+    SINGLE_FLIGHT_CONFIG,
+    STALE_WHILE_REVALIDATE_CONFIG,
+    HISTORY_CONFIG,
+    HISTORY_QUERY_CONFIG,
+    METRICS_CONFIG,
+    FEED_CONFIG,
+    PUSH_CONFIG
 )
 from db_manager import DatabaseManager
+import json_backend
+from models import BybitItem, DEFAULT_MARKET, Market, Offer, PAYMENT_METHOD_MAP, decode_page
+from order_book import OrderBook
+from book_metrics import book_metrics
+from book_query import BookQuery
+from book_feed import BookFeed
+from trader_search import TraderIndex
+from filter_cache import FilterCache
+from market_scheduler import MarketScheduler
+from single_flight import SingleFlight
+from history_query import HistoryCache, HistoryQuery
+from response_body import PreparedBody, accepts_gzip
+
+# JSON-бэкенд для тел ответов и разбора страниц Bybit
+json_backend.use_backend(JSON_BACKEND)
 
 # Настройка логирования
 logging.basicConfig(
@@ -31,60 +70,118 @@ cache = {}
 CACHE_TTL = 8
 
 # In-memory кеш для данных из БД (снижает rate limit)
+# Стаканы лежат по ключу '<token>/<fiat>:<sell|buy>' (см. book_cache)
 db_cache = {
-    'sell': {'data': None, 'timestamp': None},
-    'buy': {'data': None, 'timestamp': None},
     'auto_update_enabled': {'value': True, 'timestamp': None}
 }
 DB_CACHE_TTL_SECONDS = 120  # Кеш БД на 120 секунд (2 минуты) - экономия запросов к БД
 
-# Инициализация глобального прокси-менеджера
-proxy_manager = ProxyManager(
+# Рынки из матрицы MARKETS по ключу 'USDT/RUB'
+MARKET_INDEX = {
+    Market(config['token'], config['fiat']).key: Market(config['token'], config['fiat'])
+    for config in MARKETS
+}
+
+# Фоновое обновление рынков (POST action=refresh_markets)
+market_scheduler = MarketScheduler(
+    MARKETS,
+    page_budget=MARKET_SCHEDULER_CONFIG['page_budget'],
+    min_interval_seconds=MARKET_SCHEDULER_CONFIG['min_interval_seconds']
+)
+
+# Ленты изменений стаканов по ключу '<token>/<fiat>:<sell|buy>' (см. book_feed)
+book_feeds: Dict[str, BookFeed] = {}
+
+# Публикация стакана (версия в ленте + запись в db_cache) из потоков запросов
+# и фоновых обновлений - одна на процесс (см. publish_book)
+publish_lock = threading.Lock()
+
+# Одна загрузка стакана на рынок/сторону в процессе (см. refresh_book)
+refresh_flight = SingleFlight()
+
+# Результаты запросов истории (?history=...), LRU
+history_cache = HistoryCache(
+    max_size=HISTORY_QUERY_CONFIG['cache_size'],
+    ttl_seconds=HISTORY_QUERY_CONFIG['cache_ttl_seconds']
+)
+
+# Точечные загрузки по фильтрам payment/amount (см. TARGETED_FETCH_CONFIG)
+filter_cache = FilterCache(
+    ttl_seconds=TARGETED_FETCH_CONFIG['ttl_seconds'],
+    max_keys=TARGETED_FETCH_CONFIG['max_keys']
+)
+
+# Инициализация глобального прокси-менеджера (синхронный и aiohttp-путь)
+proxy_manager = AsyncProxyManager(
     proxies_list=PROXIES,
     use_probability=PROXY_USE_PROBABILITY,
     max_retries=MAX_RETRIES,
     timeout=REQUEST_TIMEOUT,
-    enable_logging=ENABLE_PROXY_LOGGING
+    enable_logging=ENABLE_PROXY_LOGGING,
+    pool_connections=HTTP_POOL_CONNECTIONS,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    health_config=PROXY_HEALTH_CONFIG,
+    hedge_config=HEDGE_CONFIG,
+    rate_limit_config=RATE_LIMIT_CONFIG
 )
 
+# Движок загрузки страниц со скользящим окном (живёт между вызовами)
+fetch_engine = PageFetchEngine(window=PARALLEL_REQUESTS)
+USE_ASYNC_FETCH = FETCH_ENGINE == 'async' and AsyncProxyManager.is_available()
+
 # Инициализация менеджера базы данных
-db_manager = DatabaseManager()
+db_manager = DatabaseManager(
+    storage_mode=DB_STORAGE_MODE,
+    snapshot_retention=SNAPSHOT_RETENTION,
+    pool_maxconn=DB_POOL_MAXCONN
+)
 
 UPDATE_INTERVAL_SECONDS = 60  # 60 секунд = 1440 вызовов/сутки (экономия ресурсов)
 
-# Маппинг ID методов оплаты Bybit на названия
-PAYMENT_METHOD_MAP = {
-    '14': 'Bank Transfer',
-    '40': 'Mobile Top-up',
-    '90': 'Cash Deposit',
-    '75': 'Наличные',
-    '64': 'Wallet',
-    '1': 'Card',
-    '29': 'QIWI',
-    '377': 'YooMoney',
-    '378': 'Tinkoff',
-    '379': 'Sberbank',
-    '62': 'Raiffeisen Bank',
-    '413': 'Rosbank'
-}
+BYBIT_URL = 'https://api2.bybit.com/fiat/otc/item/online'
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+]
+
+ACCEPT_LANGUAGES = [
+    'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    'en-US,en;q=0.9',
+    'ru;q=0.9,en;q=0.8'
+]
 
-def fetch_page(page: int, side: str, url: str, user_agents: list, accept_languages: list, referers: list) -> tuple:
+# Шаблоны Referer: {token} и {fiat} подставляются для рынка запроса
+REFERERS = [
+    'https://www.bybit.com/fiat/trade/otc/?actionType=1&token={token}&fiat={fiat}&paymentMethod=',
+    'https://www.bybit.com/fiat/trade/otc/?actionType=0&token={token}&fiat={fiat}&paymentMethod=',
+    'https://www.bybit.com/fiat/trade/otc/'
+]
+
+# Объявлений на странице Bybit (size в payload)
+PAGE_SIZE = 100
+
+def build_page_request(page: int, side: str, user_agents: list, accept_languages: list, referers: list, upstream: Optional[dict] = None, market: Market = DEFAULT_MARKET) -> tuple:
     """
-    Загружает одну страницу объявлений параллельно
-    Возвращает: (page_number, items_list, success)
+    Формирует payload и заголовки запроса одной страницы рынка
+    upstream - фильтры Bybit {'payment': [ID], 'amount': 'сумма'} (см. BookQuery.upstream)
+    Возвращает: (payload, headers)
     """
     payload = {
         'userId': '',
-        'tokenId': 'USDT',
-        'currencyId': 'RUB',
+        'tokenId': market.token,
+        'currencyId': market.fiat,
         'payment': [],
         'side': side,
-        'size': '100',
+        'size': str(PAGE_SIZE),
         'page': str(page),
         'amount': '',
         'authMaker': False,
         'canTrade': False
     }
+    if upstream:
+        payload.update(upstream)
 
     headers = {
         'Content-Type': 'application/json',
@@ -93,7 +190,7 @@ def fetch_page(page: int, side: str, url: str, user_agents: list, accept_languag
         'Accept-Language': random.choice(accept_languages),
         'Accept-Encoding': 'gzip, deflate, br',
         'Origin': 'https://www.bybit.com',
-        'Referer': random.choice(referers),
+        'Referer': random.choice(referers).format(token=market.token, fiat=market.fiat),
         'Cache-Control': 'no-cache',
         'Pragma': 'no-cache',
         'Sec-Fetch-Dest': 'empty',
@@ -101,39 +198,814 @@ def fetch_page(page: int, side: str, url: str, user_agents: list, accept_languag
         'Sec-Fetch-Site': 'same-site'
     }
     
+    return payload, headers
+
+def parse_page_response(page: int, response) -> tuple:
+    """
+    Разбирает ответ Bybit для одной страницы
+    Возвращает: (page_number, items_list, success)
+    """
+    if response is None or response.status_code != 200:
+        return (page, [], False)
+    
+    # Тело декодируется сразу в BybitItem (см. models.py)
+    items = decode_page(response.content)
+    if items is None:
+        return (page, [], False)
+    
+    return (page, items, True)
+
+def fetch_page(page: int, side: str, url: str, user_agents: list, accept_languages: list, referers: list, hedge: bool = False, upstream: Optional[dict] = None, market: Market = DEFAULT_MARKET) -> tuple:
+    """
+    Загружает одну страницу объявлений (синхронно)
+    hedge=True дублирует медленный запрос через другой прокси
+    Возвращает: (page_number, items_list, success)
+    """
+    payload, headers = build_page_request(page, side, user_agents, accept_languages, referers, upstream, market)
+    
     try:
         response = proxy_manager.make_request(
             method='POST',
             url=url,
+            hedge=hedge,
             json=payload,
             headers=headers
         )
+        return parse_page_response(page, response)
         
-        if response is None or response.status_code != 200:
-            return (page, [], False)
-        
-        response_data = response.json()
-        
-        if not isinstance(response_data, dict) or response_data.get('ret_code') != 0:
-            return (page, [], False)
-        
-        result = response_data.get('result', {})
-        if not isinstance(result, dict):
-            return (page, [], False)
-        
-        items = result.get('items', [])
-        if not isinstance(items, list):
-            return (page, [], False)
-        
-        return (page, items, True)
+    except Exception as e:
+        logging.error(f'Error fetching page {page}: {e}')
+        return (page, [], False)
+
+async def fetch_page_async(page: int, side: str, url: str, user_agents: list, accept_languages: list, referers: list, hedge: bool = False, upstream: Optional[dict] = None, market: Market = DEFAULT_MARKET) -> tuple:
+    """
+    Загружает одну страницу объявлений через aiohttp
+    hedge=True дублирует медленный запрос через другой прокси
+    Возвращает: (page_number, items_list, success)
+    """
+    payload, headers = build_page_request(page, side, user_agents, accept_languages, referers, upstream, market)
+    
+    try:
+        response = await proxy_manager.make_request_async(
+            method='POST',
+            url=url,
+            hedge=hedge,
+            json=payload,
+            headers=headers
+        )
+        return parse_page_response(page, response)
         
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         logging.error(f'Error fetching page {page}: {e}')
         return (page, [], False)
 
+def fetch_offer_pages(side: str, max_pages: int, timeout_seconds: float, hedge: bool = False, upstream: Optional[dict] = None, market: Market = DEFAULT_MARKET) -> list:
+    """
+    Параллельная загрузка страниц скользящим окном:
+    освободившийся слот сразу берёт следующую страницу
+    Возвращает: [(page_number, items), ...] по порядку страниц
+    """
+    def fetch_sync(p: int) -> tuple:
+        return fetch_page(p, side, BYBIT_URL, USER_AGENTS, ACCEPT_LANGUAGES, REFERERS, hedge=hedge, upstream=upstream, market=market)
+    
+    def fetch_async(p: int):
+        return fetch_page_async(p, side, BYBIT_URL, USER_AGENTS, ACCEPT_LANGUAGES, REFERERS, hedge=hedge, upstream=upstream, market=market)
+    
+    return fetch_engine.fetch_pages(
+        max_pages=max_pages,
+        timeout_seconds=timeout_seconds,
+        fetch_async=fetch_async if USE_ASYNC_FETCH else None,
+        fetch_sync=fetch_sync
+    )
+
+def offer_from_item(item: BybitItem, side_name: str) -> Offer:
+    '''
+    Оффер API из объявления Bybit (BybitItem).
+    '''
+    # Методы оплаты (payments - это массив ID строк, например ["14", "40"])
+    payment_methods = []
+    for payment_id in item.payments:
+        if isinstance(payment_id, str):
+            payment_name = PAYMENT_METHOD_MAP.get(payment_id, f'Payment #{payment_id}')
+            payment_methods.append(payment_name)
+
+    # Лимиты
+    min_amt = item.min_amount
+    max_amt = item.max_amount
+    is_triangle = abs(max_amt - min_amt) <= 1.0
+
+    # Определяем тип мерчанта по Verified Advertiser тегам
+    auth_tags = item.auth_tag
+
+    merchant_type = None
+    merchant_badge = None
+    is_merchant = False
+    is_block_trade = 'BA' in auth_tags
+
+    if 'VA3' in auth_tags:
+        merchant_type = 'gold'
+        merchant_badge = 'vaGoldIcon'
+        is_merchant = True
+    elif 'VA2' in auth_tags:
+        merchant_type = 'silver'
+        merchant_badge = 'vaSilverIcon'
+        is_merchant = True
+    elif 'VA1' in auth_tags or 'VA' in auth_tags:
+        merchant_type = 'bronze'
+        merchant_badge = 'vaBronzeIcon'
+        is_merchant = True
+
+    # Формируем оффер (поля и их порядок - старый формат для совместимости с frontend)
+    return Offer(
+        id=item.id,
+        price=item.price,
+        maker=item.nick_name,
+        maker_id=item.user_id,
+        quantity=item.last_quantity,
+        min_amount=min_amt,
+        max_amount=max_amt,
+        payment_methods=payment_methods,
+        side=side_name,
+        completion_rate=item.recent_order_num,
+        total_orders=item.recent_execute_rate,
+        is_merchant=is_merchant,
+        merchant_type=merchant_type,
+        merchant_badge=merchant_badge,
+        is_block_trade=is_block_trade,
+        is_online=item.is_online,
+        is_triangle=is_triangle,
+        last_logout_time=item.last_logout_time,
+        auth_tags=auth_tags
+    )
+
+def offers_response(body: PreparedBody, extra: dict, headers: dict, use_gzip: bool) -> dict:
+    '''
+    Ответ со стаканом из заранее сериализованного тела.
+    extra - поля запроса, дописываемые после неизменной части.
+    Если клиент принимает gzip, тело отдаётся сжатым в base64.
+    '''
+    headers = dict(headers, Vary='Accept-Encoding')
+    
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': body.render_gzip_base64(extra),
+            'isBase64Encoded': True
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': body.render(extra),
+        'isBase64Encoded': False
+    }
+
+def book_cache(market: Market, side_name: str) -> dict:
+    '''
+    Запись db_cache стороны рынка {'data', 'timestamp'} (создаётся при первом обращении).
+    '''
+    return db_cache.setdefault(f'{market.key}:{side_name}', {'data': None, 'timestamp': None})
+
+def publish_book(market: Market, side_name: str, entry: dict, timestamp: datetime,
+                 expected: Optional[dict] = None) -> bool:
+    '''
+    Атомарная публикация стакана в db_cache: запись стороны заменяется целиком,
+    поэтому читатель (в том числе во время фонового обновления) видит
+    либо старые данные со старым временем, либо новые с новым.
+    Изменившийся стакан - новая версия в ленте изменений (?since=<seq>),
+    ожидающие её запросы (?wait=) просыпаются; тот же стакан (перечитанный из БД)
+    сохраняет версию. Версия и запись меняются под publish_lock, поэтому запись
+    с версией старше текущей (или при expected - не поверх expected) отбрасывается.
+    Returns: True - стакан опубликован
+    '''
+    key = f'{market.key}:{side_name}'
+    feed = book_feed(market, side_name)
+    with publish_lock:
+        current = db_cache.get(key)
+        if expected is not None and current is not expected:
+            return False
+        if 'seq' not in entry:
+            entry['published_at'] = datetime.now()
+            entry['seq'] = feed.publish(entry['offers'])
+            entry['feed'] = feed
+        if current is not None and current['data'] is not None and current['data'].get('seq', 0) > entry['seq']:
+            logging.info(f'[PUBLISH] {key}: seq {entry["seq"]} is older than cached {current["data"]["seq"]}, skipped')
+            return False
+        db_cache[key] = {'data': entry, 'timestamp': timestamp}
+        return True
+
+def book_feed(market: Market, side_name: str) -> BookFeed:
+    '''
+    Лента изменений стакана стороны рынка (создаётся при первой публикации).
+    '''
+    key = f'{market.key}:{side_name}'
+    feed = book_feeds.get(key)
+    if feed is None:
+        feed = book_feeds.setdefault(key, BookFeed(FEED_CONFIG['capacity']))
+    return feed
+
+def metrics_ladder(market: Market) -> tuple:
+    '''
+    Лестница сумм VWAP рынка (в его фиате) для ?metrics=true.
+    '''
+    ladders = METRICS_CONFIG['vwap_ladders']
+    return tuple(ladders.get(market.fiat, ladders[DEFAULT_MARKET.fiat]))
+
+def cache_entry(offers: List[Offer], side_name: str, market: Market = DEFAULT_MARKET) -> dict:
+    '''
+    Запись db_cache для стороны: офферы, готовое тело ответа,
+    колоночный стакан (OrderBook) для фильтров и аналитики,
+    индекс поиска трейдеров и готовое тело метрик (?metrics=true).
+    Строится один раз на обновление стакана.
+    '''
+    book = OrderBook(offers, side_name)
+    ladder = metrics_ladder(market)
+    return {
+        'offers': offers,
+        'total': len(offers),
+        'side': side_name,
+        'body': PreparedBody({
+            'offers': offers,
+            'total': len(offers),
+            'side': side_name,
+            'from_cache': True
+        }, RESPONSE_GZIP_LEVEL, precompress=True),
+        'book': book,
+        'search': TraderIndex(offers),
+        'ladder': ladder,
+        'metrics_body': PreparedBody({
+            'side': side_name,
+            'filters': {},
+            'metrics': book_metrics(book, ladder),
+            'from_cache': True
+        }, RESPONSE_GZIP_LEVEL, precompress=True)
+    }
+
+def book_response(entry: dict, query: Optional[BookQuery], extra: dict, headers: dict, use_gzip: bool) -> dict:
+    '''
+    Ответ из записи db_cache: весь стакан - готовым телом,
+    метрики всего стакана с лестницей рынка - готовым телом метрик,
+    запрос с фильтрами/пагинацией - страницей (или метриками) из OrderBook,
+    ?since=<seq> - дельтами ленты изменений после версии клиента.
+    '''
+    if query is None:
+        if 'seq' in entry:
+            extra = dict(extra, seq=entry['seq'])
+        return offers_response(entry['body'], extra, headers, use_gzip)
+    
+    if query.since is not None:
+        return feed_response(entry, query.since, extra, headers, use_gzip)
+    
+    if query.metrics is not None and not query.filters and query.metrics == entry.get('ladder'):
+        return offers_response(entry['metrics_body'], extra, headers, use_gzip)
+    
+    return offers_response(
+        PreparedBody(dict(query.run(entry['book']), from_cache=True), RESPONSE_GZIP_LEVEL),
+        extra,
+        headers,
+        use_gzip
+    )
+
+def targeted_response(targeted: dict, query: BookQuery, now: datetime, auto_update_enabled: bool,
+                      debug: bool, use_gzip: bool) -> dict:
+    '''
+    Ответ страницей (или метриками) из только что загруженной точечной выборки (FILTER-MISS).
+    '''
+    return offers_response(
+        PreparedBody(dict(query.run(targeted['book']), from_cache=False), RESPONSE_GZIP_LEVEL),
+        {
+            'timestamp': now.isoformat(),
+            'auto_update_enabled': auto_update_enabled,
+            'proxy_stats': proxy_manager.get_stats() if debug else {}
+        },
+        {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'X-Cache': 'FILTER-MISS'
+        },
+        use_gzip
+    )
+
+def feed_response(entry: dict, since: int, extra: dict, headers: dict, use_gzip: bool) -> dict:
+    '''
+    Ответ на ?since=<seq>: дельты от версии клиента до версии записи
+    ({'side', 'since', 'seq', 'deltas'}), а если клиент отстал сильнее
+    буфера ленты (или версия не из этой ленты) - весь стакан с snapshot=true.
+    '''
+    feed = entry.get('feed')
+    deltas = feed.since(since, entry['seq']) if feed is not None else None
+    
+    if deltas is None:
+        return offers_response(
+            entry['body'],
+            dict(extra, seq=entry.get('seq'), snapshot=True),
+            dict(headers, **{'X-Feed': 'SNAPSHOT'}),
+            use_gzip
+        )
+    
+    return offers_response(
+        PreparedBody({
+            'side': entry['side'],
+            'since': since,
+            'seq': entry['seq'],
+            'deltas': deltas,
+            'from_cache': True
+        }, RESPONSE_GZIP_LEVEL),
+        extra,
+        dict(headers, **{'X-Feed': 'DELTA'}),
+        use_gzip
+    )
+
+def fetch_targeted(side: str, query: BookQuery, upstream: dict, now: datetime, market: Market = DEFAULT_MARKET) -> Optional[dict]:
+    '''
+    Точечная загрузка офферов под фильтры запроса (payment/amount в payload Bybit).
+    Результат кешируется по ключу фильтра и вливается в стакан db_cache.
+    Возвращает запись filter_cache или None, если ничего не загружено.
+    '''
+    side_name = 'sell' if side == '1' else 'buy'
+    start_time = time.time()
+    
+    page_results = fetch_offer_pages(
+        side,
+        TARGETED_FETCH_CONFIG['max_pages'],
+        TARGETED_FETCH_CONFIG['timeout_seconds'],
+        upstream=upstream,
+        market=market
+    )
+    if not page_results:
+        # Пустой ответ не отличить от ошибки загрузки - пусть решает полный путь
+        return None
+    
+    offers = [offer_from_item(item, side_name) for _, items in page_results for item in items]
+    pages = [page_num for page_num, _ in page_results]
+    entry = {
+        'offers': offers,
+        'book': OrderBook(offers, side_name),
+        # Все страницы подряд и последняя неполная - под фильтр больше офферов нет
+        'complete': pages == list(range(1, len(pages) + 1)) and len(page_results[-1][1]) < PAGE_SIZE
+    }
+    filter_cache.put(FilterCache.key(market.key, side, upstream), entry, filter_cache.ttl(upstream), now)
+    logging.info(
+        f'[TARGETED] Loaded {len(offers)} offers ({len(pages)} pages) for {market.key} side {side} '
+        f'filter {upstream} in {time.time() - start_time:.1f}s'
+    )
+    
+    merge_targeted(market, side_name, entry, query, upstream)
+    return entry
+
+def merge_targeted(market: Market, side_name: str, entry: dict, query: BookQuery, upstream: dict):
+    '''
+    Вливает точечную загрузку в стакан db_cache (время записи не меняется):
+    офферы с теми же ID заменяются, а при полной загрузке исчезнувшие
+    офферы под этим фильтром удаляются. Если за время слияния стакан
+    обновился целиком, слияние отбрасывается.
+    '''
+    book = book_cache(market, side_name)
+    cached = book['data']
+    if cached is None:
+        return
+    fresh = {offer.id: offer for offer in entry['offers']}
+    if entry['complete']:
+        covered = cached['book'].mask(
+            payment=query.filters['payment'] if 'payment' in upstream else None,
+            amount=query.filters['amount'] if 'amount' in upstream else None
+        )
+    else:
+        covered = [False] * len(cached['offers'])
+    
+    merged = [
+        offer for offer, is_covered in zip(cached['offers'], covered)
+        if not is_covered and offer.id not in fresh
+    ]
+    merged.extend(fresh.values())
+    merged.sort(key=lambda offer: offer.price, reverse=side_name == 'buy')
+    
+    merged_entry = cache_entry(merged, side_name, market)
+    publish_book(market, side_name, merged_entry, book['timestamp'], expected=book)
+
+def search_response(search_user: str, query: Optional[BookQuery], now_ts: datetime, extra: dict, use_gzip: bool, market: Market = DEFAULT_MARKET) -> dict:
+    '''
+    Поиск трейдера по нику/ID в обеих сторонах стакана без загрузки с Bybit.
+    Свежий memory cache - индекс TraderIndex, иначе поиск в БД (pg_trgm),
+    при недоступной БД - устаревший memory cache. Если не удалось поискать
+    ни в одной стороне - 503, а не пустой результат «трейдер не найден».
+    '''
+    offers = []
+    sources = set()
+    searched = 0
+    
+    for side_code, side_name in (('1', 'sell'), ('0', 'buy')):
+        cached = book_cache(market, side_name)
+        cache_age = None
+        if cached['data'] is not None and cached['timestamp'] is not None:
+            cache_age = (now_ts - cached['timestamp']).total_seconds()
+        
+        if cache_age is None or cache_age >= DB_CACHE_TTL_SECONDS:
+            try:
+                found = db_manager.search_offers(search_user, side_code, market)
+                if query is not None and query.filters:
+                    book = OrderBook(found, side_name)
+                    found = book.select(query.mask(book))
+                offers.extend(found)
+                sources.add('DB-HIT')
+                searched += 1
+                continue
+            except Exception as e:
+                logging.error(f'[SEARCH] DB search failed for side {side_code}: {e}')
+                if cache_age is None:
+                    continue
+                sources.add('STALE-FALLBACK')
+        else:
+            sources.add('MEMORY-HIT')
+        
+        book = cached['data']['book']
+        mask = cached['data']['search'].search(search_user)
+        if query is not None and query.filters:
+            mask &= query.mask(book)
+        offers.extend(book.select(mask))
+        searched += 1
+    
+    if not searched:
+        return {
+            'statusCode': 503,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json_backend.dumps({'error': 'Trader search is temporarily unavailable'}),
+            'isBase64Encoded': False
+        }
+    
+    page, next_cursor = query.page(offers) if query is not None else (offers, None)
+    
+    # Самый «слабый» источник ответа - в X-Cache
+    x_cache = next(
+        (source for source in ('STALE-FALLBACK', 'DB-HIT', 'MEMORY-HIT') if source in sources),
+        'MISS'
+    )
+    logging.info(f'[SEARCH] "{search_user}": {len(offers)} offers ({x_cache})')
+    
+    return offers_response(
+        PreparedBody({
+            'offers': page,
+            'total': len(offers),
+            'side': 'all',
+            'search': search_user,
+            'filters': query.filters if query is not None else {},
+            'next_cursor': next_cursor,
+            'from_cache': True
+        }, RESPONSE_GZIP_LEVEL),
+        extra,
+        {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'X-Cache': x_cache
+        },
+        use_gzip
+    )
+
+def stale_response(market: Market, side: str, query: Optional[BookQuery], auto_update_enabled: bool, use_gzip: bool,
+                   x_cache: str = 'STALE-REFRESHING', max_age: Optional[float] = None) -> Optional[dict]:
+    '''
+    Ответ последним стаканом, пока он обновляется (другим инстансом или в фоне):
+    из memory cache, иначе из БД. None - отдать нечего или стакан старше max_age.
+    '''
+    side_name = 'sell' if side == '1' else 'buy'
+    cached = book_cache(market, side_name)
+    now_ts = datetime.now()
+    
+    if cached['data'] is None:
+        try:
+            offers = db_manager.get_offers(side, market)
+            last_update = db_manager.get_last_update(side, market)
+        except Exception as e:
+            logging.error(f'[DB-ERROR] Failed to read stale book from DB: {e}')
+            return None
+        if not offers:
+            return None
+        cached = {'data': cache_entry(offers, side_name, market), 'timestamp': last_update or now_ts}
+        publish_book(market, side_name, cached['data'], cached['timestamp'])
+    
+    cache_age = (now_ts - cached['timestamp']).total_seconds()
+    if max_age is not None and cache_age > max_age:
+        logging.info(f'[{x_cache}] {market.key} side {side} book is too old ({cache_age:.0f}s)')
+        return None
+    
+    logging.info(f'[{x_cache}] Serving {market.key} side {side} ({cache_age:.0f}s old)')
+    return book_response(
+        cached['data'],
+        query,
+        {
+            'cache_age': int(cache_age),
+            'auto_update_enabled': auto_update_enabled,
+            'proxy_stats': {}
+        },
+        {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'X-Cache': x_cache,
+            'X-Cache-Age': str(int(cache_age))
+        },
+        use_gzip
+    )
+
+def history_response(history: HistoryQuery, market: Market, use_gzip: bool) -> dict:
+    '''
+    Ряд истории рынка (спред, цены, глубина) из минутных роллапов.
+    Готовое тело ответа кешируется в history_cache до конца шага (не дольше TTL).
+    '''
+    now = datetime.now()
+    start, end = history.bounds(now)
+    key = history.key(market.key, end)
+    
+    body = history_cache.get(key, now)
+    x_cache = 'HISTORY-HIT'
+    if body is None:
+        started = time.time()
+        rows = db_manager.get_history(market, start, end, history.step_seconds)
+        body = PreparedBody({
+            'history': history.series,
+            'market': market.key,
+            'window': history.window,
+            'step': history.step,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'points': history.points(rows)
+        }, RESPONSE_GZIP_LEVEL)
+        history_cache.put(key, body, now)
+        x_cache = 'HISTORY-MISS'
+        logging.info(f'[HISTORY] {key}: {len(rows)} points in {(time.time() - started) * 1000:.1f}ms')
+    
+    return offers_response(
+        body,
+        {},
+        {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'X-Cache': x_cache
+        },
+        use_gzip
+    )
+
+def parse_market(params: dict) -> Market:
+    '''
+    Рынок запроса по параметрам token и fiat (по умолчанию USDT/RUB).
+    Неизвестный рынок (нет в MARKETS) - ValueError.
+    '''
+    token = (params.get('token') or DEFAULT_MARKET.token).strip().upper()
+    fiat = (params.get('fiat') or DEFAULT_MARKET.fiat).strip().upper()
+    market = MARKET_INDEX.get(f'{token}/{fiat}')
+    if market is None:
+        raise ValueError(f'Unknown market {token}/{fiat}, available: {", ".join(MARKET_INDEX)}')
+    return market
+
+def parse_wait(params: dict) -> float:
+    '''
+    Время ожидания новой версии стакана ?wait=<секунды> (0 - не ждать).
+    Больше PUSH_CONFIG['max_wait_seconds'] или не число - ValueError.
+    '''
+    wait = params.get('wait')
+    if not wait:
+        return 0.0
+    try:
+        seconds = float(wait)
+    except ValueError:
+        raise ValueError('wait must be a number of seconds')
+    if not 0 <= seconds <= PUSH_CONFIG['max_wait_seconds']:
+        raise ValueError(f'wait must be between 0 and {PUSH_CONFIG["max_wait_seconds"]} seconds')
+    return seconds
+
+def poll_book(market: Market, side: str, auto_update_enabled: bool):
+    '''
+    Проверка за ожидающих новую версию стакана (один ожидающий раз в poll_seconds):
+    стакан, записанный в БД после последней публикации (другим инстансом или
+    плановым обновлением), публикуется из БД; если стакан пора обновлять -
+    запускается фоновое обновление, его публикация разбудит ожидающих.
+    '''
+    side_name = 'sell' if side == '1' else 'buy'
+    published = book_cache(market, side_name)['data']
+    
+    try:
+        last_update = db_manager.get_last_update(side, market)
+        if last_update is not None and published is not None and last_update > published['published_at']:
+            logging.info(f'[PUSH] Newer {market.key} side {side} book in DB ({last_update.isoformat()})')
+            offers = db_manager.get_offers(side, market)
+            if offers:
+                publish_book(market, side_name, cache_entry(offers, side_name, market), last_update)
+                return
+    except Exception as e:
+        logging.error(f'[PUSH] Failed to check {market.key} side {side} in DB: {e}')
+        return
+    
+    due = last_update is None or (datetime.now() - last_update).total_seconds() >= UPDATE_INTERVAL_SECONDS
+    if due and auto_update_enabled and STALE_WHILE_REVALIDATE_CONFIG['enabled']:
+        revalidate(market, side)
+
+def wait_response(market: Market, side: str, query: Optional[BookQuery], wait_seconds: float,
+                  auto_update_enabled: bool, use_gzip: bool) -> Optional[dict]:
+    '''
+    Long-poll: ждёт версию стакана новее последней (или новее since клиента)
+    и отдаёт её как обычный ответ из памяти (с since - дельтами).
+    X-Cache: PUSH - дождались, PUSH-TIMEOUT - новой версии нет (с since - пустые дельты).
+    None - ждать нечего (стакана в памяти нет или клиент отстал), ответит обычный путь.
+    '''
+    side_name = 'sell' if side == '1' else 'buy'
+    entry = book_cache(market, side_name)['data']
+    if entry is None or 'seq' not in entry:
+        return None
+    if query is not None and query.since is not None and query.since != entry['seq']:
+        return None
+    
+    feed = entry['feed']
+    seq = entry['seq']
+    started = time.time()
+    deadline = started + wait_seconds
+    logging.info(f'[PUSH] Waiting up to {wait_seconds:.0f}s for {market.key} side {side} after seq {seq}')
+    
+    pushed = False
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        if feed.wait(seq, min(remaining, PUSH_CONFIG['poll_seconds'])):
+            pushed = True
+            break
+        if feed.claim_check(PUSH_CONFIG['poll_seconds']):
+            poll_book(market, side, auto_update_enabled)
+    
+    cached = book_cache(market, side_name)
+    waited = time.time() - started
+    cache_age = (datetime.now() - cached['timestamp']).total_seconds()
+    if pushed:
+        logging.info(f'[PUSH] {market.key} side {side}: seq {cached["data"]["seq"]} after {waited:.1f}s')
+    else:
+        logging.info(f'[PUSH-TIMEOUT] {market.key} side {side}: no new version after {waited:.1f}s')
+    return book_response(
+        cached['data'],
+        query,
+        {
+            'cache_age': int(cache_age),
+            'waited': round(waited, 1),
+            'auto_update_enabled': auto_update_enabled,
+            'proxy_stats': {}
+        },
+        {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'X-Cache': 'PUSH' if pushed else 'PUSH-TIMEOUT',
+            'X-Cache-Age': str(int(cache_age))
+        },
+        use_gzip
+    )
+
+def fetch_book(market: Market, side: str, max_pages: int, timeout_seconds: float, now: datetime,
+               hedge: bool = False, store: bool = True) -> dict:
+    '''
+    Загрузка стороны рынка с Bybit. При store=True полный стакан пишется в БД
+    и после успешной записи публикуется в memory cache.
+    Returns: {'offers', 'pages', 'stored'} (stored - результат store_offers или None)
+    '''
+    side_name = 'sell' if side == '1' else 'buy'
+    start_time = time.time()
+    
+    page_results = fetch_offer_pages(side, max_pages, timeout_seconds, hedge=hedge, market=market)
+    logging.info(f'Loaded {len(page_results)} pages for {market.key} in {time.time() - start_time:.1f}s')
+    
+    # Страницы уже упорядочены и обрезаны по первой пустой странице
+    offers = [offer_from_item(item, side_name) for _, items in page_results for item in items]
+    result = {'offers': offers, 'pages': len(page_results), 'stored': None}
+    
+    if store and offers:
+        try:
+            # OrderBook строится до записи: из него же берётся сводка для истории
+            entry = cache_entry(offers, side_name, market)
+            summary = entry['book'].summary() if HISTORY_CONFIG['enabled'] else None
+            result['stored'] = db_manager.store_offers(offers, side, market, summary)
+            logging.info(f'Successfully stored offers to database for {market.key} side {side} ({DB_STORAGE_MODE}): {result["stored"]}')
+            
+            # Полный стакан сохранён - публикуем его в memory cache (тело + OrderBook)
+            publish_book(market, side_name, entry, now)
+        except Exception as e:
+            logging.error(f'Failed to save to database: {e}')
+    
+    return result
+
+def market_max_pages(market: Market, side: str) -> int:
+    '''
+    Страниц на полную загрузку стороны рынка - max_pages рынка из MARKETS.
+    '''
+    return market_scheduler.slots[(market, side)].max_pages
+
+def refresh_key(market: Market, side: str, store: bool = True) -> str:
+    '''
+    Ключ загрузки стороны рынка в refresh_flight (полная с записью в БД или quick).
+    '''
+    return f'{market.key}:{side}:{"full" if store else "quick"}'
+
+def refresh_book(market: Market, side: str, max_pages: int, timeout_seconds: float, now: datetime,
+                 hedge: bool = False, store: bool = True) -> Tuple[Optional[dict], bool]:
+    '''
+    Обновление стороны рынка без дублей (см. fetch_book).
+    В процессе конкурентные вызовы ждут одну загрузку (SingleFlight), между инстансами
+    загрузку с записью в БД выполняет только владелец advisory lock.
+    Returns: (результат fetch_book или None - обновляет другой инстанс / не дождались,
+              shared - результат получен от другого вызова)
+    '''
+    key = refresh_key(market, side, store)
+    
+    def load() -> Optional[dict]:
+        if not (store and SINGLE_FLIGHT_CONFIG['lock_enabled']):
+            return fetch_book(market, side, max_pages, timeout_seconds, now, hedge, store)
+        with db_manager.refresh_lock(side, market) as acquired:
+            if not acquired:
+                logging.info(f'[SINGLE-FLIGHT] {market.key} side {side} is being refreshed by another instance')
+                return None
+            return fetch_book(market, side, max_pages, timeout_seconds, now, hedge, store)
+    
+    try:
+        result, shared = refresh_flight.do(key, load, SINGLE_FLIGHT_CONFIG['wait_timeout_seconds'])
+    except FutureTimeoutError:
+        logging.warning(f'[SINGLE-FLIGHT] Timed out waiting for {key} refresh')
+        return None, True
+    
+    if shared:
+        logging.info(f'[SINGLE-FLIGHT] Joined in-flight refresh of {key}')
+    return result, shared
+
+def revalidate_book(market: Market, side: str):
+    '''
+    Фоновое обновление стороны рынка (stale-while-revalidate): полная загрузка
+    с записью в БД, стакан публикуется в db_cache целиком по окончании.
+    '''
+    now = datetime.now()
+    try:
+        refreshed, shared = refresh_book(market, side, market_max_pages(market, side),
+                                         BOOK_FETCH_CONFIG['timeout_seconds'], now, hedge=HEDGE_ENABLED)
+        if refreshed is not None and refreshed['stored'] is not None and not shared and (market, side) in market_scheduler.slots:
+            market_scheduler.charge(market, side, refreshed['pages'], now)
+        logging.info(f'[REVALIDATE] {market.key} side {side} refreshed in background: '
+                     f'{len(refreshed["offers"]) if refreshed else 0} offers')
+    except Exception as e:
+        logging.error(f'[REVALIDATE] Background refresh of {market.key} side {side} failed: {e}')
+
+def revalidate(market: Market, side: str) -> bool:
+    '''
+    Запускает фоновое обновление стороны рынка, если оно ещё не идёт.
+    В режиме 'scheduled' обновление остаётся плановому вызову (action=refresh_markets).
+    Returns: True - обновление запущено
+    '''
+    if STALE_WHILE_REVALIDATE_CONFIG['mode'] != 'thread':
+        return False
+    if refresh_flight.in_flight(refresh_key(market, side)):
+        return False
+    
+    threading.Thread(
+        target=revalidate_book,
+        args=(market, side),
+        name=f'revalidate-{market.key}-{side}',
+        daemon=True
+    ).start()
+    return True
+
+def refresh_markets(now: datetime) -> list:
+    '''
+    Фоновое обновление рынков по плану MarketScheduler в пределах бюджета вызова.
+    Стороны, не успевшие до дедлайна, не учитываются и идут первыми в следующий раз.
+    '''
+    deadline = time.time() + MARKET_SCHEDULER_CONFIG['time_budget_seconds']
+    results = []
+    
+    for market, side, pages in market_scheduler.plan(now):
+        remaining = deadline - time.time()
+        if remaining <= 1:
+            logging.warning(f'[MARKETS] Time budget exhausted, {market.key} side {side} postponed')
+            break
+        
+        try:
+            refreshed, _ = refresh_book(market, side, pages, min(remaining, BOOK_FETCH_CONFIG['timeout_seconds']), now)
+            summary = {'market': market.key, 'side': 'sell' if side == '1' else 'buy'}
+            if refreshed is None:
+                # Сторону обновляет другой инстанс - в этом вызове она считается обновлённой
+                summary['skipped'] = 'locked'
+            else:
+                summary.update(pages=refreshed['pages'], offers=len(refreshed['offers']), stored=refreshed['stored'])
+            market_scheduler.charge(market, side, max(summary.get('pages', pages), 1), now)
+            results.append(summary)
+        except Exception as e:
+            logging.error(f'[MARKETS] Failed to refresh {market.key} side {side}: {e}')
+            market_scheduler.charge(market, side, pages, now)
+            results.append({'market': market.key, 'side': 'sell' if side == '1' else 'buy', 'error': str(e)})
+    
+    logging.info(f'[MARKETS] Refreshed {len(results)} market sides: {results}')
+    return results
+
 def handler(event: dict, context) -> dict:
     '''
-    Парсинг P2P объявлений Bybit для пары USDT/RUB.
+    Парсинг P2P объявлений Bybit по рынкам token/fiat (по умолчанию USDT/RUB).
     Возвращает все доступные объявления с полной информацией о трейдерах.
     '''
     
@@ -157,7 +1029,7 @@ def handler(event: dict, context) -> dict:
     # POST запросы для управления настройками
     if method == 'POST':
         try:
-            body = json.loads(event.get('body', '{}'))
+            body = json_backend.loads(event.get('body', '{}'))
             action = body.get('action')
             
             if action == 'toggle_auto_update':
@@ -169,20 +1041,56 @@ def handler(event: dict, context) -> dict:
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({
+                    'body': json_backend.dumps({
                         'success': success,
                         'auto_update_enabled': enabled
                     }),
                     'isBase64Encoded': False
                 }
             
+            if action == 'prune_history':
+                # Обслуживание истории стакана (вызывается по расписанию раз в сутки)
+                result = db_manager.prune_history(
+                    HISTORY_CONFIG['raw_retention_days'],
+                    HISTORY_CONFIG['summary_retention_days'],
+                    HISTORY_CONFIG['days_ahead']
+                )
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json_backend.dumps(dict(result, success=True)),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'refresh_markets':
+                # Обновление матрицы рынков (вызывается по расписанию)
+                if not db_manager.is_auto_update_enabled():
+                    results = []
+                else:
+                    results = refresh_markets(datetime.now())
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json_backend.dumps({
+                        'success': True,
+                        'refreshed': results
+                    }),
+                    'isBase64Encoded': False
+                }
+            
             return {
                 'statusCode': 400,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'error': 'Unknown action'}),
+                'body': json_backend.dumps({'error': 'Unknown action'}),
                 'isBase64Encoded': False
             }
         except Exception as e:
@@ -192,7 +1100,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'error': str(e)}),
+                'body': json_backend.dumps({'error': str(e)}),
                 'isBase64Encoded': False
             }
     
@@ -202,7 +1110,51 @@ def handler(event: dict, context) -> dict:
     search_user = params.get('search', '').strip()
     check_status = params.get('status') == 'true'
     force_update = params.get('force') == 'true'
-    limit = params.get('limit')  # 'quick' = только 200, 'full' = все
+    limit = params.get('limit')  # 'quick' = только 200, 'full' = все, число - размер страницы
+    use_gzip = accepts_gzip(event.get('headers'))
+    
+    # Рынок (token/fiat), фильтры и пагинация (payment, merchant_type, online, amount, min_completion, limit/cursor)
+    # или ряд истории (history, window, step)
+    try:
+        market = parse_market(params)
+        query = BookQuery.from_params(params, QUERY_MAX_LIMIT, metrics_ladder(market))
+        wait_seconds = parse_wait(params)
+        history = HistoryQuery.from_params(
+            params,
+            HISTORY_QUERY_CONFIG['max_points'],
+            HISTORY_QUERY_CONFIG['max_window_days']
+        )
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json_backend.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    # История цен и спреда - только из БД, стакан и Bybit не нужны
+    if history is not None:
+        try:
+            return history_response(history, market, use_gzip)
+        except Exception as e:
+            logging.error(f'[HISTORY] Failed to read history: {e}')
+            return {
+                'statusCode': 503,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json_backend.dumps({'error': 'History is temporarily unavailable'}),
+                'isBase64Encoded': False
+            }
+    
+    # Фильтры, которые можно отдать Bybit: при обновлении грузим только их (1-2 страницы)
+    upstream = None
+    if query is not None and TARGETED_FETCH_CONFIG['enabled'] and not force_update:
+        upstream = query.upstream()
     
     try:
         # Проверяем глобальный статус автообновления (с кешированием)
@@ -222,8 +1174,8 @@ def handler(event: dict, context) -> dict:
         # Если запрос только на проверку статуса
         if check_status:
             try:
-                last_update_sell = db_manager.get_last_update('1')
-                last_update_buy = db_manager.get_last_update('0')
+                last_update_sell = db_manager.get_last_update('1', market)
+                last_update_buy = db_manager.get_last_update('0', market)
             except Exception as e:
                 logging.error(f'Error getting last updates: {e}')
                 last_update_sell = None
@@ -235,7 +1187,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({
+                'body': json_backend.dumps({
                     'auto_update_enabled': auto_update_enabled,
                     'last_update_sell': last_update_sell.isoformat() if last_update_sell else None,
                     'last_update_buy': last_update_buy.isoformat() if last_update_buy else None,
@@ -244,9 +1196,29 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        # Проверяем кеш данных для этой стороны
+        # Поиск трейдера: обе стороны из памяти или БД, без загрузки стакана с Bybit
+        if search_user:
+            return search_response(
+                search_user,
+                query,
+                now_ts,
+                {
+                    'auto_update_enabled': auto_update_enabled,
+                    'proxy_stats': {}
+                },
+                use_gzip,
+                market
+            )
+        
+        # Long-poll: ждём новую версию стакана вместо опроса по таймеру
+        if wait_seconds and PUSH_CONFIG['enabled'] and not force_update:
+            pushed = wait_response(market, side, query, wait_seconds, auto_update_enabled, use_gzip)
+            if pushed is not None:
+                return pushed
+        
+        # Проверяем кеш данных для этой стороны рынка
         cache_key = 'sell' if side == '1' else 'buy'
-        cached = db_cache[cache_key]
+        cached = book_cache(market, cache_key)
         
         # ВСЕГДА используем memory cache если он есть (даже если устарел)
         # Это снижает нагрузку на PostgreSQL
@@ -256,71 +1228,105 @@ def handler(event: dict, context) -> dict:
             # Если кеш свежий - возвращаем немедленно
             if cache_age < DB_CACHE_TTL_SECONDS:
                 logging.info(f'[MEMORY-HIT] Fresh cache for side {side}, age: {cache_age:.1f}s')
-                return {
-                    'statusCode': 200,
-                    'headers': {
+                return book_response(
+                    cached['data'],
+                    query,
+                    {
+                        'cache_age': int(cache_age),
+                        'auto_update_enabled': auto_update_enabled,
+                        'proxy_stats': {}
+                    },
+                    {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*',
                         'X-Cache': 'MEMORY-HIT',
                         'X-Cache-Age': str(int(cache_age))
                     },
-                    'body': json.dumps({
-                        'offers': cached['data']['offers'],
-                        'total': cached['data']['total'],
-                        'side': cached['data']['side'],
-                        'from_cache': True,
-                        'cache_age': int(cache_age),
-                        'auto_update_enabled': auto_update_enabled,
-                        'proxy_stats': {}
-                    }),
-                    'isBase64Encoded': False
-                }
+                    use_gzip
+                )
             else:
                 # Кеш устарел, но используем его если БД недоступна
                 logging.info(f'[STALE-CACHE] Cache expired ({cache_age:.1f}s), trying DB...')
         else:
             logging.info(f'[NO-CACHE] No memory cache, need to fetch from DB')
         
+        # Свежая точечная загрузка под этот фильтр
+        if upstream is not None:
+            targeted = filter_cache.get(FilterCache.key(market.key, side, upstream), now_ts)
+            if targeted is not None:
+                targeted_age = (now_ts - targeted['timestamp']).total_seconds()
+                logging.info(f'[FILTER-HIT] {upstream} for side {side}, age: {targeted_age:.1f}s')
+                return book_response(
+                    targeted,
+                    query,
+                    {
+                        'cache_age': int(targeted_age),
+                        'auto_update_enabled': auto_update_enabled,
+                        'proxy_stats': {}
+                    },
+                    {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        'X-Cache': 'FILTER-HIT',
+                        'X-Cache-Age': str(int(targeted_age))
+                    },
+                    use_gzip
+                )
+        
         # Проверяем, нужно ли обновлять данные (проверяем возраст БД в секундах)
         try:
-            should_fetch = force_update or (auto_update_enabled and db_manager.should_update_seconds(side, UPDATE_INTERVAL_SECONDS))
+            should_fetch = force_update or (auto_update_enabled and db_manager.should_update_seconds(side, UPDATE_INTERVAL_SECONDS, market))
         except Exception as e:
             logging.error(f'Error checking should_update: {e}')
             should_fetch = force_update  # Если force=true, всё равно обновляем
         
+        # Stale-while-revalidate: отдаём последний стакан сразу, обновляем в фоне.
+        # Узкий запрос (payment/amount) сначала грузит 1-2 страницы под фильтр: это быстро
+        # и свежее устаревшего стакана; полный стакан всё равно обновляется в фоне.
+        # Пустая точечная загрузка - отдаём устаревший стакан, как и без фильтров
+        if should_fetch and not force_update and STALE_WHILE_REVALIDATE_CONFIG['enabled']:
+            if upstream is not None:
+                targeted = fetch_targeted(side, query, upstream, now_ts, market)
+                upstream = None  # Повторно ниже не грузим
+                if targeted is not None:
+                    revalidate(market, side)
+                    return targeted_response(targeted, query, now_ts, auto_update_enabled, debug, use_gzip)
+            
+            stale = stale_response(
+                market, side, query, auto_update_enabled, use_gzip,
+                'STALE-REVALIDATING', STALE_WHILE_REVALIDATE_CONFIG['max_stale_seconds']
+            )
+            if stale is not None:
+                revalidate(market, side)
+                return stale
+        
         if not should_fetch:
             # Возвращаем данные из базы
             try:
-                offers = db_manager.get_offers(side)
-                last_update = db_manager.get_last_update(side)
+                offers = db_manager.get_offers(side, market)
+                last_update = db_manager.get_last_update(side, market)
                 
-                # Сохраняем в память
-                db_cache[cache_key]['data'] = {
-                    'offers': offers,
-                    'total': len(offers),
-                    'side': 'sell' if side == '1' else 'buy'
-                }
-                db_cache[cache_key]['timestamp'] = now_ts
+                # Сохраняем в память вместе с готовым телом ответа и OrderBook:
+                # JSON, gzip и колонки стакана строятся один раз, а не на каждый MEMORY-HIT
+                entry = cache_entry(offers, cache_key, market)
+                publish_book(market, cache_key, entry, now_ts)
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {
+                return book_response(
+                    entry,
+                    query,
+                    {
+                        'last_update': last_update.isoformat() if last_update else None,
+                        'auto_update_enabled': auto_update_enabled,
+                        'proxy_stats': {}
+                    },
+                    {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*',
                         'X-Cache': 'DB-HIT',
                         'X-Last-Update': last_update.isoformat() if last_update else ''
                     },
-                    'body': json.dumps({
-                        'offers': offers,
-                        'total': len(offers),
-                        'side': 'sell' if side == '1' else 'buy',
-                        'from_cache': True,
-                        'last_update': last_update.isoformat() if last_update else None,
-                        'auto_update_enabled': auto_update_enabled,
-                        'proxy_stats': {}
-                    }),
-                    'isBase64Encoded': False
-                }
+                    use_gzip
+                )
             except Exception as e:
                 logging.error(f'[DB-ERROR] Failed to read from DB: {e}')
                 
@@ -328,26 +1334,23 @@ def handler(event: dict, context) -> dict:
                 if cached['data'] is not None:
                     cache_age = (now_ts - cached['timestamp']).total_seconds()
                     logging.warning(f'[FALLBACK] Using stale cache ({cache_age:.0f}s old) due to DB error')
-                    return {
-                        'statusCode': 200,
-                        'headers': {
+                    return book_response(
+                        cached['data'],
+                        query,
+                        {
+                            'cache_age': int(cache_age),
+                            'warning': 'Using cached data due to DB unavailability',
+                            'auto_update_enabled': auto_update_enabled,
+                            'proxy_stats': {}
+                        },
+                        {
                             'Content-Type': 'application/json',
                             'Access-Control-Allow-Origin': '*',
                             'X-Cache': 'STALE-FALLBACK',
                             'X-Cache-Age': str(int(cache_age))
                         },
-                        'body': json.dumps({
-                            'offers': cached['data']['offers'],
-                            'total': cached['data']['total'],
-                            'side': cached['data']['side'],
-                            'from_cache': True,
-                            'cache_age': int(cache_age),
-                            'warning': 'Using cached data due to DB unavailability',
-                            'auto_update_enabled': auto_update_enabled,
-                            'proxy_stats': {}
-                        }),
-                        'isBase64Encoded': False
-                    }
+                        use_gzip
+                    )
                 
                 # Нет кеша вообще - загружаем с Bybit
                 logging.warning(f'[NO-CACHE] No cache available, fetching from Bybit')
@@ -356,195 +1359,52 @@ def handler(event: dict, context) -> dict:
         logging.error(f'Error reading from database: {e}')
         # При ошибке БД продолжаем обычную загрузку
     
-    cache_key = f'offers_{side}'
+    cache_key = f'offers_{market.key}_{side}'
+    side_name = 'sell' if side == '1' else 'buy'
     now = datetime.now()
     
     try:
-        url = 'https://api2.bybit.com/fiat/otc/item/online'
-        
-        user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        ]
-        
-        accept_languages = [
-            'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'en-US,en;q=0.9',
-            'ru;q=0.9,en;q=0.8'
-        ]
-        
-        referers = [
-            'https://www.bybit.com/fiat/trade/otc/?actionType=1&token=USDT&fiat=RUB&paymentMethod=',
-            'https://www.bybit.com/fiat/trade/otc/?actionType=0&token=USDT&fiat=RUB&paymentMethod=',
-            'https://www.bybit.com/fiat/trade/otc/'
-        ]
+        # Узкий запрос - грузим с Bybit только офферы под фильтр
+        if upstream is not None:
+            targeted = fetch_targeted(side, query, upstream, now, market)
+            if targeted is not None:
+                return targeted_response(targeted, query, now, auto_update_enabled, debug, use_gzip)
         
-        all_offers = []
-        page = 1
-        total_items = 0
-        start_time = time.time()
-        
-        # Если limit=quick, загружаем только 2 страницы (200 офферов)
+        # Если limit=quick, загружаем только первые страницы (не больше max_pages рынка)
         if limit == 'quick':
-            MAX_PAGES = 2  # Только топ-200 для быстрого ответа
-            TIMEOUT_SECONDS = 5  # Быстрый таймаут
-            logging.info(f'[QUICK MODE] Loading only top 200 offers for side {side}')
+            MAX_PAGES = min(BOOK_FETCH_CONFIG['quick_max_pages'], market_max_pages(market, side))
+            TIMEOUT_SECONDS = BOOK_FETCH_CONFIG['quick_timeout_seconds']  # Быстрый таймаут
+            logging.info(f'[QUICK MODE] Loading only top {MAX_PAGES * 100} offers for side {side}')
         else:
-            MAX_PAGES = 8  # Максимум 8 страниц = 800 офферов
-            TIMEOUT_SECONDS = 15  # Общий таймаут на загрузку всех страниц
+            MAX_PAGES = market_max_pages(market, side)  # 100 офферов на страницу
+            TIMEOUT_SECONDS = BOOK_FETCH_CONFIG['timeout_seconds']  # Общий таймаут на загрузку всех страниц
             logging.info(f'[FULL MODE] Loading up to {MAX_PAGES * 100} offers for side {side}')
         
-        # Параллельная загрузка страниц батчами
-        while True:
-            # Проверка таймаута
-            elapsed = time.time() - start_time
-            if elapsed > TIMEOUT_SECONDS:
-                logging.warning(f'Timeout reached after {elapsed:.1f}s, stopping at page {page}')
-                break
-            
-            # Проверка лимита страниц
-            if page > MAX_PAGES:
-                logging.warning(f'Max pages limit ({MAX_PAGES}) reached')
-                break
-            batch_pages = list(range(page, page + PARALLEL_REQUESTS))
-            batch_results = []
-            
-            # Загружаем батч страниц параллельно
-            with ThreadPoolExecutor(max_workers=PARALLEL_REQUESTS) as executor:
-                futures = {
-                    executor.submit(fetch_page, p, side, url, user_agents, accept_languages, referers): p 
-                    for p in batch_pages
-                }
-                
-                for future in as_completed(futures):
-                    try:
-                        page_num, items, success = future.result()
-                        if success:
-                            batch_results.append((page_num, items))
-                    except Exception as e:
-                        logging.error(f'Error in parallel fetch: {e}')
-            
-            # Сортируем результаты по номеру страницы
-            batch_results.sort(key=lambda x: x[0])
-            
-            # Проверяем на пустую страницу и обрабатываем результаты
-            has_empty_page = False
-            for page_num, items in batch_results:
-                if not items:
-                    has_empty_page = True
-                    break
-                
-                # Обрабатываем каждый item со страницы
-                for item in items:
-                    if not isinstance(item, dict):
-                        continue
-                    
-                    # Методы оплаты (payments - это массив ID строк, например ["14", "40"])
-                    payments = item.get('payments', [])
-                    if not isinstance(payments, list):
-                        payments = []
-                    
-                    payment_methods = []
-                    for payment_id in payments:
-                        if isinstance(payment_id, str):
-                            payment_name = PAYMENT_METHOD_MAP.get(payment_id, f'Payment #{payment_id}')
-                            payment_methods.append(payment_name)
-                    
-                    # Лимиты
-                    min_amt = float(item.get('minAmount', 0))
-                    max_amt = float(item.get('maxAmount', 0))
-                    is_triangle = abs(max_amt - min_amt) <= 1.0
-                    
-                    # Онлайн статус
-                    is_online = bool(item.get('isOnline', False))
-                    last_logout_time = item.get('lastLogoutTime', '')
-                    
-                    # Определяем тип мерчанта по Verified Advertiser тегам
-                    auth_tags = item.get('authTag', [])
-                    if not isinstance(auth_tags, list):
-                        auth_tags = []
-                    
-                    merchant_type = None
-                    merchant_badge = None
-                    is_merchant = False
-                    is_block_trade = 'BA' in auth_tags
-                    
-                    if 'VA3' in auth_tags:
-                        merchant_type = 'gold'
-                        merchant_badge = 'vaGoldIcon'
-                        is_merchant = True
-                    elif 'VA2' in auth_tags:
-                        merchant_type = 'silver'
-                        merchant_badge = 'vaSilverIcon'
-                        is_merchant = True
-                    elif 'VA1' in auth_tags or 'VA' in auth_tags:
-                        merchant_type = 'bronze'
-                        merchant_badge = 'vaBronzeIcon'
-                        is_merchant = True
-                    
-                    # Формируем объект оффера (старый формат для совместимости с frontend)
-                    offer = {
-                        'id': str(item.get('id', '')),
-                        'price': float(item.get('price', 0)),
-                        'maker': str(item.get('nickName', 'Unknown')),
-                        'maker_id': str(item.get('userId', '')),
-                        'quantity': float(item.get('lastQuantity', 0)),
-                        'min_amount': min_amt,
-                        'max_amount': max_amt,
-                        'payment_methods': payment_methods,
-                        'side': 'sell' if side == '1' else 'buy',
-                        'completion_rate': int(item.get('recentOrderNum', 0)),
-                        'total_orders': int(item.get('recentExecuteRate', 0)),
-                        'is_merchant': is_merchant,
-                        'merchant_type': merchant_type,
-                        'merchant_badge': merchant_badge,
-                        'is_block_trade': is_block_trade,
-                        'is_online': is_online,
-                        'is_triangle': is_triangle,
-                        'last_logout_time': last_logout_time,
-                        'auth_tags': auth_tags
-                    }
-                    
-                    all_offers.append(offer)
-                    total_items += 1
-            
-            # Если встретили пустую страницу, прекращаем загрузку
-            if has_empty_page:
-                break
-            
-            # Переходим к следующему батчу
-            page += PARALLEL_REQUESTS
+        # Хеджирование отстающих страниц - только в FULL mode, где важен хвост
+        hedge = HEDGE_ENABLED and limit != 'quick'
         
-        # Сохраняем в БД ТОЛЬКО если это не quick mode (преобразуем формат для БД)
+        # Сохраняем в БД ТОЛЬКО если это не quick mode (строки БД строятся прямо из Offer)
         # Quick mode не сохраняет - отдаём данные быстро, full mode дозагрузит и сохранит
-        if not search_user and limit != 'quick':
-            try:
-                offers_for_db = []
-                for offer in all_offers:
-                    offers_for_db.append({
-                        'id': offer['id'],
-                        'price': offer['price'],
-                        'min_amount': offer['min_amount'],
-                        'max_amount': offer['max_amount'],
-                        'available_amount': offer['quantity'],
-                        'nickname': offer['maker'],
-                        'is_merchant': offer['is_merchant'],
-                        'merchant_type': offer['merchant_type'],
-                        'is_online': offer['is_online'],
-                        'is_triangle': offer['is_triangle'],
-                        'completion_rate': offer['completion_rate'],
-                        'completed_orders': offer['total_orders'],
-                        'payment_methods': offer['payment_methods']
-                    })
-                
-                db_manager.save_offers(offers_for_db, side)
-                logging.info(f'Successfully saved {len(offers_for_db)} offers to database for side {side}')
-            except Exception as e:
-                logging.error(f'Failed to save to database: {e}')
-        elif limit == 'quick':
+        store = limit != 'quick'
+        if not store:
             logging.info(f'[QUICK MODE] Skipping DB save, returning data immediately')
         
+        refreshed, shared = refresh_book(market, side, MAX_PAGES, TIMEOUT_SECONDS, now, hedge=hedge, store=store)
+        
+        if refreshed is None:
+            # Стакан обновляет другой инстанс - отдаём устаревший из памяти или БД
+            stale = stale_response(market, side, query, auto_update_enabled, use_gzip)
+            if stale is not None:
+                return stale
+            logging.warning(f'[NO-CACHE] No stale book for {market.key} side {side}, fetching without DB save')
+            refreshed = fetch_book(market, side, MAX_PAGES, TIMEOUT_SECONDS, now, hedge=hedge, store=False)
+        
+        all_offers = refreshed['offers']
+        
+        # Обновление учитывается в планировщике рынков один раз - ведущим вызовом
+        if refreshed['stored'] is not None and not shared and (market, side) in market_scheduler.slots:
+            market_scheduler.charge(market, side, refreshed['pages'], now)
+        
         # Обновляем кеш
         cache[cache_key] = {
             'data': all_offers,
@@ -552,28 +1412,40 @@ def handler(event: dict, context) -> dict:
         }
         
         proxy_stats = proxy_manager.get_stats()
-        
-        response_data = {
-            'offers': all_offers,
-            'total': len(all_offers),
-            'side': 'sell' if side == '1' else 'buy',
-            'from_cache': False,
+        extra = {
             'timestamp': now.isoformat(),
             'auto_update_enabled': auto_update_enabled,
             'proxy_stats': proxy_stats if debug else {}
         }
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'X-Cache': 'MISS'
-            },
-            'body': json.dumps(response_data),
-            'isBase64Encoded': False
+        headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'X-Cache': 'MISS-SHARED' if shared else 'MISS'
         }
         
+        # OrderBook и версия ленты уже есть, если полный стакан опубликован в memory cache
+        published = book_cache(market, side_name)['data']
+        if published is None or published['offers'] is not all_offers:
+            published = None
+        
+        if query is not None and query.since is not None and published is not None:
+            return feed_response(published, query.since, extra, headers, use_gzip)
+        
+        if query is None:
+            body = PreparedBody({
+                'offers': all_offers,
+                'total': len(all_offers),
+                'side': side_name,
+                'from_cache': False
+            }, RESPONSE_GZIP_LEVEL)
+            if published is not None:
+                extra['seq'] = published['seq']
+        else:
+            book = published['book'] if published is not None else OrderBook(all_offers, side_name)
+            body = PreparedBody(dict(query.run(book), from_cache=False), RESPONSE_GZIP_LEVEL)
+        
+        return offers_response(body, extra, headers, use_gzip)
+        
     except Exception as e:
         logging.error(f'Critical error in handler: {e}')
         return {
@@ -582,6 +1454,6 @@ def handler(event: dict, context) -> dict:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': f'Internal server error: {str(e)}'}),
+            'body': json_backend.dumps({'error': f'Internal server error: {str(e)}'}),
             'isBase64Encoded': False
         }
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Подключаемый JSON-бэкенд: orjson или msgspec, если установлены, иначе stdlib json
+Весь JSON функции (тела ответов, ответы Bybit) проходит через dumps/loads этого модуля
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson не установлен
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # msgspec не установлен
+    msgspec = None
+
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+# Выбранный бэкенд (см. use_backend)
+BACKEND = 'json'
+
+
+def available_backends() -> list:
+    """Бэкенды, доступные в окружении, в порядке предпочтения"""
+    installed = {'orjson': orjson, 'msgspec': msgspec, 'json': json}
+    return [name for name in BACKENDS if installed[name] is not None]
+
+
+def use_backend(name: str = 'auto') -> str:
+    """
+    Выбирает JSON-бэкенд
+
+    Args:
+        name: 'auto' (самый быстрый из установленных), 'orjson', 'msgspec' или 'json'.
+              Неустановленный бэкенд заменяется на следующий доступный
+
+    Returns:
+        Имя выбранного бэкенда
+    """
+    global BACKEND
+
+    available = available_backends()
+    if name in available:
+        BACKEND = name
+    else:
+        BACKEND = available[0]
+    return BACKEND
+
+
+def _default(obj: Any) -> Any:
+    """Сериализация объектов с to_dict() (models.Offer) для stdlib json"""
+    to_dict = getattr(obj, 'to_dict', None)
+    if to_dict is None:
+        raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+    return to_dict()
+
+
+def dumps(obj: Any) -> str:
+    """
+    Сериализует объект в JSON-строку выбранным бэкендом
+    Dataclass-объекты (models.Offer) orjson и msgspec сериализуют напрямую
+    """
+    if BACKEND == 'orjson':
+        return orjson.dumps(obj).decode('utf-8')
+    if BACKEND == 'msgspec':
+        return msgspec.json.encode(obj).decode('utf-8')
+    return json.dumps(obj, default=_default)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Разбирает JSON (bytes или str) выбранным бэкендом"""
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    if BACKEND == 'msgspec':
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+use_backend()
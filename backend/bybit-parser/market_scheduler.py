@@ -0,0 +1,97 @@
+"""
+Планировщик фонового обновления рынков P2P (stride scheduling)
+Бюджет страниц одного вызова делится между сторонами рынков пропорционально
+weight: у каждой стороны есть «проход» (pass), который растёт на pages / weight
+после обновления. Первыми обновляются стороны с наименьшим проходом, поэтому
+горячие рынки получают большую долю ёмкости прокси, а редкие - свою, без голодания
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from models import Market
+
+SIDES = ('1', '0')
+
+
+class MarketSlot:
+    """Сторона рынка в планировщике"""
+
+    __slots__ = ('market', 'side', 'weight', 'max_pages', 'pass_value', 'last_refresh')
+
+    def __init__(self, market: Market, side: str, weight: float, max_pages: int):
+        self.market = market
+        self.side = side
+        self.weight = weight
+        self.max_pages = max_pages
+        self.pass_value = 0.0
+        self.last_refresh: Optional[datetime] = None
+
+
+class MarketScheduler:
+    """
+    Выбор сторон рынков на обновление в пределах бюджета вызова
+
+    Состояние (проходы, время обновлений) живёт в тёплом контейнере между вызовами
+    """
+
+    def __init__(self, markets: List[Dict], page_budget: int, min_interval_seconds: float):
+        """
+        Args:
+            markets: Конфигурация рынков (config.MARKETS)
+            page_budget: Страниц на один вызов
+            min_interval_seconds: Минимальный интервал обновления стороны рынка
+        """
+        self.page_budget = page_budget
+        self.min_interval_seconds = min_interval_seconds
+        self.slots: Dict[Tuple[Market, str], MarketSlot] = {}
+
+        for config in markets:
+            market = Market(config['token'], config['fiat'])
+            for side in SIDES:
+                self.slots[(market, side)] = MarketSlot(
+                    market,
+                    side,
+                    max(float(config.get('weight', 1)), 0.01),
+                    max(int(config.get('max_pages', 1)), 1)
+                )
+
+    def is_due(self, slot: MarketSlot, now: datetime) -> bool:
+        """Прошёл ли минимальный интервал с последнего обновления стороны"""
+        if slot.last_refresh is None:
+            return True
+        return (now - slot.last_refresh).total_seconds() >= self.min_interval_seconds
+
+    def plan(self, now: datetime, page_budget: Optional[int] = None) -> List[Tuple[Market, str, int]]:
+        """
+        План обновления на один вызов
+
+        Returns:
+            [(market, side, pages), ...] в порядке обновления
+        """
+        budget = self.page_budget if page_budget is None else page_budget
+        due = sorted(
+            (slot for slot in self.slots.values() if self.is_due(slot, now)),
+            key=lambda slot: (slot.pass_value, -slot.weight)
+        )
+
+        plan = []
+        for slot in due:
+            if budget <= 0:
+                break
+            pages = min(slot.max_pages, budget)
+            plan.append((slot.market, slot.side, pages))
+            budget -= pages
+        return plan
+
+    def charge(self, market: Market, side: str, pages: int, now: datetime):
+        """Учитывает обновление стороны рынка: проход растёт на pages / weight"""
+        slot = self.slots[(market, side)]
+        slot.pass_value += pages / slot.weight
+        slot.last_refresh = now
+
+        # Проходы растут неограниченно - сдвигаем к нулю, порядок не меняется
+        floor = min(other.pass_value for other in self.slots.values())
+        if floor > 1e6:
+            for other in self.slots.values():
+                other.pass_value -= floor
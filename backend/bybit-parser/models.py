@@ -0,0 +1,229 @@
+"""
+Типизированные структуры парсера:
+- BybitItem - объявление из ответа Bybit P2P (item/online).
+  С msgspec страница декодируется сразу в структуры: лишние поля Bybit
+  пропускаются без создания объектов, строки-числа приводятся к float/int.
+  Без msgspec те же объекты строятся из словарей stdlib/orjson.
+- Offer - оффер парсера: один компактный объект для ответа API, записи в БД и кеша
+- Market - рынок P2P: криптовалюта (tokenId) и фиат (currencyId) Bybit
+"""
+
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+import json_backend
+from json_backend import msgspec
+
+# Маппинг ID методов оплаты Bybit на названия
+PAYMENT_METHOD_MAP = {
+    '14': 'Bank Transfer',
+    '40': 'Mobile Top-up',
+    '90': 'Cash Deposit',
+    '75': 'Наличные',
+    '64': 'Wallet',
+    '1': 'Card',
+    '29': 'QIWI',
+    '377': 'YooMoney',
+    '378': 'Tinkoff',
+    '379': 'Sberbank',
+    '62': 'Raiffeisen Bank',
+    '413': 'Rosbank'
+}
+
+# Поля объявления Bybit, которые использует парсер (атрибут, ключ в JSON)
+BYBIT_ITEM_FIELDS = (
+    ('id', 'id'),
+    ('price', 'price'),
+    ('nick_name', 'nickName'),
+    ('user_id', 'userId'),
+    ('last_quantity', 'lastQuantity'),
+    ('min_amount', 'minAmount'),
+    ('max_amount', 'maxAmount'),
+    ('payments', 'payments'),
+    ('is_online', 'isOnline'),
+    ('last_logout_time', 'lastLogoutTime'),
+    ('auth_tag', 'authTag'),
+    ('recent_order_num', 'recentOrderNum'),
+    ('recent_execute_rate', 'recentExecuteRate'),
+)
+
+
+if msgspec is not None:
+    class BybitItem(msgspec.Struct, rename='camel'):
+        """Объявление Bybit (только используемые поля)"""
+        id: str = ''
+        price: float = 0.0
+        nick_name: str = 'Unknown'
+        user_id: str = ''
+        last_quantity: float = 0.0
+        min_amount: float = 0.0
+        max_amount: float = 0.0
+        payments: List[str] = []
+        is_online: bool = False
+        last_logout_time: Any = ''
+        auth_tag: List[str] = []
+        recent_order_num: int = 0
+        recent_execute_rate: int = 0
+
+    class BybitResult(msgspec.Struct):
+        items: List[BybitItem] = []
+
+    class BybitPage(msgspec.Struct):
+        ret_code: int = -1
+        result: Optional[BybitResult] = None
+
+    # strict=False: Bybit отдаёт числа строками ("92.35") - приводим при декодировании
+    _page_decoder = msgspec.json.Decoder(BybitPage, strict=False)
+else:
+    class BybitItem:
+        """Объявление Bybit (только используемые поля)"""
+        __slots__ = tuple(attr for attr, _ in BYBIT_ITEM_FIELDS)
+
+        def __init__(
+            self,
+            id: str = '',
+            price: float = 0.0,
+            nick_name: str = 'Unknown',
+            user_id: str = '',
+            last_quantity: float = 0.0,
+            min_amount: float = 0.0,
+            max_amount: float = 0.0,
+            payments: Optional[List[str]] = None,
+            is_online: bool = False,
+            last_logout_time: Any = '',
+            auth_tag: Optional[List[str]] = None,
+            recent_order_num: int = 0,
+            recent_execute_rate: int = 0
+        ):
+            self.id = id
+            self.price = price
+            self.nick_name = nick_name
+            self.user_id = user_id
+            self.last_quantity = last_quantity
+            self.min_amount = min_amount
+            self.max_amount = max_amount
+            self.payments = payments if payments is not None else []
+            self.is_online = is_online
+            self.last_logout_time = last_logout_time
+            self.auth_tag = auth_tag if auth_tag is not None else []
+            self.recent_order_num = recent_order_num
+            self.recent_execute_rate = recent_execute_rate
+
+    _page_decoder = None
+
+
+def item_from_dict(item: Dict[str, Any]) -> BybitItem:
+    """
+    BybitItem из словаря с нестрогим приведением типов
+    (путь без msgspec и запасной путь для нестандартных ответов)
+    """
+    payments = item.get('payments', [])
+    auth_tags = item.get('authTag', [])
+
+    return BybitItem(
+        id=str(item.get('id', '')),
+        price=float(item.get('price', 0)),
+        nick_name=str(item.get('nickName', 'Unknown')),
+        user_id=str(item.get('userId', '')),
+        last_quantity=float(item.get('lastQuantity', 0)),
+        min_amount=float(item.get('minAmount', 0)),
+        max_amount=float(item.get('maxAmount', 0)),
+        payments=payments if isinstance(payments, list) else [],
+        is_online=bool(item.get('isOnline', False)),
+        last_logout_time=item.get('lastLogoutTime', ''),
+        auth_tag=auth_tags if isinstance(auth_tags, list) else [],
+        recent_order_num=int(item.get('recentOrderNum', 0)),
+        recent_execute_rate=int(item.get('recentExecuteRate', 0))
+    )
+
+
+def _decode_page_dicts(content: Union[bytes, str]) -> Optional[List[BybitItem]]:
+    """Разбор страницы через словари выбранного JSON-бэкенда"""
+    response_data = json_backend.loads(content)
+
+    if not isinstance(response_data, dict) or response_data.get('ret_code') != 0:
+        return None
+
+    result = response_data.get('result', {})
+    if not isinstance(result, dict):
+        return None
+
+    items = result.get('items', [])
+    if not isinstance(items, list):
+        return None
+
+    return [item_from_dict(item) for item in items if isinstance(item, dict)]
+
+
+def decode_page(content: Union[bytes, str]) -> Optional[List[BybitItem]]:
+    """
+    Декодирует тело ответа Bybit в список объявлений
+
+    Returns:
+        Список BybitItem или None, если ответ не успешный / не разобран
+    """
+    if _page_decoder is not None and json_backend.BACKEND != 'json':
+        try:
+            page = _page_decoder.decode(content)
+        except msgspec.ValidationError:
+            # Неожиданный тип поля - разбираем нестрого через словари
+            return _decode_page_dicts(content)
+
+        if page.ret_code != 0 or page.result is None:
+            return None
+        return page.result.items
+
+    return _decode_page_dicts(content)
+
+
+@dataclass(slots=True)
+class Offer:
+    """
+    Оффер в формате API (порядок полей = порядок ключей в JSON ответа)
+
+    Один объект на оффер вместо словарей для ответа, БД и кеша:
+    orjson и msgspec сериализуют его напрямую, для stdlib json см. json_backend,
+    строку БД строит DatabaseManager._offer_row
+    """
+    id: str
+    price: float
+    maker: str
+    maker_id: str
+    quantity: float
+    min_amount: float
+    max_amount: float
+    payment_methods: List[str]
+    side: str
+    completion_rate: int
+    total_orders: int
+    is_merchant: bool
+    merchant_type: Optional[str]
+    merchant_badge: Optional[str]
+    is_block_trade: bool
+    is_online: bool
+    is_triangle: bool
+    last_logout_time: Any
+    auth_tags: List[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь с ключами API (для stdlib json и внешнего кода)"""
+        return {name: getattr(self, name) for name in OFFER_FIELDS}
+
+
+# Имена полей Offer в порядке ключей API
+OFFER_FIELDS = tuple(field.name for field in fields(Offer))
+
+
+class Market(NamedTuple):
+    """Рынок P2P: tokenId и currencyId в запросе Bybit, ключ кеша и колонки БД"""
+    token: str
+    fiat: str
+
+    @property
+    def key(self) -> str:
+        """Ключ рынка для кеша и логов: 'USDT/RUB'"""
+        return f'{self.token}/{self.fiat}'
+
+
+# Рынок по умолчанию (исторически единственный)
+DEFAULT_MARKET = Market('USDT', 'RUB')
@@ -0,0 +1,247 @@
+"""
+Колоночное представление стакана на NumPy
+Строится один раз на обновление стакана и переиспользуется кешем и аналитикой:
+фильтры и агрегаты (лучшая цена, глубина, VWAP) считаются векторно, без циклов по офферам
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from models import Offer, PAYMENT_METHOD_MAP
+
+# Бит способа оплаты в payment_mask (порядок PAYMENT_METHOD_MAP)
+PAYMENT_BITS: Dict[str, int] = {
+    name: 1 << index for index, name in enumerate(PAYMENT_METHOD_MAP.values())
+}
+# Все способы, которых нет в PAYMENT_METHOD_MAP ("Payment #N")
+OTHER_PAYMENT_BIT = 1 << len(PAYMENT_BITS)
+OTHER_PAYMENT = 'other'
+
+# Уровень мерчанта (Verified Advertiser): 0 - не мерчант
+MERCHANT_TIERS: Dict[Optional[str], int] = {
+    None: 0,
+    'bronze': 1,
+    'silver': 2,
+    'gold': 3
+}
+
+
+def payment_mask(payment_methods: Iterable[str]) -> int:
+    """Битовая маска по названиям способов оплаты"""
+    mask = 0
+    for name in payment_methods:
+        mask |= PAYMENT_BITS.get(name, OTHER_PAYMENT_BIT)
+    return mask
+
+
+class OrderBook:
+    """
+    Стакан одной стороны в колонках
+
+    Колонки (индекс i - оффер offers[i]):
+    - price, min_amount, max_amount, quantity: float64
+    - completion_rate, total_orders: int64 (как в Offer)
+    - payment_mask: uint32, бит на способ оплаты (PAYMENT_BITS)
+    - merchant_tier: int8 (MERCHANT_TIERS), is_online, is_block_trade: bool
+
+    order - индексы от лучшей цены к худшей: для продавцов (sell)
+    лучшая цена минимальная, для покупателей (buy) - максимальная
+    """
+
+    def __init__(self, offers: List[Offer], side: str):
+        """
+        Args:
+            offers: Офферы стороны
+            side: 'sell' или 'buy' (как Offer.side)
+        """
+        self.offers = offers
+        self.side = side
+        count = len(offers)
+
+        def column(attr: str, dtype) -> np.ndarray:
+            return np.fromiter((getattr(offer, attr) for offer in offers), dtype=dtype, count=count)
+
+        self.price = column('price', np.float64)
+        self.min_amount = column('min_amount', np.float64)
+        self.max_amount = column('max_amount', np.float64)
+        self.quantity = column('quantity', np.float64)
+        self.completion_rate = column('completion_rate', np.int64)
+        self.total_orders = column('total_orders', np.int64)
+        self.is_online = column('is_online', np.bool_)
+        self.is_block_trade = column('is_block_trade', np.bool_)
+        self.payment_mask = np.fromiter(
+            (payment_mask(offer.payment_methods) for offer in offers),
+            dtype=np.uint32,
+            count=count
+        )
+        self.merchant_tier = np.fromiter(
+            (MERCHANT_TIERS.get(offer.merchant_type, 0) for offer in offers),
+            dtype=np.int8,
+            count=count
+        )
+
+        order = np.argsort(self.price, kind='stable')
+        self.order = order if side == 'sell' else order[::-1]
+
+        # Индексы категориальных атрибутов: готовые маски на каждое значение,
+        # фильтр по ним - выборка из словаря и побитовое И без пересчёта колонок
+        self.payment_index: Dict[str, np.ndarray] = {
+            name: (self.payment_mask & bit) != 0 for name, bit in PAYMENT_BITS.items()
+        }
+        self.payment_index[OTHER_PAYMENT] = (self.payment_mask & OTHER_PAYMENT_BIT) != 0
+        self.merchant_index: Dict[str, np.ndarray] = {
+            name: self.merchant_tier == tier for name, tier in MERCHANT_TIERS.items() if name
+        }
+        self.merchant_index['merchant'] = self.merchant_tier > 0
+        self.merchant_index['none'] = self.merchant_tier == 0
+        self.online_index: Dict[bool, np.ndarray] = {
+            True: self.is_online,
+            False: ~self.is_online
+        }
+
+    def __len__(self) -> int:
+        return len(self.offers)
+
+    def mask(
+        self,
+        payment: Optional[Iterable[str]] = None,
+        merchant_type: Optional[str] = None,
+        online: Optional[bool] = None,
+        amount: Optional[float] = None,
+        min_completion: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Векторный фильтр офферов (условия объединяются через И)
+
+        Args:
+            payment: Названия способов оплаты - подходит оффер хотя бы с одним из них
+                     ('other' - способы вне PAYMENT_METHOD_MAP)
+            merchant_type: 'gold'/'silver'/'bronze', 'merchant' (любой уровень) или 'none'
+            online: Только онлайн (True) или только офлайн (False)
+            amount: Сумма в RUB, попадающая в лимиты оффера [min_amount, max_amount]
+            min_completion: Минимальный процент выполнения (total_orders, см. V0002)
+
+        Returns:
+            Булев массив длины len(offers)
+        """
+        result = np.ones(len(self.offers), dtype=np.bool_)
+
+        if payment is not None:
+            matched = np.zeros(len(self.offers), dtype=np.bool_)
+            for name in payment:
+                index = self.payment_index.get(name)
+                if index is None:
+                    index = self.payment_index[OTHER_PAYMENT]
+                matched |= index
+            result &= matched
+
+        if merchant_type is not None:
+            index = self.merchant_index.get(merchant_type)
+            if index is None:
+                result[:] = False
+            else:
+                result &= index
+
+        if online is not None:
+            result &= self.online_index[bool(online)]
+
+        if amount is not None:
+            result &= (self.min_amount <= amount) & (self.max_amount >= amount)
+
+        if min_completion is not None:
+            result &= self.total_orders >= min_completion
+
+        return result
+
+    def indices(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Индексы подходящих офферов от лучшей цены к худшей"""
+        if mask is None:
+            return self.order
+        return self.order[mask[self.order]]
+
+    def select(self, mask: Optional[np.ndarray] = None) -> List[Offer]:
+        """Подходящие офферы от лучшей цены к худшей"""
+        offers = self.offers
+        return [offers[i] for i in self.indices(mask)]
+
+    def best_price(self, mask: Optional[np.ndarray] = None) -> Optional[float]:
+        """Лучшая цена среди подходящих офферов (None, если их нет)"""
+        indices = self.indices(mask)
+        if not len(indices):
+            return None
+        return float(self.price[indices[0]])
+
+    def liquidity(self, indices: np.ndarray) -> np.ndarray:
+        """Доступный объём офферов в RUB: остаток в USDT по цене, но не больше max_amount"""
+        return np.minimum(self.quantity[indices] * self.price[indices], self.max_amount[indices])
+
+    def depth(self, percent: float, mask: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """
+        Глубина стакана в пределах percent % от лучшей цены
+
+        Returns:
+            {'offers', 'quantity' (USDT), 'amount' (RUB)}
+        """
+        indices = self.indices(mask)
+        if not len(indices):
+            return {'offers': 0, 'quantity': 0.0, 'amount': 0.0}
+
+        prices = self.price[indices]
+        best = prices[0]
+        if self.side == 'sell':
+            within = prices <= best * (1 + percent / 100)
+        else:
+            within = prices >= best * (1 - percent / 100)
+
+        selected = indices[within]
+        return {
+            'offers': int(within.sum()),
+            'quantity': float(self.quantity[selected].sum()),
+            'amount': float(self.liquidity(selected).sum())
+        }
+
+    def vwap(self, amount: float, mask: Optional[np.ndarray] = None) -> Optional[float]:
+        """
+        Средневзвешенная цена исполнения сделки на amount RUB
+        по офферам от лучшей цены к худшей (минимальные лимиты не учитываются)
+
+        Returns:
+            Цена или None, если ликвидности не хватает
+        """
+        indices = self.indices(mask)
+        if amount <= 0 or not len(indices):
+            return None
+
+        liquidity = self.liquidity(indices)
+        filled_before = np.cumsum(liquidity) - liquidity
+        taken = np.clip(amount - filled_before, 0, liquidity)
+        if taken.sum() < amount - 1e-9:
+            return None
+
+        bought = (taken / self.price[indices]).sum()
+        return float(amount / bought)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """
+        Сводка стакана для истории (строка book_summary)
+
+        Returns:
+            best_price, offers_count, total_quantity, глубина в пределах 0.5% и 1%
+            от лучшей цены (depth_05_*, depth_1_*), merchant_share (доля офферов
+            мерчантов), online_count
+        """
+        count = len(self.offers)
+        depth_05 = self.depth(0.5)
+        depth_1 = self.depth(1.0)
+        return {
+            'best_price': self.best_price(),
+            'offers_count': count,
+            'total_quantity': float(self.quantity.sum()),
+            'depth_05_quantity': depth_05['quantity'],
+            'depth_05_amount': depth_05['amount'],
+            'depth_1_quantity': depth_1['quantity'],
+            'depth_1_amount': depth_1['amount'],
+            'merchant_share': float(self.merchant_index['merchant'].mean()) if count else 0.0,
+            'online_count': int(self.is_online.sum())
+        }
@@ -0,0 +1,217 @@
+"""
+Состояние здоровья прокси: EWMA задержки, доля успехов,
+недавние 429/таймауты и circuit breaker с периодом остывания
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class ProxyHealth:
+    """
+    Здоровье одного прокси
+
+    Circuit breaker:
+    - CLOSED: прокси используется как обычно
+    - OPEN: после failure_threshold ошибок подряд прокси пропускается
+      на cooldown секунд (при повторных срывах период удваивается)
+    - HALF_OPEN: после остывания пропускается один пробный запрос,
+      успех закрывает breaker, ошибка открывает его снова
+
+    429 не считается отказом прокси: прокси отвечает, частоту снижает rate limiter
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        ewma_alpha: float = 0.3,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        window: float = 60.0,
+        initial_latency: float = 1.0,
+        latency_samples: int = 100
+    ):
+        """
+        Args:
+            ewma_alpha: Вес нового наблюдения в EWMA (0.0-1.0)
+            failure_threshold: Ошибок подряд до открытия breaker
+            cooldown: Начальный период остывания открытого breaker (секунды)
+            max_cooldown: Максимальный период остывания (секунды)
+            window: Окно учёта недавних 429 и таймаутов (секунды)
+            initial_latency: Оценка задержки до первого наблюдения (секунды)
+            latency_samples: Сколько последних успешных задержек хранить для перцентилей
+        """
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.window = window
+
+        self.latency_ewma = initial_latency
+        self.success_rate = 1.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+
+        self.state = self.CLOSED
+        self.cooldown = cooldown
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+
+        self._latencies = deque(maxlen=latency_samples)
+        self._recent_429 = deque()
+        self._recent_timeouts = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, events: deque, now: float) -> int:
+        """Удаляет события старше окна и возвращает количество оставшихся"""
+        while events and now - events[0] > self.window:
+            events.popleft()
+        return len(events)
+
+    def is_available(self, now: Optional[float] = None) -> bool:
+        """Можно ли отправить запрос через прокси (без изменения состояния)"""
+        now = now or time.time()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return now - self.opened_at >= self.cooldown
+            return not self.probe_in_flight
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        """
+        Проверка доступности и отметка отправки одной операцией:
+        после остывания пробный запрос получает только первый из конкурентных вызовов
+
+        Returns:
+            True - запрос можно отправить через прокси
+        """
+        now = now or time.time()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def release_probe(self):
+        """Освобождает пробный слот без учёта результата (запрос отменён)"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_success(self, latency: float):
+        """Учитывает успешный ответ"""
+        with self._lock:
+            self.requests += 1
+            self.latency_ewma += self.ewma_alpha * (latency - self.latency_ewma)
+            self.success_rate += self.ewma_alpha * (1.0 - self.success_rate)
+            self._latencies.append(latency)
+            self.consecutive_failures = 0
+
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self.cooldown = self.base_cooldown
+                self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(
+        self,
+        latency: Optional[float] = None,
+        rate_limited: bool = False,
+        timeout: bool = False,
+        now: Optional[float] = None
+    ):
+        """
+        Учитывает неудачный запрос
+
+        Args:
+            latency: Время до ошибки (для таймаута - фактическое ожидание)
+            rate_limited: Ответ 429 - штраф в score, но не отказ для circuit breaker
+            timeout: Таймаут запроса
+        """
+        now = now or time.time()
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.success_rate += self.ewma_alpha * (0.0 - self.success_rate)
+
+            if latency is not None:
+                self.latency_ewma += self.ewma_alpha * (latency - self.latency_ewma)
+
+            if timeout:
+                self._recent_timeouts.append(now)
+
+            if rate_limited:
+                # Прокси доступен - состояние breaker не меняется, проба освобождается
+                self._recent_429.append(now)
+                self.probe_in_flight = False
+                return
+
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN:
+                # Пробный запрос не прошёл - остываем дольше
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self.state = self.OPEN
+                self.opened_at = now
+            elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = now
+            self.probe_in_flight = False
+
+    def latency_percentile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Перцентиль задержки успешных запросов
+
+        Args:
+            q: Квантиль (0.0-1.0), например 0.9 для p90
+            min_samples: Минимум замеров, иначе None
+
+        Returns:
+            Задержка в секундах или None при недостатке данных
+        """
+        with self._lock:
+            if len(self._latencies) < max(min_samples, 1):
+                return None
+            ordered = sorted(self._latencies)
+        index = min(int(q * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+    def score(self, now: Optional[float] = None) -> float:
+        """
+        Ожидаемая стоимость запроса через прокси (меньше - лучше):
+        EWMA задержки, делённая на долю успехов, со штрафом за недавние 429 и таймауты
+        """
+        now = now or time.time()
+        with self._lock:
+            recent_429 = self._trim(self._recent_429, now)
+            recent_timeouts = self._trim(self._recent_timeouts, now)
+            penalty = 1.0 + 0.5 * recent_429 + 1.0 * recent_timeouts
+            return self.latency_ewma * penalty / max(self.success_rate, 0.05)
+
+    def snapshot(self) -> Dict:
+        """Состояние для get_stats()"""
+        now = time.time()
+        score = self.score(now)
+        with self._lock:
+            return {
+                'state': self.state,
+                'latency_ewma': round(self.latency_ewma, 3),
+                'success_rate': round(self.success_rate * 100, 1),
+                'requests': self.requests,
+                'failures': self.failures,
+                'recent_429': self._trim(self._recent_429, now),
+                'recent_timeouts': self._trim(self._recent_timeouts, now),
+                'score': round(score, 3)
+            }
@@ -6,9 +6,15 @@
 import requests
 import random
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, List, Tuple
-from datetime import datetime
+from urllib.parse import urlsplit
+
+from proxy_health import ProxyHealth
+from rate_limiter import RateLimiter, parse_retry_after
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -20,16 +26,27 @@ class ProxyManager:
     - Авторизации (логин/пароль)
     - Ротации при ошибках
     - Автоматического fallback на прямое подключение
+    - Постоянных keep-alive сессий (отдельная сессия на каждый прокси и DIRECT)
+    - Адаптивного выбора прокси по здоровью (EWMA задержки, успехи, circuit breaker)
+    - Хеджирования медленных запросов дублем через другой прокси (opt-in)
+    - Ограничения частоты (token bucket на прокси и на хост, AIMD по 429)
     - Детального логирования
     """
     
+    DIRECT_KEY = 'DIRECT'
+    
     def __init__(
         self, 
         proxies_list: List[str],
         use_probability: float = 0.7,
         max_retries: int = 3,
         timeout: int = 10,
-        enable_logging: bool = True
+        enable_logging: bool = True,
+        pool_connections: int = 2,
+        pool_maxsize: int = 10,
+        health_config: Optional[Dict] = None,
+        hedge_config: Optional[Dict] = None,
+        rate_limit_config: Optional[Dict] = None
     ):
         """
         Инициализация менеджера прокси
@@ -40,25 +57,68 @@ class ProxyManager:
             max_retries: Максимальное количество попыток
             timeout: Таймаут запроса в секундах
             enable_logging: Включить логирование
+            pool_connections: Количество пулов хостов в HTTPAdapter каждой сессии
+            pool_maxsize: Максимум keep-alive соединений в пуле одного хоста
+            health_config: Параметры ProxyHealth (EWMA, порог и остывание breaker)
+            hedge_config: Параметры хеджирования (percentile, max_ratio,
+                default_delay, min_delay, min_samples)
+            rate_limit_config: Параметры RateLimiter (скорости, всплески, AIMD)
         """
         self.proxies = self._parse_proxies(proxies_list)
         self.use_probability = use_probability
         self.max_retries = max_retries
         self.timeout = timeout
         self.enable_logging = enable_logging
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        
+        # Долгоживущие сессии: переживают вызовы handler в тёплом контейнере
+        self._sessions: Dict[str, requests.Session] = {}
+        self._sessions_lock = threading.Lock()
+        
+        # Здоровье каждого прокси (ключ - IP:PORT)
+        self.health: Dict[str, ProxyHealth] = {
+            proxy['_meta']['display']: ProxyHealth(**(health_config or {}))
+            for proxy in self.proxies
+        }
+        
+        # Хеджирование: дубль уходит после перцентиля задержки прокси,
+        # доля хеджей ограничена max_ratio от всех запросов
+        self.hedge_config = {
+            'percentile': 0.9,
+            'max_ratio': 0.1,
+            'default_delay': 3.0,
+            'min_delay': 0.5,
+            'min_samples': 10
+        }
+        self.hedge_config.update(hedge_config or {})
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        
+        # Token bucket на каждый прокси и на хост апстрима
+        self.rate_limiter = RateLimiter(**(rate_limit_config or {}))
         
-        # Статистика
+        # Статистика (счётчики меняются из потоков загрузки и хеджирования - см. _count)
+        self._stats_lock = threading.Lock()
         self.stats = {
             'total_requests': 0,
             'proxy_requests': 0,
             'direct_requests': 0,
             'proxy_errors': 0,
-            'successful_requests': 0
+            'successful_requests': 0,
+            'hedged_requests': 0,
+            'hedge_wins': 0,
+            'rate_limited': 0,
+            'rate_limit_wait': 0.0
         }
         
         if self.enable_logging:
             print(f"[ProxyManager] Initialized with {len(self.proxies)} proxies")
     
+    def _count(self, name: str, value: float = 1):
+        """Увеличивает счётчик статистики под блокировкой"""
+        with self._stats_lock:
+            self.stats[name] += value
+    
     def _parse_proxies(self, proxies_list: List[str]) -> List[Dict[str, str]]:
         """
         Преобразует список прокси из формата IP:PORT:LOGIN:PASSWORD
@@ -97,9 +157,13 @@ class ProxyManager:
         
         return parsed
     
-    def _get_random_proxy(self) -> Optional[Dict[str, str]]:
+    def _select_proxy(self, exclude: Optional[set] = None) -> Optional[Dict[str, str]]:
         """
-        Возвращает случайный прокси из списка
+        Выбирает прокси по здоровью: power-of-two-choices по score
+        среди прокси с закрытым (или готовым к пробе) circuit breaker
+        
+        Args:
+            exclude: Ключи прокси, уже опробованных в этом запросе
         
         Returns:
             Словарь прокси или None (для прямого подключения)
@@ -111,7 +175,326 @@ class ProxyManager:
         if random.random() > self.use_probability:
             return None
         
-        return random.choice(self.proxies)
+        now = time.time()
+        available = [
+            proxy for proxy in self.proxies
+            if self.health[proxy['_meta']['display']].is_available(now)
+        ]
+        candidates = [
+            proxy for proxy in available
+            if not exclude or proxy['_meta']['display'] not in exclude
+        ] or available
+        
+        # Доступность проверена без блокировки: пробный слот после остывания мог забрать
+        # конкурентный запрос, тогда выбираем среди оставшихся
+        while candidates:
+            if len(candidates) == 1:
+                chosen = candidates[0]
+            else:
+                first, second = random.sample(candidates, 2)
+                first_score = self.health[first['_meta']['display']].score(now)
+                second_score = self.health[second['_meta']['display']].score(now)
+                chosen = first if first_score <= second_score else second
+            
+            if self.health[chosen['_meta']['display']].try_acquire(now):
+                return chosen
+            candidates = [proxy for proxy in candidates if proxy is not chosen]
+        
+        # Все прокси на остывании - идём напрямую
+        return None
+    
+    def _record_result(
+        self,
+        proxy: Optional[Dict],
+        response_time: float,
+        status_code: Optional[int] = None,
+        timeout: bool = False
+    ):
+        """
+        Обновляет здоровье прокси по результату запроса
+        
+        Args:
+            proxy: Использованный прокси (None для DIRECT - не отслеживается)
+            response_time: Время выполнения запроса
+            status_code: HTTP код ответа (None при сетевой ошибке)
+            timeout: Запрос завершился таймаутом
+        """
+        if not proxy:
+            return
+        
+        health = self.health.get(proxy['_meta']['display'])
+        if health is None:
+            return
+        
+        if status_code in [200, 201]:
+            health.record_success(response_time)
+        else:
+            health.record_failure(
+                latency=response_time,
+                rate_limited=status_code == 429,
+                timeout=timeout
+            )
+    
+    def _release_proxy(self, proxy: Optional[Dict]):
+        """Освобождает пробный слот прокси, если запрос был отменён без результата"""
+        if proxy:
+            health = self.health.get(proxy['_meta']['display'])
+            if health is not None:
+                health.release_probe()
+    
+    def _hedge_delay(self, proxy: Optional[Dict]) -> float:
+        """
+        Через сколько секунд без ответа отправлять дубль запроса:
+        перцентиль задержки этого прокси (или default_delay без истории)
+        """
+        config = self.hedge_config
+        delay = None
+        
+        if proxy:
+            health = self.health.get(proxy['_meta']['display'])
+            if health is not None:
+                delay = health.latency_percentile(config['percentile'], config['min_samples'])
+        
+        if delay is None:
+            delay = config['default_delay']
+        
+        return min(max(delay, config['min_delay']), self.timeout)
+    
+    def _hedge_allowed(self) -> bool:
+        """Не превышена ли допустимая доля хеджированных запросов"""
+        with self._stats_lock:
+            budget = self.hedge_config['max_ratio'] * self.stats['total_requests']
+            return self.stats['hedged_requests'] < max(budget, 1)
+    
+    def _select_hedge_proxy(self, proxy: Optional[Dict], tried: set) -> Optional[Dict]:
+        """Выбирает прокси для дубля (отличный от основного) и учитывает его в статистике"""
+        exclude = set(tried)
+        if proxy:
+            exclude.add(proxy['_meta']['display'])
+        
+        hedge_proxy = self._select_proxy(exclude=exclude)
+        
+        self._count('hedged_requests')
+        if hedge_proxy:
+            tried.add(hedge_proxy['_meta']['display'])
+            self._count('proxy_requests')
+        else:
+            self._count('direct_requests')
+        
+        return hedge_proxy
+    
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков для хеджированных запросов (создаётся один раз)"""
+        with self._sessions_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=self.pool_maxsize * 2,
+                    thread_name_prefix='proxy-hedge'
+                )
+            return self._hedge_executor
+    
+    def _reserve_rate_limit(self, proxy: Optional[Dict], url: str) -> float:
+        """
+        Забирает токен у ведра прокси и ведра хоста
+        
+        Returns:
+            Сколько секунд нужно подождать перед запросом
+        """
+        wait = self.rate_limiter.reserve(self._session_key(proxy), urlsplit(url).netloc)
+        if wait > 0:
+            self._count('rate_limit_wait', wait)
+        return wait
+    
+    def _wait_rate_limit(self, proxy: Optional[Dict], url: str):
+        """Ждёт токен в ведре прокси и хоста перед запросом"""
+        wait = self._reserve_rate_limit(proxy, url)
+        if wait > 0:
+            time.sleep(wait)
+    
+    def _record_rate(self, proxy: Optional[Dict], url: str, response):
+        """
+        Обратная связь для rate limiter: 429 уменьшает скорость
+        (с учётом Retry-After), успешный ответ медленно её восстанавливает
+        """
+        proxy_key = self._session_key(proxy)
+        host = urlsplit(url).netloc
+        
+        if response.status_code == 429:
+            self._count('rate_limited')
+            self.rate_limiter.on_throttle(
+                proxy_key,
+                host,
+                parse_retry_after(response.headers.get('Retry-After'))
+            )
+        elif response.status_code in [200, 201]:
+            self.rate_limiter.on_success(proxy_key, host)
+    
+    def _is_timeout(self, error: Optional[BaseException]) -> bool:
+        """Является ли ошибка таймаутом запроса"""
+        return isinstance(error, requests.exceptions.Timeout)
+    
+    def _record_outcome(self, outcome: Tuple, url: str):
+        """Учитывает в здоровье прокси и rate limiter результат (proxy, время, ответ, ошибка)"""
+        proxy, response_time, response, error = outcome
+        if response is not None:
+            self._record_result(proxy, response_time, response.status_code)
+            self._record_rate(proxy, url, response)
+        else:
+            self._record_result(proxy, response_time, timeout=self._is_timeout(error))
+    
+    def _send_hedged(
+        self,
+        proxy: Optional[Dict],
+        tried: set,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> Tuple[Optional[Dict], float, requests.Response]:
+        """
+        Отправляет запрос и, если он не ответил за _hedge_delay, дубль через другой прокси.
+        Побеждает первый успешный ответ; результат проигравшего учитывается
+        в здоровье прокси, когда он завершится.
+        
+        Returns:
+            (прокси победителя, время ответа, Response)
+            
+        Raises:
+            Исключение основного запроса, если не удался ни один
+        """
+        executor = self._get_hedge_executor()
+        
+        def send(current_proxy: Optional[Dict]) -> Tuple:
+            self._wait_rate_limit(current_proxy, url)
+            started = time.time()
+            try:
+                response = self._get_session(current_proxy).request(
+                    method=method,
+                    url=url,
+                    timeout=self.timeout,
+                    **kwargs
+                )
+                return (current_proxy, time.time() - started, response, None)
+            except Exception as e:
+                return (current_proxy, time.time() - started, None, e)
+        
+        primary = executor.submit(send, proxy)
+        
+        try:
+            outcome = primary.result(timeout=self._hedge_delay(proxy))
+        except FutureTimeoutError:
+            outcome = None
+        
+        if outcome is None and self._hedge_allowed():
+            hedge_proxy = self._select_hedge_proxy(proxy, tried)
+            secondary = executor.submit(send, hedge_proxy)
+            
+            if self.enable_logging:
+                hedge_display = self._session_key(hedge_proxy)
+                print(f"[ProxyManager] HEDGE: {self._session_key(proxy)} is slow, duplicating via {hedge_display}")
+            
+            processed = set()
+            for future in as_completed([primary, secondary]):
+                processed.add(future)
+                result = future.result()
+                response = result[2]
+                
+                if response is not None and response.status_code in [200, 201]:
+                    loser = secondary if future is primary else primary
+                    if loser not in processed:
+                        loser.add_done_callback(lambda f: self._record_outcome(f.result(), url))
+                    if future is secondary:
+                        self._count('hedge_wins')
+                    outcome = result
+                    break
+                
+                if future is secondary:
+                    # Дубль не помог - его результат учитываем сразу
+                    self._record_outcome(result, url)
+                else:
+                    outcome = result
+        elif outcome is None:
+            outcome = primary.result()
+        
+        winner_proxy, response_time, response, error = outcome
+        if error is not None:
+            raise error
+        return winner_proxy, response_time, response
+    
+    def _session_key(self, proxy: Optional[Dict]) -> str:
+        """Ключ сессии: адрес прокси или DIRECT"""
+        return proxy['_meta']['display'] if proxy else self.DIRECT_KEY
+    
+    def _get_session(self, proxy: Optional[Dict]) -> requests.Session:
+        """
+        Возвращает keep-alive сессию для прокси (создаёт при первом обращении)
+        
+        Args:
+            proxy: Словарь прокси или None для прямого подключения
+            
+        Returns:
+            requests.Session с настроенным пулом соединений
+        """
+        key = self._session_key(proxy)
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+        
+        with self._sessions_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=0
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                if proxy:
+                    session.proxies.update({
+                        'http': proxy['http'],
+                        'https': proxy['https']
+                    })
+                self._sessions[key] = session
+                
+                if self.enable_logging:
+                    print(f"[ProxyManager] Created session for {key} (pool_maxsize={self.pool_maxsize})")
+        
+        return session
+    
+    def _get_connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Счётчики соединений по сессиям на основе пулов urllib3
+        
+        Returns:
+            {ключ сессии: {'requests', 'new_connections', 'reused_connections'}}
+        """
+        result = {}
+        
+        for key, session in list(self._sessions.items()):
+            requests_count = 0
+            connections_count = 0
+            
+            adapter = session.get_adapter('https://')
+            managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+            
+            for manager in managers:
+                if manager is None:
+                    continue
+                for pool_key in list(manager.pools.keys()):
+                    pool = manager.pools.get(pool_key)
+                    if pool is None:
+                        continue
+                    requests_count += pool.num_requests
+                    connections_count += pool.num_connections
+            
+            result[key] = {
+                'requests': requests_count,
+                'new_connections': connections_count,
+                'reused_connections': max(requests_count - connections_count, 0)
+            }
+        
+        return result
     
     def _log_request(
         self, 
@@ -163,6 +546,7 @@ class ProxyManager:
         self,
         method: str,
         url: str,
+        hedge: bool = False,
         **kwargs
     ) -> Optional[requests.Response]:
         """
@@ -171,40 +555,52 @@ class ProxyManager:
         Args:
             method: HTTP метод (GET, POST, etc.)
             url: URL для запроса
+            hedge: Хеджировать первую попытку дублем через другой прокси
             **kwargs: Дополнительные параметры для requests
             
         Returns:
             Response объект или None при неудаче
         """
-        self.stats['total_requests'] += 1
+        self._count('total_requests')
+        tried = set()
         
         # Пытаемся сделать запрос с ротацией прокси
         for attempt in range(self.max_retries):
-            proxy = self._get_random_proxy()
+            proxy = self._select_proxy(exclude=tried)
             
             # Обновляем статистику
             if proxy:
-                self.stats['proxy_requests'] += 1
+                tried.add(proxy['_meta']['display'])
+                self._count('proxy_requests')
             else:
-                self.stats['direct_requests'] += 1
+                self._count('direct_requests')
             
             try:
                 start_time = time.time()
                 
-                # Выполняем запрос
-                response = requests.request(
-                    method=method,
-                    url=url,
-                    proxies=proxy,
-                    timeout=self.timeout,
-                    **kwargs
-                )
+                # Выполняем запрос через keep-alive сессию прокси
+                if hedge and attempt == 0:
+                    proxy, response_time, response = self._send_hedged(
+                        proxy, tried, method, url, **kwargs
+                    )
+                else:
+                    # Ждём токен rate limiter (не входит во время ответа прокси)
+                    self._wait_rate_limit(proxy, url)
+                    start_time = time.time()
+                    response = self._get_session(proxy).request(
+                        method=method,
+                        url=url,
+                        timeout=self.timeout,
+                        **kwargs
+                    )
+                    response_time = time.time() - start_time
                 
-                response_time = time.time() - start_time
+                self._record_result(proxy, response_time, response.status_code)
+                self._record_rate(proxy, url, response)
                 
                 # Проверяем статус
                 if response.status_code in [200, 201]:
-                    self.stats['successful_requests'] += 1
+                    self._count('successful_requests')
                     self._log_request(
                         url=url,
                         proxy=proxy,
@@ -224,17 +620,21 @@ class ProxyManager:
                     error=error_msg
                 )
                 
-                # Для 429 (rate limit) делаем паузу
-                if response.status_code == 429:
-                    time.sleep(random.uniform(2, 5))
+                # 429 (rate limit) уже уменьшил скорость ведра в _record_rate:
+                # следующая попытка подождёт токен вместо слепой паузы
                 
             except (
                 requests.exceptions.ProxyError,
                 requests.exceptions.ConnectionError,
                 requests.exceptions.Timeout
             ) as e:
-                self.stats['proxy_errors'] += 1
+                self._count('proxy_errors')
                 error_type = type(e).__name__
+                self._record_result(
+                    proxy,
+                    time.time() - start_time,
+                    timeout=isinstance(e, requests.exceptions.Timeout)
+                )
                 
                 self._log_request(
                     url=url,
@@ -246,16 +646,17 @@ class ProxyManager:
                 # Если это последняя попытка - пробуем без прокси
                 if attempt == self.max_retries - 1 and proxy:
                     try:
-                        response = requests.request(
+                        self._wait_rate_limit(None, url)
+                        response = self._get_session(None).request(
                             method=method,
                             url=url,
-                            proxies=None,
                             timeout=self.timeout,
                             **kwargs
                         )
                         
+                        self._record_rate(None, url, response)
                         if response.status_code in [200, 201]:
-                            self.stats['successful_requests'] += 1
+                            self._count('successful_requests')
                             self._log_request(
                                 url=url,
                                 proxy=None,
@@ -271,6 +672,7 @@ class ProxyManager:
                     time.sleep(random.uniform(1, 3))
             
             except Exception as e:
+                self._record_result(proxy, time.time() - start_time)
                 self._log_request(
                     url=url,
                     proxy=proxy,
@@ -292,7 +694,8 @@ class ProxyManager:
         Returns:
             Словарь со статистикой
         """
-        stats = self.stats.copy()
+        with self._stats_lock:
+            stats = self.stats.copy()
         
         if stats['total_requests'] > 0:
             stats['success_rate'] = (
@@ -301,5 +704,31 @@ class ProxyManager:
             stats['proxy_usage_rate'] = (
                 stats['proxy_requests'] / stats['total_requests'] * 100
             )
+            stats['hedge_rate'] = (
+                stats['hedged_requests'] / stats['total_requests'] * 100
+            )
+        
+        # Переиспользование keep-alive соединений по каждому прокси
+        stats['connections'] = self._get_connection_stats()
+        
+        # Здоровье прокси: задержка, успехи, состояние circuit breaker
+        stats['proxies'] = {
+            key: health.snapshot() for key, health in self.health.items()
+        }
         
-        return stats
\ No newline at end of file
+        # Текущие скорости token bucket (после AIMD-адаптации)
+        stats['rate_limit_wait'] = round(stats['rate_limit_wait'], 2)
+        stats['rate_limits'] = self.rate_limiter.snapshot()
+        
+        return stats
+    
+    def close(self):
+        """Закрывает все сессии и их пулы соединений"""
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            
+            if self._hedge_executor is not None:
+                self._hedge_executor.shutdown(wait=False)
+                self._hedge_executor = None
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+Ограничение частоты запросов: token bucket на каждый прокси и на каждый хост
+Скорость адаптируется по AIMD: 429/Retry-After резко уменьшают её,
+успешные ответы медленно возвращают к максимуму
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket с адаптивной скоростью
+
+    reserve() забирает токен сразу и возвращает, сколько нужно подождать:
+    при пустом ведре токены уходят в минус и образуют очередь,
+    так что параллельные вызывающие распределяются во времени равномерно
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        min_rate: float,
+        decrease_factor: float = 0.5,
+        recovery_step: float = 0.05
+    ):
+        """
+        Args:
+            rate: Максимальная скорость (запросов в секунду)
+            capacity: Размер ведра (допустимый всплеск)
+            min_rate: Нижняя граница скорости после уменьшений
+            decrease_factor: Множитель скорости при 429 (multiplicative decrease)
+            recovery_step: Доля максимальной скорости, возвращаемая за успешный ответ
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.decrease_factor = decrease_factor
+        self.recovery_step = recovery_step
+
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttles = 0
+
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """Начисляет токены за прошедшее время по текущей скорости"""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def reserve(self) -> float:
+        """
+        Забирает один токен
+
+        Returns:
+            Сколько секунд подождать перед запросом (0 - можно сразу)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """
+        Апстрим ответил 429: уменьшаем скорость и сбрасываем накопленный всплеск
+
+        Args:
+            retry_after: Значение Retry-After в секундах (если было)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def on_success(self):
+        """Успешный ответ: скорость медленно растёт к максимуму (additive increase)"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery_step)
+
+    def snapshot(self) -> Dict:
+        """Состояние для get_stats()"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rate': round(self.rate, 3),
+                'max_rate': self.max_rate,
+                'tokens': round(self.tokens, 2),
+                'throttles': self.throttles
+            }
+
+
+class RateLimiter:
+    """
+    Набор token bucket: по одному на прокси и по одному на хост апстрима
+    Запрос ждёт, пока токен появится в обоих ведрах
+    """
+
+    def __init__(
+        self,
+        proxy_rate: float = 3.0,
+        proxy_burst: float = 5,
+        host_rate: float = 10.0,
+        host_burst: float = 10,
+        decrease_factor: float = 0.5,
+        host_decrease_factor: float = 0.8,
+        recovery_step: float = 0.05,
+        min_rate_ratio: float = 0.1
+    ):
+        """
+        Args:
+            proxy_rate: Максимальная скорость через один прокси (запросов/сек)
+            proxy_burst: Всплеск через один прокси
+            host_rate: Максимальная суммарная скорость на один хост (запросов/сек)
+            host_burst: Всплеск на один хост
+            decrease_factor: Уменьшение скорости прокси при 429
+            host_decrease_factor: Уменьшение скорости хоста при 429
+            recovery_step: Доля максимальной скорости, возвращаемая за успех
+            min_rate_ratio: Нижняя граница скорости как доля от максимальной
+        """
+        self.proxy_rate = proxy_rate
+        self.proxy_burst = proxy_burst
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.decrease_factor = decrease_factor
+        self.host_decrease_factor = host_decrease_factor
+        self.recovery_step = recovery_step
+        self.min_rate_ratio = min_rate_ratio
+
+        self._proxy_buckets: Dict[str, TokenBucket] = {}
+        self._host_buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, buckets: Dict[str, TokenBucket], key: str, is_host: bool) -> TokenBucket:
+        """Возвращает ведро по ключу (создаёт при первом обращении)"""
+        bucket = buckets.get(key)
+        if bucket is not None:
+            return bucket
+
+        with self._lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                rate = self.host_rate if is_host else self.proxy_rate
+                bucket = TokenBucket(
+                    rate=rate,
+                    capacity=self.host_burst if is_host else self.proxy_burst,
+                    min_rate=rate * self.min_rate_ratio,
+                    decrease_factor=self.host_decrease_factor if is_host else self.decrease_factor,
+                    recovery_step=self.recovery_step
+                )
+                buckets[key] = bucket
+            return bucket
+
+    def reserve(self, proxy_key: str, host: str) -> float:
+        """
+        Забирает токен у прокси и у хоста
+
+        Returns:
+            Сколько секунд подождать перед запросом
+        """
+        host_wait = self._get_bucket(self._host_buckets, host, True).reserve()
+        proxy_wait = self._get_bucket(self._proxy_buckets, proxy_key, False).reserve()
+        return max(host_wait, proxy_wait)
+
+    def on_throttle(self, proxy_key: str, host: str, retry_after: Optional[float] = None):
+        """
+        Апстрим вернул 429 - уменьшаем скорость прокси и хоста.
+        429 от Bybit - сигнал хоста: Retry-After блокирует и ведро хоста,
+        чтобы запросы через другие прокси тоже переждали указанное время
+        """
+        self._get_bucket(self._proxy_buckets, proxy_key, False).on_throttle(retry_after)
+        self._get_bucket(self._host_buckets, host, True).on_throttle(retry_after)
+
+    def on_success(self, proxy_key: str, host: str):
+        """Успешный ответ - восстанавливаем скорость прокси и хоста"""
+        self._get_bucket(self._proxy_buckets, proxy_key, False).on_success()
+        self._get_bucket(self._host_buckets, host, True).on_success()
+
+    def snapshot(self) -> Dict:
+        """Состояние всех ведер для get_stats()"""
+        return {
+            'hosts': {key: bucket.snapshot() for key, bucket in list(self._host_buckets.items())},
+            'proxies': {key: bucket.snapshot() for key, bucket in list(self._proxy_buckets.items())}
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Разбирает заголовок Retry-After (секунды или HTTP-дата)
+
+    Returns:
+        Секунды ожидания или None
+    """
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(retry_at.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
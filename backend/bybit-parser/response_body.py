@@ -0,0 +1,110 @@
+"""
+Заранее сериализованные тела ответов со стаканом
+JSON офферов и его gzip-вариант строятся один раз при заполнении кеша,
+на каждый запрос досериализуются только мелкие поля (cache_age и т.п.)
+"""
+
+import base64
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import json_backend
+
+
+def accepts_gzip(headers: Optional[Dict[str, str]]) -> bool:
+    """
+    Принимает ли клиент gzip (заголовок Accept-Encoding, регистр не важен)
+
+    Args:
+        headers: Заголовки запроса из event
+    """
+    if not headers:
+        return False
+
+    value = next((v for k, v in headers.items() if k.lower() == 'accept-encoding'), None)
+    if not value:
+        return False
+
+    for item in value.split(','):
+        coding, _, params = item.strip().partition(';')
+        if coding.strip().lower() not in ('gzip', '*'):
+            continue
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+
+    return False
+
+
+class PreparedBody:
+    """
+    JSON-тело ответа, у которого неизменная часть сериализована заранее
+
+    Неизменная часть (offers, total, side, ...) хранится как текст без
+    закрывающей скобки. Для gzip хранится уже сжатое начало потока и состояние
+    компрессора после него: на запрос компрессор копируется и дожимает только
+    хвост с полями запроса - получается обычный одночленный gzip.
+    Сжатое начало строится при первом ответе с gzip (тело на один запрос
+    без gzip не сжимается вовсе), для тел из кеша - сразу (precompress)
+    """
+
+    def __init__(self, payload: Dict[str, Any], compress_level: int = 6, precompress: bool = False):
+        """
+        Args:
+            payload: Неизменные поля ответа (порядок ключей сохраняется)
+            compress_level: Уровень сжатия gzip (1-9)
+            precompress: Сжать начало сразу (тело переиспользуется между запросами)
+        """
+        text = json_backend.dumps(payload)
+        self.prefix = text[:-1]
+        self.size = len(text)
+        self.compress_level = compress_level
+        self._gzip_head: Optional[Tuple[Any, str, bytes]] = None
+        if precompress:
+            self._compressed_head()
+
+    def _compressed_head(self) -> Tuple[Any, str, bytes]:
+        """
+        Сжатое начало тела (строится один раз)
+
+        Returns:
+            (компрессор после начала, начало в base64 кратно 3 байтам, остаток байт)
+        """
+        gzip_head = self._gzip_head
+        if gzip_head is None:
+            # wbits=31 - формат gzip (заголовок и CRC32 ведёт сам zlib)
+            compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, 31)
+            head = compressor.compress(self.prefix.encode('utf-8'))
+
+            # base64 кодирует тройки байт: большую часть сжатого начала кодируем заранее
+            split = len(head) - len(head) % 3
+            gzip_head = (compressor, base64.b64encode(head[:split]).decode('ascii'), head[split:])
+            # Гонка двух первых запросов даёт два одинаковых начала - сохраняется любое
+            self._gzip_head = gzip_head
+        return gzip_head
+
+    def _suffix(self, extra: Optional[Dict[str, Any]]) -> str:
+        """Поля запроса в виде продолжения JSON-объекта с закрывающей скобкой"""
+        if not extra:
+            return '}'
+        return ', ' + json_backend.dumps(extra)[1:]
+
+    def render(self, extra: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Полное JSON-тело
+
+        Args:
+            extra: Поля запроса, дописываемые после неизменной части
+        """
+        return self.prefix + self._suffix(extra)
+
+    def render_gzip_base64(self, extra: Optional[Dict[str, Any]] = None) -> str:
+        """Сжатое gzip тело в base64 (для ответа с isBase64Encoded)"""
+        compressor, head_base64, head_rest = self._compressed_head()
+        compressor = compressor.copy()
+        tail = compressor.compress(self._suffix(extra).encode('utf-8')) + compressor.flush()
+        return head_base64 + base64.b64encode(head_rest + tail).decode('ascii')
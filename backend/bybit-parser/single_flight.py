@@ -0,0 +1,61 @@
+"""
+Схлопывание конкурентных загрузок (single-flight)
+Пока по ключу идёт загрузка, остальные вызовы с тем же ключом не запускают
+свою, а ждут общий Future ведущего вызова и получают тот же результат
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """Одна загрузка на ключ в пределах процесса"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, Future] = {}
+
+    def in_flight(self, key: str) -> bool:
+        """Идёт ли сейчас загрузка по ключу"""
+        with self.lock:
+            return key in self.calls
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Выполняет fn один раз на ключ
+
+        Args:
+            key: Ключ загрузки (рынок, сторона, режим)
+            fn: Загрузка, выполняется только ведущим вызовом
+            timeout: Сколько ведомый ждёт результат (None - без ограничения)
+
+        Returns:
+            (результат, shared): shared=True - результат получен от другого вызова
+
+        Raises:
+            concurrent.futures.TimeoutError: Ведомый не дождался результата
+            Исключение fn - и ведущему, и ведомым
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+
+        if not leader:
+            return future.result(timeout), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+
+        return result, False
@@ -0,0 +1,98 @@
+"""
+Поиск трейдера по нику (maker) и ID (maker_id) в стакане из памяти
+Индекс строится вместе с OrderBook на каждое обновление стакана:
+- короткий запрос (меньше 3 символов) - поиск по префиксу в отсортированных ключах
+- длинный запрос - подстрока: пересечение списков офферов по триграммам запроса
+  и проверка найденных кандидатов
+Та же семантика у пути через БД (DatabaseManager.search_pattern, индекс pg_trgm)
+"""
+
+from bisect import bisect_left
+from itertools import islice
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from models import Offer
+
+# Длина n-граммы индекса и минимальная длина запроса для поиска по подстроке
+TRIGRAM = 3
+
+
+def normalize(text: str) -> str:
+    """Ключ поиска: без регистра и крайних пробелов"""
+    return text.strip().casefold()
+
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы строки (для строк короче 3 символов - пусто)"""
+    return {text[i:i + TRIGRAM] for i in range(len(text) - TRIGRAM + 1)}
+
+
+class TraderIndex:
+    """
+    Индекс maker / maker_id -> позиции офферов (как в OrderBook.offers)
+    """
+
+    def __init__(self, offers: List[Offer]):
+        keys: List[Tuple[str, int]] = []
+        postings: Dict[str, Set[int]] = {}
+        offer_keys: List[Tuple[str, ...]] = []
+
+        for position, offer in enumerate(offers):
+            own = tuple(key for key in (normalize(offer.maker or ''), normalize(offer.maker_id or '')) if key)
+            offer_keys.append(own)
+            for key in own:
+                keys.append((key, position))
+                for gram in trigrams(key):
+                    postings.setdefault(gram, set()).add(position)
+
+        keys.sort()
+        # Отсортированные (ключ, позиция) - для поиска по префиксу
+        self.keys = keys
+        # Триграмма -> позиции офферов
+        self.postings = postings
+        # Ключи каждого оффера - для проверки кандидатов
+        self.offer_keys = offer_keys
+
+    def _prefix(self, query: str) -> Set[int]:
+        """Позиции офферов, у которых ник или ID начинается с query"""
+        found = set()
+        start = bisect_left(self.keys, (query, -1))
+        for key, position in islice(self.keys, start, None):
+            if not key.startswith(query):
+                break
+            found.add(position)
+        return found
+
+    def _substring(self, query: str) -> Set[int]:
+        """Позиции офферов, у которых ник или ID содержит query"""
+        grams = sorted(trigrams(query), key=lambda gram: len(self.postings.get(gram, ())))
+        candidates = set(self.postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates &= self.postings.get(gram, set())
+
+        # Все триграммы совпали - проверяем подстроку целиком
+        return {
+            position for position in candidates
+            if any(query in key for key in self.offer_keys[position])
+        }
+
+    def search(self, query: str) -> np.ndarray:
+        """
+        Булева маска офферов, подходящих под запрос (для OrderBook.indices/select)
+
+        Args:
+            query: Ник или ID трейдера, целиком или частично
+        """
+        query = normalize(query)
+        mask = np.zeros(len(self.offer_keys), dtype=np.bool_)
+        if not query:
+            return mask
+
+        found = self._prefix(query) if len(query) < TRIGRAM else self._substring(query)
+        if found:
+            mask[list(found)] = True
+        return mask
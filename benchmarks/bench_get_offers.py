@@ -0,0 +1,111 @@
+"""
+Бенчмарк чтения стакана: RealDictCursor + fetchall + Decimal/split в Python
+против серверного курсора с приведением типов в SQL (DatabaseManager.get_offers)
+
+Запуск (нужен локальный Postgres с применёнными db_migrations):
+    DATABASE_URL=postgresql://... python benchmarks/bench_get_offers.py [rows] [repeats]
+"""
+
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+import psycopg2.extras
+
+from synthetic import make_offers
+from db_manager import DatabaseManager
+
+
+def get_offers_dict_cursor(db: DatabaseManager, side: str) -> list:
+    """Прежняя реализация get_offers: словари строк и конвертация в Python"""
+    conn = db.get_connection()
+    try:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT id, side, price, min_amount, max_amount, available_amount,
+                       nickname, is_merchant, merchant_type, is_online, is_triangle,
+                       completion_rate, completed_orders, payment_methods, updated_at
+                FROM {db.schema}.p2p_offers
+                WHERE side = %s
+                ORDER BY price {'ASC' if side == '1' else 'DESC'}
+            """, (side,))
+
+            rows = cur.fetchall()
+
+            offers = []
+            for row in rows:
+                def to_float(val):
+                    if isinstance(val, Decimal):
+                        return float(val)
+                    return val
+
+                offers.append({
+                    'id': row['id'],
+                    'price': to_float(row['price']),
+                    'maker': row['nickname'],
+                    'maker_id': '',
+                    'quantity': to_float(row['available_amount']),
+                    'min_amount': to_float(row['min_amount']),
+                    'max_amount': to_float(row['max_amount']),
+                    'payment_methods': row['payment_methods'].split(',') if row['payment_methods'] else [],
+                    'side': 'sell' if side == '1' else 'buy',
+                    'completion_rate': int(to_float(row['completion_rate'])) if row['completion_rate'] else 0,
+                    'total_orders': int(to_float(row['completed_orders'])) if row['completed_orders'] else 0,
+                    'is_merchant': row['is_merchant'],
+                    'merchant_type': row['merchant_type'],
+                    'merchant_badge': f'va{row["merchant_type"].capitalize()}Icon' if row['merchant_type'] else None,
+                    'is_block_trade': row['merchant_type'] == 'block_trade' if row['merchant_type'] else False,
+                    'is_online': row['is_online'],
+                    'is_triangle': row['is_triangle'],
+                    'last_logout_time': '',
+                    'auth_tags': []
+                })
+
+            return offers
+    finally:
+        db.put_connection(conn)
+
+
+def measure(fn, repeats: int) -> list:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    side = '1'
+
+    # Прежняя реализация читает p2p_offers - сравниваем на той же таблице
+    db = DatabaseManager(storage_mode='replace')
+    db.store_offers(make_offers(rows, side), side)
+
+    # Порядок офферов с одинаковой ценой зависит от плана запроса - сравниваем по (price, id)
+    def book(offers: list) -> list:
+        return sorted(offers, key=lambda offer: (offer['price'], offer['id']))
+
+    before = get_offers_dict_cursor(db, side)
+    after = [offer.to_dict() for offer in db.get_offers(side)]
+    assert book(before) == book(after), 'get_offers result differs from the previous implementation'
+
+    results = {
+        'dict cursor': measure(lambda: get_offers_dict_cursor(db, side), repeats),
+        'server cursor': measure(lambda: db.get_offers(side), repeats),
+    }
+
+    print(f'{rows} offers, {repeats} repeats')
+    for name, timings in results.items():
+        median = statistics.median(timings)
+        print(
+            f'  {name:<14} median {median:8.2f} ms   min {min(timings):8.2f} ms'
+            f'   per row {median * 1000 / rows:6.2f} us'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Бенчмарк истории спреда (?history=spread): ряд из минутных роллапов book_rollup_minute
+за неделю синтетических данных по всем рынкам MARKETS, без кеша и из LRU-кеша
+
+Запуск (нужен локальный Postgres с применёнными db_migrations):
+    DATABASE_URL=postgresql://... python benchmarks/bench_history.py [days] [repeats]
+"""
+
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Модули функции лежат в backend/bybit-parser без пакета
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'bybit-parser')))
+
+from config import MARKETS
+from db_manager import DatabaseManager
+from history_query import HistoryCache, HistoryQuery
+from models import Market
+
+
+def seed(db: DatabaseManager, days: int):
+    """Минутные роллапы всех рынков за days дней (секции создаются заранее)"""
+    today = datetime.now().date()
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            for offset in range(-days, 2):
+                db._create_history_partitions(cur, today + timedelta(days=offset))
+            cur.execute(f"TRUNCATE {db.schema}.book_rollup_minute")
+            for index, config in enumerate(MARKETS):
+                # Синусоида цены с шумом, спред 0.5-1.5%
+                cur.execute(f"""
+                    INSERT INTO {db.schema}.book_rollup_minute
+                        (token, fiat, minute, sell_price, buy_price,
+                         sell_depth_1_amount, buy_depth_1_amount, sell_offers, buy_offers)
+                    SELECT %(token)s, %(fiat)s, minute,
+                           base * 1.005 + random(), base * 0.995 - random(),
+                           1e6 + random() * 1e6, 1e6 + random() * 1e6, 600, 600
+                    FROM (
+                        SELECT minute, 90 + %(index)s + 3 * sin(extract(epoch FROM minute) / 7200) AS base
+                        FROM generate_series(
+                            date_trunc('minute', now()::timestamp) - %(days)s * interval '1 day',
+                            date_trunc('minute', now()::timestamp),
+                            interval '1 minute'
+                        ) AS minute
+                    ) AS series
+                """, {'token': config['token'], 'fiat': config['fiat'], 'index': index, 'days': days})
+        conn.commit()
+    finally:
+        db.put_connection(conn)
+
+    conn = db.get_connection()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"VACUUM ANALYZE {db.schema}.book_rollup_minute")
+        conn.autocommit = False
+    finally:
+        db.put_connection(conn)
+
+
+def measure(fn, repeats: int) -> list:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    db = DatabaseManager()
+    seed(db, days)
+    market = Market('USDT', 'RUB')
+    cache = HistoryCache()
+
+    print(f'{days} days of minute rollups x {len(MARKETS)} markets, {repeats} repeats')
+    for window, step in (('24h', '5m'), (f'{days}d', '1h'), (f'{days}d', '10m')):
+        query = HistoryQuery.from_params({'history': 'spread', 'window': window, 'step': step}, 2000, 30)
+
+        def uncached():
+            start, end = query.bounds(datetime.now())
+            return query.points(db.get_history(market, start, end, query.step_seconds))
+
+        def cached():
+            now = datetime.now()
+            start, end = query.bounds(now)
+            key = query.key(market.key, end)
+            points = cache.get(key, now)
+            if points is None:
+                points = query.points(db.get_history(market, start, end, query.step_seconds))
+                cache.put(key, points, now)
+            return points
+
+        points = len(uncached())
+        for name, timings in (('db', measure(uncached, repeats)), ('lru', measure(cached, repeats))):
+            print(
+                f'  {window:>4}/{step:<4} {name:<3} {points:5d} points'
+                f'   median {statistics.median(timings):8.2f} ms   max {max(timings):8.2f} ms'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Бенчмарк JSON-бэкендов: разбор страниц Bybit и сериализация ответа на 800 офферов
+
+Страницы берутся из benchmarks/fixtures/*.json (сохранённые ответы item/online),
+если каталог пуст - генерируются в формате Bybit (synthetic.make_bybit_page).
+
+Запуск:
+    python benchmarks/bench_json.py [repeats]
+"""
+
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+from synthetic import make_bybit_page, make_offers
+import json_backend
+import models
+from models import decode_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_pages() -> list:
+    """Тела страниц Bybit (bytes): сохранённые фикстуры или синтетические"""
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.json')))
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+        return pages
+    return [json.dumps(make_bybit_page(page)).encode('utf-8') for page in range(1, 9)]
+
+
+def measure(fn, repeats: int) -> float:
+    """Медиана времени вызова, мс"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    pages = load_pages()
+    offers = make_offers(800)
+    response = {
+        'offers': offers,
+        'total': len(offers),
+        'side': 'sell',
+        'from_cache': False,
+        'timestamp': '2024-01-01T00:00:00',
+        'auto_update_enabled': True,
+        'proxy_stats': {}
+    }
+
+    items_total = sum(len(decode_page(page) or []) for page in pages)
+    print(f'{len(pages)} pages ({sum(map(len, pages)) // 1024} KB, {items_total} items), '
+          f'response with {len(offers)} offers, {repeats} repeats')
+
+    for name in json_backend.available_backends():
+        json_backend.use_backend(name)
+
+        decode_ms = measure(lambda: [decode_page(page) for page in pages], repeats)
+        dicts_ms = measure(lambda: [models._decode_page_dicts(page) for page in pages], repeats)
+        encode_ms = measure(lambda: json_backend.dumps(response), repeats)
+
+        print(
+            f'  {name:<8} decode pages {decode_ms:7.2f} ms ({decode_ms * 1000 / items_total:5.2f} us/item)'
+            f'   via dicts {dicts_ms:7.2f} ms   encode response {encode_ms:6.2f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Память и время построения стакана: словари (19 ключей для API + 13 ключей для БД)
+против одного models.Offer на оффер
+
+Запуск:
+    python benchmarks/bench_offer_memory.py [offers]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from synthetic import make_offers
+from models import OFFER_FIELDS, Offer
+
+
+def build_dicts(sources: list) -> tuple:
+    """Прежний путь: словарь ответа API и отдельный словарь для БД на каждый оффер"""
+    api = [{name: getattr(offer, name) for name in OFFER_FIELDS} for offer in sources]
+    db = [{
+        'id': offer['id'],
+        'price': offer['price'],
+        'min_amount': offer['min_amount'],
+        'max_amount': offer['max_amount'],
+        'available_amount': offer['quantity'],
+        'nickname': offer['maker'],
+        'is_merchant': offer['is_merchant'],
+        'merchant_type': offer['merchant_type'],
+        'is_online': offer['is_online'],
+        'is_triangle': offer['is_triangle'],
+        'completion_rate': offer['completion_rate'],
+        'completed_orders': offer['total_orders'],
+        'payment_methods': offer['payment_methods']
+    } for offer in api]
+    return api, db
+
+
+def build_offers(sources: list) -> list:
+    """Новый путь: один Offer, который используют и ответ, и БД, и кеш"""
+    return [Offer(*(getattr(offer, name) for name in OFFER_FIELDS)) for offer in sources]
+
+
+def measure(fn, sources: list) -> tuple:
+    """(пиковая память в КБ, время в мс)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(sources)
+    elapsed = (time.perf_counter() - started) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak / 1024, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    # Обе стороны стакана, как в кеше функции
+    sources = make_offers(count, '1') + make_offers(count, '0')
+
+    print(f'{len(sources)} offers (both sides)')
+    for name, fn in (('dicts', build_dicts), ('Offer', build_offers)):
+        peak_kb, elapsed_ms = measure(fn, sources)
+        print(f'  {name:<6} peak {peak_kb:8.1f} KB   build {elapsed_ms:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
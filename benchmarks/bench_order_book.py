@@ -0,0 +1,140 @@
+"""
+Бенчмарк аналитики стакана: циклы по списку Offer против колонок OrderBook
+(фильтр, лучшая цена, глубина 1%, VWAP для суммы в RUB) и метрики book_metrics
+(лестница VWAP и кривая глубины префиксными суммами) против вызовов OrderBook на каждую сумму
+
+Запуск:
+    python benchmarks/bench_order_book.py [offers] [repeats]
+"""
+
+import math
+import statistics
+import sys
+import time
+
+from synthetic import make_offers
+from book_metrics import DEPTH_PERCENTS, book_metrics
+from order_book import OrderBook
+
+PAYMENT = ['Tinkoff', 'Sberbank']
+AMOUNT = 50000.0
+VWAP_AMOUNT = 5000000.0
+LADDER = [10000, 50000, 100000, 250000, 500000, 1000000]
+
+
+def analytics_loop(offers: list, side: str) -> tuple:
+    """Те же запросы перебором офферов в Python"""
+    best_first = sorted(offers, key=lambda offer: offer.price, reverse=side == 'buy')
+    matched = [
+        offer for offer in best_first
+        if set(offer.payment_methods) & set(PAYMENT)
+        and offer.is_online
+        and offer.min_amount <= AMOUNT <= offer.max_amount
+    ]
+    best = matched[0].price if matched else None
+
+    depth_amount = 0.0
+    if best is not None:
+        for offer in matched:
+            within = offer.price <= best * 1.01 if side == 'sell' else offer.price >= best * 0.99
+            if within:
+                depth_amount += min(offer.quantity * offer.price, offer.max_amount)
+
+    remaining = VWAP_AMOUNT
+    bought = 0.0
+    for offer in matched:
+        taken = min(remaining, min(offer.quantity * offer.price, offer.max_amount))
+        bought += taken / offer.price
+        remaining -= taken
+        if remaining <= 0:
+            break
+    vwap = VWAP_AMOUNT / bought if remaining <= 1e-9 else None
+
+    return best, depth_amount, vwap, len(matched)
+
+
+def analytics_book(book: OrderBook) -> tuple:
+    """Запросы по колонкам OrderBook"""
+    mask = book.mask(payment=PAYMENT, online=True, amount=AMOUNT)
+    return (
+        book.best_price(mask),
+        book.depth(1, mask)['amount'],
+        book.vwap(VWAP_AMOUNT, mask),
+        int(mask.sum())
+    )
+
+
+def metrics_per_call(book: OrderBook) -> tuple:
+    """Лестница VWAP и кривая глубины отдельными вызовами OrderBook (каждый со своим cumsum)"""
+    vwap = [book.vwap(amount) for amount in LADDER]
+    depth = [book.depth(percent)['amount'] for percent in DEPTH_PERCENTS]
+    payments = {
+        name: [book.vwap(amount, mask) for amount in LADDER]
+        for name, mask in book.payment_index.items() if mask.any()
+    }
+    return vwap, depth, payments
+
+
+def metrics_prefix(book: OrderBook) -> tuple:
+    """То же через book_metrics"""
+    metrics = book_metrics(book, LADDER)
+    return (
+        [item['price'] for item in metrics['vwap']],
+        [item['amount'] for item in metrics['depth']],
+        {name: [item['price'] for item in payment['vwap']] for name, payment in metrics['payments'].items()}
+    )
+
+
+def same(a, b) -> bool:
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=1e-9)
+
+
+def measure(fn, repeats: int) -> list:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1600
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    for side in ('1', '0'):
+        offers = make_offers(count, side)
+        side_name = offers[0].side
+        book = OrderBook(offers, side_name)
+
+        expected = analytics_loop(offers, side_name)
+        actual = analytics_book(book)
+        assert all(same(a, b) for a, b in zip(expected, actual)), (expected, actual)
+
+        expected_metrics = metrics_per_call(book)
+        actual_metrics = metrics_prefix(book)
+        assert all(same(a, b) for a, b in zip(expected_metrics[0] + expected_metrics[1], actual_metrics[0] + actual_metrics[1]))
+        assert expected_metrics[2].keys() == actual_metrics[2].keys()
+        assert all(
+            same(a, b)
+            for name in expected_metrics[2]
+            for a, b in zip(expected_metrics[2][name], actual_metrics[2][name])
+        )
+
+        results = {
+            'build book': measure(lambda: OrderBook(offers, side_name), repeats),
+            'python loop': measure(lambda: analytics_loop(offers, side_name), repeats),
+            'order book': measure(lambda: analytics_book(book), repeats),
+            'metrics calls': measure(lambda: metrics_per_call(book), repeats),
+            'book_metrics': measure(lambda: metrics_prefix(book), repeats),
+        }
+
+        print(f'{side_name}: {count} offers, {repeats} repeats, matched {actual[3]}')
+        for name, timings in results.items():
+            print(f'  {name:<13} median {statistics.median(timings):8.3f} ms   min {min(timings):8.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Бенчмарк записи офферов: построчный UPSERT против COPY в staging-таблицу
+
+Запуск (нужен локальный Postgres с применёнными db_migrations):
+    DATABASE_URL=postgresql://... python benchmarks/bench_save_offers.py [rows] [repeats]
+"""
+
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from synthetic import make_offers
+from db_manager import DatabaseManager
+
+
+def save_offers_rowwise(db: DatabaseManager, offers: list, side: str):
+    """Прежняя реализация save_offers: DELETE и по одному INSERT на оффер"""
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {db.schema}.p2p_offers WHERE side = %s", (side,))
+            columns = ', '.join(db.OFFER_COLUMNS)
+            placeholders = ', '.join(['%s'] * len(db.OFFER_COLUMNS))
+            for offer in offers:
+                cur.execute(
+                    f"INSERT INTO {db.schema}.p2p_offers ({columns}) VALUES ({placeholders})",
+                    db._offer_row(offer, side, datetime.now())
+                )
+            conn.commit()
+    finally:
+        db.put_connection(conn)
+
+
+def measure(fn, repeats: int) -> list:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    side = '1'
+
+    db = DatabaseManager()
+    offers = make_offers(rows, side)
+
+    results = {
+        'row-by-row': measure(lambda: save_offers_rowwise(db, offers, side), repeats),
+        'copy + swap': measure(lambda: db.save_offers(offers, side), repeats),
+    }
+
+    print(f'{rows} offers, {repeats} repeats')
+    for name, timings in results.items():
+        print(f'  {name:<12} median {statistics.median(timings):8.1f} ms   min {min(timings):8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
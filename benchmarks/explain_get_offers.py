@@ -0,0 +1,84 @@
+"""
+План запроса get_offers на заново заполненной базе: стакан должен читаться
+index-only scan по покрывающему индексу, без узла Sort
+
+Запуск (нужен локальный Postgres с применёнными db_migrations):
+    DATABASE_URL=postgresql://... python benchmarks/explain_get_offers.py [rows] [mode]
+
+mode - режим хранения DatabaseManager ('snapshot', 'incremental', 'replace'), по умолчанию все
+"""
+
+import sys
+
+from synthetic import make_offers
+from db_manager import DatabaseManager
+
+
+def explain(db: DatabaseManager, side: str) -> list:
+    """EXPLAIN ANALYZE запроса get_offers, строки плана"""
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {db.offers_query(side)}", db.offers_params(side))
+            return [row[0] for row in cur.fetchall()]
+    finally:
+        conn.rollback()
+        db.put_connection(conn)
+
+
+def reset(db: DatabaseManager):
+    """Очищает офферы, снимки и метаданные перед заполнением"""
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                TRUNCATE {db.schema}.p2p_offers, {db.schema}.offer_book_snapshots,
+                         {db.schema}.offer_book_rows, {db.schema}.update_metadata
+            """)
+        conn.commit()
+    finally:
+        db.put_connection(conn)
+
+
+def vacuum(db: DatabaseManager):
+    """VACUUM ANALYZE таблиц офферов: статистика и visibility map как после autovacuum"""
+    conn = db.get_connection()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for table in ('p2p_offers', 'offer_book_rows'):
+                cur.execute(f"VACUUM ANALYZE {db.schema}.{table}")
+    finally:
+        conn.autocommit = False
+        db.put_connection(conn)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    modes = [sys.argv[2]] if len(sys.argv) > 2 else list(DatabaseManager.STORAGE_MODES)
+
+    failed = False
+    for mode in modes:
+        db = DatabaseManager(storage_mode=mode)
+        reset(db)
+        for side in ('1', '0'):
+            db.store_offers(make_offers(rows, side), side)
+        vacuum(db)
+
+        for side in ('1', '0'):
+            plan = explain(db, side)
+            text = '\n'.join(plan)
+            index_only = 'Index Only Scan' in text
+            sorted_in_sql = any(line.lstrip(' ->').startswith('Sort') for line in plan)
+
+            print(f'== {mode}, side {side}: index-only={index_only} sort={sorted_in_sql}')
+            print(text)
+            print()
+
+            failed = failed or not index_only or sorted_in_sql
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Синтетические данные для бенчмарков парсера Bybit P2P
+"""
+
+import os
+import random
+import sys
+
+# Модули функции лежат в backend/bybit-parser без пакета
+PARSER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'bybit-parser')
+sys.path.insert(0, os.path.abspath(PARSER_DIR))
+
+PAYMENT_NAMES = ['Tinkoff', 'Sberbank', 'Bank Transfer', 'Raiffeisen Bank', 'YooMoney', 'Card']
+MERCHANT_TYPES = [None, None, None, 'bronze', 'silver', 'gold']
+
+
+def make_offers(count: int, side: str = '1', seed: int = 42) -> list:
+    """
+    Офферы парсера (models.Offer) - all_offers в handler и вход DatabaseManager.store_offers
+    """
+    from models import Offer
+    
+    rnd = random.Random(seed)
+    offers = []
+    
+    for i in range(count):
+        min_amount = float(rnd.choice([500, 1000, 5000, 10000]))
+        max_amount = min_amount + float(rnd.randint(0, 500)) * 1000
+        merchant_type = rnd.choice(MERCHANT_TYPES)
+        
+        offers.append(Offer(
+            id=f'{side}{1900000000000000000 + i}',
+            price=round(90 + rnd.random() * 5, 2),
+            maker=f'trader_{rnd.randint(1, 5000)}',
+            maker_id=str(10000000 + i),
+            quantity=round(rnd.random() * 20000, 2),
+            min_amount=min_amount,
+            max_amount=max_amount,
+            payment_methods=rnd.sample(PAYMENT_NAMES, rnd.randint(1, 3)),
+            side='sell' if side == '1' else 'buy',
+            completion_rate=rnd.randint(0, 5000),
+            total_orders=rnd.randint(80, 100),
+            is_merchant=merchant_type is not None,
+            merchant_type=merchant_type,
+            merchant_badge=f'va{merchant_type.capitalize()}Icon' if merchant_type else None,
+            is_block_trade=False,
+            is_online=rnd.random() < 0.6,
+            is_triangle=abs(max_amount - min_amount) <= 1.0,
+            last_logout_time='1700000000000',
+            auth_tags=['VA2'] if merchant_type else []
+        ))
+    
+    return offers
+
+
+PAYMENT_IDS = ['14', '40', '90', '75', '64', '1', '29', '377', '378', '379', '62', '413']
+AUTH_TAGS = [[], [], [], ['VA1'], ['VA2'], ['VA3'], ['VA3', 'BA']]
+
+
+def make_bybit_page(page: int, side: str = '1', size: int = 100, seed: int = 42) -> dict:
+    """
+    Ответ item/online в формате Bybit (все поля объявления, а не только используемые парсером)
+    """
+    rnd = random.Random(seed * 1000 + page)
+    items = []
+    
+    for i in range(size):
+        min_amount = rnd.choice([500, 1000, 5000, 10000])
+        max_amount = min_amount + rnd.randint(0, 500) * 1000
+        user_id = str(rnd.randint(10000000, 99999999))
+        
+        items.append({
+            'id': str(1900000000000000000 + page * 1000 + i),
+            'accountId': user_id,
+            'userId': user_id,
+            'nickName': f'trader_{rnd.randint(1, 5000)}',
+            'tokenId': 'USDT',
+            'tokenName': 'USDT',
+            'currencyId': 'RUB',
+            'side': int(side),
+            'priceType': 0,
+            'price': f'{90 + rnd.random() * 5:.2f}',
+            'premium': '',
+            'lastQuantity': f'{rnd.random() * 20000:.4f}',
+            'quantity': f'{rnd.random() * 30000:.4f}',
+            'frozenQuantity': '0',
+            'executedQuantity': f'{rnd.random() * 1000:.4f}',
+            'minAmount': f'{min_amount:.2f}',
+            'maxAmount': f'{max_amount:.2f}',
+            'remark': 'Перевод только с карты на своё имя. Без третьих лиц. ' * rnd.randint(0, 3),
+            'status': 10,
+            'createDate': str(1700000000000 + rnd.randint(0, 10 ** 9)),
+            'payments': rnd.sample(PAYMENT_IDS, rnd.randint(1, 3)),
+            'orderNum': rnd.randint(0, 20000),
+            'finishNum': rnd.randint(0, 20000),
+            'recentOrderNum': rnd.randint(0, 5000),
+            'recentExecuteRate': rnd.randint(80, 100),
+            'fee': '',
+            'isOnline': rnd.random() < 0.6,
+            'lastLogoutTime': str(1700000000000 + rnd.randint(0, 10 ** 9)),
+            'blocked': 'N',
+            'makerContact': False,
+            'symbolInfo': {
+                'id': '2',
+                'exchangeId': '1',
+                'orgId': '9001',
+                'tokenId': 'USDT',
+                'currencyId': 'RUB',
+                'status': 1,
+                'lowerLimitAlarm': 90,
+                'upperLimitAlarm': 200,
+                'itemDownRange': '70',
+                'itemUpRange': '130',
+                'currencyMinQuote': '10',
+                'currencyMaxQuote': '10000000',
+                'currencyLowerMaxQuote': '',
+                'tokenMinQuote': '5',
+                'tokenMaxQuote': '1000000',
+                'kycCurrencyLimit': '',
+                'itemSideLimit': 3,
+                'buyFeeRate': '0',
+                'sellFeeRate': '0',
+                'orderAutoCancelMinute': 15,
+                'orderFinishMinute': 30,
+                'tradeSide': 9,
+                'currency': {'id': '11', 'exchangeId': '1', 'orgId': '9001', 'currencyId': 'RUB', 'scale': 2},
+                'token': {'id': '1', 'exchangeId': '1', 'orgId': '9001', 'tokenId': 'USDT', 'scale': 4, 'sequence': 1}
+            },
+            'tradingPreferenceSet': {
+                'hasUnPostAd': 0,
+                'isKyc': 1,
+                'isEmail': 0,
+                'isMobile': 0,
+                'hasRegisterTime': 0,
+                'registerTimeThreshold': 0,
+                'orderFinishNumberDay30': 0,
+                'completeRateDay30': '',
+                'nationalLimit': '',
+                'hasOrderFinishNumberDay30': 0,
+                'hasCompleteRateDay30': 0,
+                'hasNationalLimit': 0
+            },
+            'version': rnd.randint(1, 50),
+            'authStatus': 2,
+            'recommend': False,
+            'recommendTag': '',
+            'authTag': rnd.choice(AUTH_TAGS),
+            'userType': 'PERSONAL',
+            'itemType': 'ORIGIN',
+            'paymentPeriod': 15,
+            'userMaskId': f'{rnd.getrandbits(64):016x}',
+            'verificationOrderSwitch': False,
+            'verificationOrderLabels': [],
+            'verificationOrderAmount': ''
+        })
+    
+    return {
+        'ret_code': 0,
+        'ret_msg': 'SUCCESS',
+        'result': {'count': 800, 'items': items},
+        'ext_code': '',
+        'ext_info': {},
+        'time_now': '1700000000.000000'
+    }
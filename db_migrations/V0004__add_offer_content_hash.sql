@@ -0,0 +1,5 @@
+-- Хеш содержимого оффера для инкрементальной синхронизации (sync_offers)
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers
+  ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32);
+
+COMMENT ON COLUMN t_p69186337_bybit_p2p_scraper.p2p_offers.content_hash IS 'MD5 полей оффера (цена, лимиты, статус и т.д.) - пишутся только изменившиеся офферы';
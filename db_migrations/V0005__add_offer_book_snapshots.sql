@@ -0,0 +1,47 @@
+-- Версионированные снимки стакана: каждое обновление пишет новый неизменяемый снимок,
+-- а update_metadata.snapshot_id атомарно переключается на него
+
+-- Заголовок снимка (одна версия стакана одной стороны)
+CREATE TABLE IF NOT EXISTS t_p69186337_bybit_p2p_scraper.offer_book_snapshots (
+    snapshot_id BIGSERIAL PRIMARY KEY,
+    side VARCHAR(10) NOT NULL,
+    offers_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индекс для выбора старых снимков стороны при очистке
+CREATE INDEX IF NOT EXISTS idx_offer_book_snapshots_side
+  ON t_p69186337_bybit_p2p_scraper.offer_book_snapshots(side, snapshot_id DESC);
+
+-- Офферы снимка (те же колонки, что и в p2p_offers)
+CREATE TABLE IF NOT EXISTS t_p69186337_bybit_p2p_scraper.offer_book_rows (
+    snapshot_id BIGINT NOT NULL
+      REFERENCES t_p69186337_bybit_p2p_scraper.offer_book_snapshots(snapshot_id) ON DELETE CASCADE,
+    id VARCHAR(100) NOT NULL,
+    side VARCHAR(10) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    min_amount DECIMAL(15, 2) NOT NULL,
+    max_amount DECIMAL(15, 2) NOT NULL,
+    available_amount DECIMAL(15, 2) NOT NULL,
+    nickname VARCHAR(255) NOT NULL,
+    is_merchant BOOLEAN DEFAULT FALSE,
+    merchant_type VARCHAR(50),
+    is_online BOOLEAN DEFAULT FALSE,
+    is_triangle BOOLEAN DEFAULT FALSE,
+    completion_rate INTEGER,
+    completed_orders DECIMAL(5, 2),
+    payment_methods TEXT,
+    content_hash VARCHAR(32),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (snapshot_id, id)
+);
+
+-- Чтение снимка отсортированным по цене без отдельной сортировки
+CREATE INDEX IF NOT EXISTS idx_offer_book_rows_price
+  ON t_p69186337_bybit_p2p_scraper.offer_book_rows(snapshot_id, price);
+
+-- Указатель на текущий снимок стороны
+ALTER TABLE t_p69186337_bybit_p2p_scraper.update_metadata
+  ADD COLUMN IF NOT EXISTS snapshot_id BIGINT;
+
+COMMENT ON COLUMN t_p69186337_bybit_p2p_scraper.update_metadata.snapshot_id IS 'Текущий снимок стороны в offer_book_snapshots - читатели всегда видят полный стакан';
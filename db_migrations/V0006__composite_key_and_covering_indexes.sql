@@ -0,0 +1,39 @@
+-- Составной ключ (side, id): соответствует ON CONFLICT (side, id) в sync_offers
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers
+  DROP CONSTRAINT IF EXISTS p2p_offers_pkey;
+
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers
+  ADD CONSTRAINT p2p_offers_pkey PRIMARY KEY (side, id);
+
+-- Покрывающий индекс для get_offers (WHERE side = %s ORDER BY price):
+-- стакан читается index-only scan уже отсортированным, без обращения к таблице и без Sort
+CREATE INDEX IF NOT EXISTS idx_p2p_offers_side_price
+  ON t_p69186337_bybit_p2p_scraper.p2p_offers(side, price)
+  INCLUDE (id, min_amount, max_amount, available_amount, nickname, is_merchant,
+           merchant_type, is_online, is_triangle, completion_rate, completed_orders,
+           payment_methods);
+
+-- Индекс по side поглощён первичным ключом и покрывающим индексом
+DROP INDEX IF EXISTS t_p69186337_bybit_p2p_scraper.idx_p2p_offers_side;
+
+-- То же для строк снимков (чтение по snapshot_id ORDER BY price)
+CREATE INDEX IF NOT EXISTS idx_offer_book_rows_snapshot_price
+  ON t_p69186337_bybit_p2p_scraper.offer_book_rows(snapshot_id, price)
+  INCLUDE (id, min_amount, max_amount, available_amount, nickname, is_merchant,
+           merchant_type, is_online, is_triangle, completion_rate, completed_orders,
+           payment_methods);
+
+DROP INDEX IF EXISTS t_p69186337_bybit_p2p_scraper.idx_offer_book_rows_price;
+
+-- Index-only scan не ходит в таблицу только для страниц, отмеченных в visibility map.
+-- Частый autovacuum после вставок держит её актуальной для свежих снимков и обновлений
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers SET (
+  autovacuum_vacuum_scale_factor = 0.05,
+  autovacuum_vacuum_insert_scale_factor = 0.05,
+  autovacuum_vacuum_insert_threshold = 500
+);
+
+ALTER TABLE t_p69186337_bybit_p2p_scraper.offer_book_rows SET (
+  autovacuum_vacuum_insert_scale_factor = 0.05,
+  autovacuum_vacuum_insert_threshold = 500
+);
@@ -0,0 +1,10 @@
+-- Поиск трейдера по нику (?search=): ILIKE '%...%' по p2p_offers.nickname
+-- обслуживается триграммным GIN-индексом вместо полного просмотра таблицы.
+-- Индекс нужен только режимам хранения 'incremental' и 'replace' (стакан в p2p_offers).
+-- В режиме 'snapshot' (по умолчанию) поиск читает offer_book_rows текущего снимка
+-- (не больше 800 строк) по покрывающему индексу (snapshot_id, price) с nickname
+-- (V0006) - триграммный индекс там не ускорит чтение, а замедлит запись каждого снимка
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_p2p_offers_nickname_trgm
+  ON t_p69186337_bybit_p2p_scraper.p2p_offers USING GIN (nickname gin_trgm_ops);
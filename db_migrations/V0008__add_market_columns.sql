@@ -0,0 +1,48 @@
+-- Несколько рынков P2P: криптовалюта (token) и фиат (fiat) в ключах стакана,
+-- снимков и метаданных. Существующие данные - рынок USDT/RUB
+
+-- Офферы
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers
+  ADD COLUMN IF NOT EXISTS token VARCHAR(10) NOT NULL DEFAULT 'USDT',
+  ADD COLUMN IF NOT EXISTS fiat VARCHAR(10) NOT NULL DEFAULT 'RUB';
+
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers
+  DROP CONSTRAINT IF EXISTS p2p_offers_pkey;
+
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers
+  ADD CONSTRAINT p2p_offers_pkey PRIMARY KEY (token, fiat, side, id);
+
+-- Покрывающий индекс get_offers теперь начинается с рынка
+CREATE INDEX IF NOT EXISTS idx_p2p_offers_market_side_price
+  ON t_p69186337_bybit_p2p_scraper.p2p_offers(token, fiat, side, price)
+  INCLUDE (id, min_amount, max_amount, available_amount, nickname, is_merchant,
+           merchant_type, is_online, is_triangle, completion_rate, completed_orders,
+           payment_methods);
+
+DROP INDEX IF EXISTS t_p69186337_bybit_p2p_scraper.idx_p2p_offers_side_price;
+
+-- Строки снимков: те же колонки, что и в p2p_offers (COPY пишет OFFER_COLUMNS)
+ALTER TABLE t_p69186337_bybit_p2p_scraper.offer_book_rows
+  ADD COLUMN IF NOT EXISTS token VARCHAR(10) NOT NULL DEFAULT 'USDT',
+  ADD COLUMN IF NOT EXISTS fiat VARCHAR(10) NOT NULL DEFAULT 'RUB';
+
+-- Снимки: очистка старых снимков идёт по рынку и стороне
+ALTER TABLE t_p69186337_bybit_p2p_scraper.offer_book_snapshots
+  ADD COLUMN IF NOT EXISTS token VARCHAR(10) NOT NULL DEFAULT 'USDT',
+  ADD COLUMN IF NOT EXISTS fiat VARCHAR(10) NOT NULL DEFAULT 'RUB';
+
+CREATE INDEX IF NOT EXISTS idx_offer_book_snapshots_market_side
+  ON t_p69186337_bybit_p2p_scraper.offer_book_snapshots(token, fiat, side, snapshot_id DESC);
+
+DROP INDEX IF EXISTS t_p69186337_bybit_p2p_scraper.idx_offer_book_snapshots_side;
+
+-- Метаданные и указатель на снимок - на каждую сторону каждого рынка
+ALTER TABLE t_p69186337_bybit_p2p_scraper.update_metadata
+  ADD COLUMN IF NOT EXISTS token VARCHAR(10) NOT NULL DEFAULT 'USDT',
+  ADD COLUMN IF NOT EXISTS fiat VARCHAR(10) NOT NULL DEFAULT 'RUB';
+
+ALTER TABLE t_p69186337_bybit_p2p_scraper.update_metadata
+  DROP CONSTRAINT IF EXISTS update_metadata_pkey;
+
+ALTER TABLE t_p69186337_bybit_p2p_scraper.update_metadata
+  ADD CONSTRAINT update_metadata_pkey PRIMARY KEY (token, fiat, side);
@@ -0,0 +1,52 @@
+-- История стакана: append-only офферы каждого обновления и сводка обновления.
+-- Не путать с offer_book_snapshots (версии текущего стакана, хранятся последние
+-- SNAPSHOT_RETENTION): p2p_offer_snapshots - история за дни, только дописывается.
+-- Обе таблицы секционированы по дням (captured_at): запросы за период читают только
+-- свои секции, а старые секции удаляются целиком (prune_history) без DELETE и VACUUM.
+-- Секции создаёт приложение (DatabaseManager._ensure_history_partition)
+
+-- Офферы каждого обновления стороны рынка
+CREATE TABLE IF NOT EXISTS t_p69186337_bybit_p2p_scraper.p2p_offer_snapshots (
+    captured_at TIMESTAMP NOT NULL,
+    token VARCHAR(10) NOT NULL,
+    fiat VARCHAR(10) NOT NULL,
+    side VARCHAR(10) NOT NULL,
+    id VARCHAR(100) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    min_amount DECIMAL(15, 2) NOT NULL,
+    max_amount DECIMAL(15, 2) NOT NULL,
+    available_amount DECIMAL(15, 2) NOT NULL,
+    nickname VARCHAR(255) NOT NULL,
+    is_merchant BOOLEAN DEFAULT FALSE,
+    merchant_type VARCHAR(50),
+    is_online BOOLEAN DEFAULT FALSE,
+    completion_rate INTEGER,
+    completed_orders DECIMAL(5, 2),
+    payment_methods TEXT
+) PARTITION BY RANGE (captured_at);
+
+-- Выборка истории рынка за период (индекс создаётся в каждой секции)
+CREATE INDEX IF NOT EXISTS idx_p2p_offer_snapshots_market_time
+  ON t_p69186337_bybit_p2p_scraper.p2p_offer_snapshots(token, fiat, side, captured_at);
+
+-- Сводка каждого обновления: лучшая цена, глубина ±0.5%/1%, доля мерчантов, онлайн.
+-- Спред - разница лучших цен сторон sell (1) и buy (0) на одну минуту
+CREATE TABLE IF NOT EXISTS t_p69186337_bybit_p2p_scraper.book_summary (
+    captured_at TIMESTAMP NOT NULL,
+    token VARCHAR(10) NOT NULL,
+    fiat VARCHAR(10) NOT NULL,
+    side VARCHAR(10) NOT NULL,
+    best_price DECIMAL(10, 2),
+    offers_count INTEGER NOT NULL DEFAULT 0,
+    total_quantity DECIMAL(20, 2) NOT NULL DEFAULT 0,
+    depth_05_quantity DECIMAL(20, 2) NOT NULL DEFAULT 0,
+    depth_05_amount DECIMAL(20, 2) NOT NULL DEFAULT 0,
+    depth_1_quantity DECIMAL(20, 2) NOT NULL DEFAULT 0,
+    depth_1_amount DECIMAL(20, 2) NOT NULL DEFAULT 0,
+    merchant_share REAL NOT NULL DEFAULT 0,
+    online_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (token, fiat, side, captured_at)
+) PARTITION BY RANGE (captured_at);
+
+COMMENT ON TABLE t_p69186337_bybit_p2p_scraper.p2p_offer_snapshots IS 'История офферов по обновлениям (append-only, секции по дням)';
+COMMENT ON TABLE t_p69186337_bybit_p2p_scraper.book_summary IS 'Сводка стакана на каждое обновление, пишется в одной транзакции с офферами';
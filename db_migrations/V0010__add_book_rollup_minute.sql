@@ -0,0 +1,20 @@
+-- Минутные роллапы рынка для истории цен и спреда (?history=spread&window=24h&step=5m):
+-- одна строка на рынок и минуту с лучшими ценами и глубиной обеих сторон.
+-- Стороны обновляются в разные моменты, поэтому каждая запись стакана дописывает
+-- свои колонки в строку минуты (UPSERT в транзакции записи, см. _record_history).
+-- Секции по дням, как у book_summary; срок хранения - summary_retention_days
+
+CREATE TABLE IF NOT EXISTS t_p69186337_bybit_p2p_scraper.book_rollup_minute (
+    token VARCHAR(10) NOT NULL,
+    fiat VARCHAR(10) NOT NULL,
+    minute TIMESTAMP NOT NULL,
+    sell_price DECIMAL(10, 2),
+    buy_price DECIMAL(10, 2),
+    sell_depth_1_amount DECIMAL(20, 2),
+    buy_depth_1_amount DECIMAL(20, 2),
+    sell_offers INTEGER,
+    buy_offers INTEGER,
+    PRIMARY KEY (token, fiat, minute)
+) PARTITION BY RANGE (minute);
+
+COMMENT ON TABLE t_p69186337_bybit_p2p_scraper.book_rollup_minute IS 'Лучшие цены и глубина 1% обеих сторон рынка по минутам (источник ?history)';
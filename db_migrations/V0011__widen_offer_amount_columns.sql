@@ -0,0 +1,28 @@
+-- Рынки BTC и ETH (V0008): количество оффера дробное (0.0523 BTC), а DECIMAL(15, 2)
+-- округлял его до 0.05 - стакан из БД, история и сводки получали неверную ликвидность.
+-- Количество и лимиты оффера хранятся с 8 знаками (DatabaseManager.AMOUNT_SCALE)
+-- во всех таблицах офферов; покрывающие индексы перестраиваются вместе с колонками
+
+-- Текущий стакан (режимы 'incremental' и 'replace')
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers
+  ALTER COLUMN min_amount TYPE NUMERIC(28, 8),
+  ALTER COLUMN max_amount TYPE NUMERIC(28, 8),
+  ALTER COLUMN available_amount TYPE NUMERIC(28, 8);
+
+-- Строки снимков (режим 'snapshot')
+ALTER TABLE t_p69186337_bybit_p2p_scraper.offer_book_rows
+  ALTER COLUMN min_amount TYPE NUMERIC(28, 8),
+  ALTER COLUMN max_amount TYPE NUMERIC(28, 8),
+  ALTER COLUMN available_amount TYPE NUMERIC(28, 8);
+
+-- История офферов (тип меняется во всех секциях)
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offer_snapshots
+  ALTER COLUMN min_amount TYPE NUMERIC(28, 8),
+  ALTER COLUMN max_amount TYPE NUMERIC(28, 8),
+  ALTER COLUMN available_amount TYPE NUMERIC(28, 8);
+
+-- Сводки: суммарное количество и глубина в криптовалюте
+ALTER TABLE t_p69186337_bybit_p2p_scraper.book_summary
+  ALTER COLUMN total_quantity TYPE NUMERIC(28, 8),
+  ALTER COLUMN depth_05_quantity TYPE NUMERIC(28, 8),
+  ALTER COLUMN depth_1_quantity TYPE NUMERIC(28, 8);
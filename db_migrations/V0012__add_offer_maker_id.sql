@@ -0,0 +1,27 @@
+-- ID трейдера (maker_id, userId Bybit) в стакане: поиск ?search= по ID из БД
+-- находит то же, что и индекс стакана в памяти (TraderIndex ищет по нику и ID).
+-- Строки без ID (записанные до миграции) заполняются следующим обновлением стакана
+
+ALTER TABLE t_p69186337_bybit_p2p_scraper.p2p_offers
+  ADD COLUMN IF NOT EXISTS maker_id VARCHAR(64);
+
+ALTER TABLE t_p69186337_bybit_p2p_scraper.offer_book_rows
+  ADD COLUMN IF NOT EXISTS maker_id VARCHAR(64);
+
+-- Покрывающие индексы чтения стакана включают maker_id: стакан по-прежнему
+-- отдаётся index-only scan без обращения к таблице
+DROP INDEX IF EXISTS t_p69186337_bybit_p2p_scraper.idx_p2p_offers_market_side_price;
+
+CREATE INDEX idx_p2p_offers_market_side_price
+  ON t_p69186337_bybit_p2p_scraper.p2p_offers(token, fiat, side, price)
+  INCLUDE (id, min_amount, max_amount, available_amount, nickname, maker_id, is_merchant,
+           merchant_type, is_online, is_triangle, completion_rate, completed_orders,
+           payment_methods);
+
+DROP INDEX IF EXISTS t_p69186337_bybit_p2p_scraper.idx_offer_book_rows_snapshot_price;
+
+CREATE INDEX idx_offer_book_rows_snapshot_price
+  ON t_p69186337_bybit_p2p_scraper.offer_book_rows(snapshot_id, price)
+  INCLUDE (id, min_amount, max_amount, available_amount, nickname, maker_id, is_merchant,
+           merchant_type, is_online, is_triangle, completion_rate, completed_orders,
+           payment_methods);
@@ -0,0 +1,7 @@
+-- Поиск трейдера по ID (?search=): ILIKE '%...%' по p2p_offers.maker_id, как и по нику (V0007),
+-- обслуживается триграммным GIN-индексом. Нужен только режимам 'incremental' и 'replace';
+-- в режиме 'snapshot' ID читается из покрывающего индекса offer_book_rows (V0012)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_p2p_offers_maker_id_trgm
+  ON t_p69186337_bybit_p2p_scraper.p2p_offers USING GIN (maker_id gin_trgm_ops);
@@ -0,0 +1,61 @@
+"""
+Юнит-тесты модулей парсера Bybit P2P (без сети). Тесты записи в БД идут на отдельной
+тестовой базе из TEST_DATABASE_URL со схемой из db_migrations, без неё - пропускаются
+"""
+
+import os
+import sys
+
+import pytest
+
+# Модули функции лежат в backend/bybit-parser без пакета, синтетические данные - в benchmarks
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'bybit-parser'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# Рынок тестов БД: его строки удаляются после каждого теста
+TEST_TOKEN, TEST_FIAT = 'USDT', 'TEST'
+
+BOOK_TABLES = ('p2p_offers', 'offer_book_snapshots', 'update_metadata',
+               'p2p_offer_snapshots', 'book_summary', 'book_rollup_minute')
+
+
+@pytest.fixture
+def make_db(monkeypatch):
+    """
+    Фабрика DatabaseManager на тестовой БД: make_db(storage_mode='snapshot', ...).
+    Пропускает тест, если TEST_DATABASE_URL не задан, БД недоступна или миграции не применены
+    """
+    psycopg2 = pytest.importorskip('psycopg2')
+    dsn = os.environ.get('TEST_DATABASE_URL')
+    if not dsn:
+        pytest.skip('TEST_DATABASE_URL is not set')
+
+    from db_manager import DatabaseManager
+
+    # Менеджеры теста подключаются только к тестовой БД - со своим пулом соединений
+    monkeypatch.setenv('DATABASE_URL', dsn)
+    monkeypatch.setattr(DatabaseManager, '_pool', None)
+
+    try:
+        conn = psycopg2.connect(dsn)
+    except psycopg2.Error as e:
+        pytest.skip(f'database is unavailable: {e}')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 't_p69186337_bybit_p2p_scraper')
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'{schema}.update_metadata',))
+            if not cur.fetchone()[0]:
+                pytest.skip(f'schema {schema} is not migrated')
+
+        yield lambda **kwargs: DatabaseManager(**kwargs)
+
+        conn.rollback()
+        with conn.cursor() as cur:
+            for table in BOOK_TABLES:
+                cur.execute(f"DELETE FROM {schema}.{table} WHERE token = %s AND fiat = %s", (TEST_TOKEN, TEST_FIAT))
+        conn.commit()
+    finally:
+        conn.close()
+        if DatabaseManager._pool is not None:
+            DatabaseManager._pool.closeall()
@@ -0,0 +1,98 @@
+"""
+BookFeed: версии и дельты стакана, вытеснение дельт сверх capacity, версия без изменений
+"""
+
+import dataclasses
+
+import pytest
+
+from book_feed import BookFeed, diff_offers
+from book_query import BookQuery
+from synthetic import make_offers
+
+
+@pytest.fixture
+def offers():
+    return make_offers(20)
+
+
+def apply(book: dict, delta: dict) -> dict:
+    book = dict(book)
+    for offer_id in delta['removed']:
+        del book[offer_id]
+    for offer in delta['added'] + delta['changed']:
+        book[offer.id] = offer
+    return book
+
+
+def test_diff_offers(offers):
+    previous = {offer.id: offer for offer in offers[:10]}
+    changed = dataclasses.replace(offers[1], price=offers[1].price + 1)
+    current = {offer.id: offer for offer in [offers[0], changed] + offers[3:12]}
+
+    delta = diff_offers(previous, current)
+    assert [offer.id for offer in delta['added']] == [offers[10].id, offers[11].id]
+    assert delta['removed'] == [offers[2].id]
+    assert delta['changed'] == [changed]
+
+
+def test_deltas_rebuild_book(offers):
+    feed = BookFeed()
+    start = feed.publish(offers[:10])
+    versions = [offers[2:12], offers[2:11] + [dataclasses.replace(offers[11], quantity=1.5)], offers[5:15]]
+    for version in versions:
+        feed.publish(version)
+
+    book = {offer.id: offer for offer in offers[:10]}
+    deltas = feed.since(start, feed.seq)
+    assert [delta['seq'] for delta in deltas] == [start + 1, start + 2, start + 3]
+    for delta in deltas:
+        book = apply(book, delta)
+    assert book == {offer.id: offer for offer in versions[-1]}
+
+
+def test_unchanged_book_keeps_seq(offers):
+    feed = BookFeed()
+    seq = feed.publish(offers)
+    # Тот же стакан из БД: другие объекты, поля вне CONTENT_FIELDS не влияют
+    reread = [dataclasses.replace(offer, last_logout_time=None, auth_tags=[]) for offer in offers]
+
+    assert feed.publish(reread) == seq
+    assert not feed.wait(seq, 0.01)
+    assert feed.since(seq, feed.seq) == []
+    assert len(feed.deltas) == 0
+
+
+def test_delta_after_capacity_eviction(offers):
+    feed = BookFeed(capacity=3)
+    first = feed.publish(offers[:5])
+    for count in range(6, 12):
+        feed.publish(offers[:count])
+
+    # В буфере дельты трёх последних версий
+    assert [delta['seq'] for delta in feed.deltas] == [first + 4, first + 5, first + 6]
+    assert feed.since(first, feed.seq) is None
+    assert feed.since(first + 2, feed.seq) is None
+    deltas = feed.since(first + 3, feed.seq)
+    assert [delta['added'][0].id for delta in deltas] == [offers[8].id, offers[9].id, offers[10].id]
+
+
+def test_unknown_seq_needs_snapshot(offers):
+    feed = BookFeed()
+    seq = feed.publish(offers)
+    feed.publish(offers[1:])
+
+    assert feed.since(seq + 5, feed.seq) is None
+    assert feed.since(5, feed.seq) is None
+    # Версия новее запрошенной границы - дельты только до upto
+    feed.publish(offers[2:])
+    assert [delta['seq'] for delta in feed.since(seq, seq + 1)] == [seq + 1]
+
+
+def test_since_param():
+    assert BookQuery.from_params({'since': '1792209032596001'}, 100).since == 1792209032596001
+    assert BookQuery.from_params({'since': '0'}, 100).since == 0
+    for params in ({'since': 'x'}, {'since': '-1'}, {'since': '1', 'payment': 'Sberbank'},
+                   {'since': '1', 'limit': '10'}, {'since': '1', 'metrics': 'true'}):
+        with pytest.raises(ValueError):
+            BookQuery.from_params(params, 100)
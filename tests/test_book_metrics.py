@@ -0,0 +1,82 @@
+"""
+book_metrics: лестница VWAP и кривая глубины за один проход против OrderBook.vwap/depth
+"""
+
+import numpy as np
+import pytest
+
+from book_metrics import DEPTH_PERCENTS, book_metrics, ladder_vwap
+from order_book import OrderBook
+from synthetic import make_offers
+
+LADDER = (100.0, 5000.0, 50000.0, 250000.0, 1000000.0, 1e12)
+
+
+@pytest.fixture(params=['1', '0'], ids=['sell', 'buy'])
+def book(request):
+    side = 'sell' if request.param == '1' else 'buy'
+    return OrderBook(make_offers(500, side=request.param), side)
+
+
+def assert_ladder(ladder, book, mask=None):
+    assert [step['amount'] for step in ladder] == list(LADDER)
+    for step in ladder:
+        expected = book.vwap(step['amount'], mask)
+        if expected is None:
+            assert step['price'] is None
+        else:
+            assert step['price'] == pytest.approx(expected)
+
+
+def test_vwap_matches_order_book(book):
+    metrics = book_metrics(book, LADDER)
+
+    assert_ladder(metrics['vwap'], book)
+    assert metrics['vwap'][-1]['price'] is None
+    assert metrics['best_price'] == book.best_price()
+    assert metrics['offers'] == len(book)
+
+
+def test_vwap_on_exact_offer_boundary(book):
+    indices = book.indices()
+    liquidity = book.liquidity(indices)
+    boundary = float(liquidity[:3].sum())
+
+    step, = ladder_vwap(book.price[indices], liquidity, [boundary])
+    assert step['price'] == pytest.approx(book.vwap(boundary))
+
+
+def test_depth_curve_matches_order_book(book):
+    depth = book_metrics(book, LADDER)['depth']
+
+    assert [level['percent'] for level in depth] == list(DEPTH_PERCENTS)
+    for level in depth:
+        expected = book.depth(level['percent'])
+        assert level['offers'] == expected['offers']
+        assert level['quantity'] == pytest.approx(expected['quantity'])
+        assert level['amount'] == pytest.approx(expected['amount'])
+
+
+def test_filtered_metrics_and_payments(book):
+    mask = book.mask(online=True)
+    metrics = book_metrics(book, LADDER, mask)
+
+    assert metrics['offers'] == int(mask.sum())
+    assert_ladder(metrics['vwap'], book, mask)
+    for name, payment in metrics['payments'].items():
+        payment_mask = book.mask(payment=[name]) & mask
+        assert payment['offers'] == int(payment_mask.sum())
+        assert payment['best_price'] == book.best_price(payment_mask)
+        assert_ladder(payment['vwap'], book, payment_mask)
+
+
+def test_empty_selection():
+    book = OrderBook(make_offers(50), 'sell')
+    metrics = book_metrics(book, LADDER, np.zeros(len(book), dtype=np.bool_))
+
+    assert metrics['best_price'] is None
+    assert metrics['offers'] == 0
+    assert metrics['depth'] == []
+    assert metrics['payments'] == {}
+    assert all(step['price'] is None for step in metrics['vwap'])
+    assert ladder_vwap(book.price, book.liquidity(book.indices()), []) == []
@@ -0,0 +1,100 @@
+"""
+BookQuery: разбор параметров, фильтры и постраничная выдача через next_cursor
+"""
+
+import pytest
+
+from book_query import BookQuery, PAYMENT_IDS
+from models import PAYMENT_METHOD_MAP
+from order_book import OrderBook
+from synthetic import make_offers
+
+MAX_LIMIT = 100
+
+
+@pytest.fixture(scope='module')
+def book():
+    return OrderBook(make_offers(1000), 'sell')
+
+
+def parse(**params):
+    return BookQuery.from_params(params, MAX_LIMIT)
+
+
+def test_no_params_is_none():
+    assert parse() is None
+    assert parse(limit='quick') is None
+    assert parse(limit='full', side='1') is None
+
+
+def test_cursor_round_trip(book):
+    params = {'payment': 'Sberbank', 'limit': '37'}
+    expected = [offer.id for offer in book.select(book.mask(payment=['Sberbank']))]
+
+    seen = []
+    cursor = None
+    while True:
+        query = parse(**params, **({'cursor': cursor} if cursor else {}))
+        result = query.run(book)
+        assert result['total'] == len(expected)
+        assert len(result['offers']) <= 37
+        seen.extend(offer.id for offer in result['offers'])
+        cursor = result['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+
+def test_page_without_limit_returns_rest(book):
+    result = parse(payment='Tinkoff', cursor='5').run(book)
+    assert result['next_cursor'] is None
+    assert len(result['offers']) == result['total'] - 5
+
+
+def test_payment_ids_are_mapped():
+    assert parse(payment='Sberbank, 378').filters['payment'] == ['Sberbank', PAYMENT_METHOD_MAP['378']]
+    assert parse(payment='other').filters['payment'] == ['other']
+
+
+@pytest.mark.parametrize('params', [
+    {'payment': 'Sberbnk'},
+    {'payment': 'Sberbank,99999'},
+    {'payment': ','},
+    {'payment': ' , '},
+    {'merchant_type': 'platinum'},
+    {'online': 'yes'},
+    {'amount': 'abc'},
+    {'amount': '-5'},
+    {'min_completion': '9.5'},
+    {'limit': '0'},
+    {'limit': str(MAX_LIMIT + 1)},
+    {'limit': 'many'},
+    {'cursor': '-1'},
+    {'cursor': 'next'},
+    {'metrics': 'yes'},
+    {'amounts': '1000'},
+    {'metrics': 'true', 'amounts': '1000,x'},
+    {'metrics': 'true', 'amounts': '0'},
+])
+def test_invalid_params(params):
+    with pytest.raises(ValueError):
+        BookQuery.from_params(params, MAX_LIMIT)
+
+
+def test_metrics_ladder():
+    assert parse(metrics='true').metrics == ()
+    assert BookQuery.from_params({'metrics': 'true'}, MAX_LIMIT, ladder=(1000.0,)).metrics == (1000.0,)
+    assert parse(metrics='true', amounts='500,2000').metrics == (500.0, 2000.0)
+    assert parse(metrics='false') is None
+
+
+def test_upstream_filters():
+    assert parse(payment='Sberbank,Tinkoff', amount='5000').upstream() == {
+        'payment': sorted({PAYMENT_IDS['Sberbank'], PAYMENT_IDS['Tinkoff']}),
+        'amount': '5000'
+    }
+    assert parse(amount='1500.5').upstream() == {'amount': '1500.5'}
+    # Способы вне PAYMENT_METHOD_MAP - Bybit фильтрует только по сумме
+    assert parse(payment='Sberbank,other', amount='700').upstream() == {'amount': '700'}
+    assert parse(online='true').upstream() is None
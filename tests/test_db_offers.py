@@ -0,0 +1,92 @@
+"""
+Чтение стакана из БД: SQL offers_query (источник по режиму хранения, сортировка по колонке
+o.price, а не по выражению price::float8), и на тестовой БД - порядок и содержимое офферов
+во всех режимах, потоковое чтение серверным курсором с возвратом соединения в пул
+"""
+
+import re
+from operator import attrgetter
+
+import pytest
+
+from conftest import TEST_FIAT, TEST_TOKEN
+from db_manager import DatabaseManager
+from models import Market
+from synthetic import make_offers
+
+MARKET = Market(TEST_TOKEN, TEST_FIAT)
+STORAGE_MODES = DatabaseManager.STORAGE_MODES
+
+# Поля оффера, которые хранит БД
+stored_fields = attrgetter(
+    'id', 'price', 'min_amount', 'max_amount', 'quantity', 'maker', 'maker_id', 'payment_methods',
+    'completion_rate', 'total_orders', 'is_merchant', 'merchant_type', 'is_online', 'is_triangle'
+)
+
+
+def bare_manager(storage_mode: str) -> DatabaseManager:
+    # Без __init__: пул соединений не нужен
+    manager = object.__new__(DatabaseManager)
+    manager.schema = 'bybit'
+    manager.storage_mode = storage_mode
+    return manager
+
+
+@pytest.mark.parametrize('storage_mode', STORAGE_MODES)
+@pytest.mark.parametrize('side, direction', [('1', 'ASC'), ('0', 'DESC')])
+def test_offers_query_orders_by_column(storage_mode, side, direction):
+    sql = bare_manager(storage_mode).offers_query(side)
+
+    assert re.search(rf'ORDER BY o\.price {direction}\s*$', sql)
+    assert 'price::float8' in sql
+    assert 'ORDER BY price' not in sql
+
+
+@pytest.mark.parametrize('storage_mode, source', [
+    ('snapshot', 'bybit.offer_book_rows AS o'),
+    ('incremental', 'bybit.p2p_offers AS o'),
+    ('replace', 'bybit.p2p_offers AS o')
+])
+def test_offers_source_by_storage_mode(storage_mode, source):
+    manager = bare_manager(storage_mode)
+    sql = manager.offers_query('1', search=True)
+
+    assert source in sql
+    assert ('update_metadata' in sql) == (storage_mode == 'snapshot')
+    # Плейсхолдеры совпадают с offers_params: рынок, сторона и шаблон поиска дважды
+    assert sql.count('%s') == len(manager.offers_params('1', MARKET, 'trader')) == 5
+    assert manager.offers_query('1').count('%s') == len(manager.offers_params('1', MARKET)) == 3
+
+
+@pytest.mark.parametrize('storage_mode', STORAGE_MODES)
+@pytest.mark.parametrize('side', ['1', '0'])
+def test_roundtrip_sorted_by_price(make_db, storage_mode, side):
+    db = make_db(storage_mode=storage_mode)
+    offers = make_offers(300, side=side)
+    db.store_offers(offers, side, MARKET)
+
+    stored = db.get_offers(side, MARKET)
+
+    expected = sorted(offers, key=lambda offer: offer.price, reverse=side == '0')
+    assert [offer.price for offer in stored] == [offer.price for offer in expected]
+    assert sorted(map(stored_fields, stored)) == sorted(map(stored_fields, offers))
+    assert all(type(offer.price) is float and type(offer.total_orders) is int for offer in stored)
+
+
+def test_iter_offers_streams_and_returns_connection(make_db, monkeypatch):
+    db = make_db()
+    db.store_offers(make_offers(50), '1', MARKET)
+    monkeypatch.setattr(db, 'READ_ITERSIZE', 7)
+    returned = []
+    put_connection = db.put_connection
+    monkeypatch.setattr(db, 'put_connection', lambda conn: returned.append(conn) or put_connection(conn))
+
+    assert len(list(db.iter_offers('1', market=MARKET))) == 50
+    assert len(returned) == 1
+
+    # Генератор закрыт до конца: серверный курсор закрывается, соединение возвращается без транзакции
+    reader = db.iter_offers('1', market=MARKET)
+    next(reader)
+    reader.close()
+    assert len(returned) == 2
+    assert returned[1].get_transaction_status() == 0
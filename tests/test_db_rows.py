@@ -0,0 +1,115 @@
+"""
+Строки офферов для записи в БД без подключения: текстовый формат COPY,
+отбрасывание дубликатов id, хеш содержимого для инкрементальной синхронизации
+"""
+
+import dataclasses
+import io
+from datetime import datetime
+
+import pytest
+
+from db_manager import DatabaseManager
+from models import Market
+from synthetic import make_offers
+
+
+class CopyCursor:
+    """Курсор, который только запоминает COPY"""
+
+    def __init__(self):
+        self.sql = None
+        self.data = None
+
+    def copy_expert(self, sql: str, buffer: io.StringIO):
+        self.sql = sql
+        self.data = buffer.read()
+
+
+@pytest.fixture
+def manager():
+    # Без __init__: пул соединений не нужен
+    return object.__new__(DatabaseManager)
+
+
+def unescape(value: str):
+    if value == '\\N':
+        return None
+    return value.replace('\\t', '\t').replace('\\n', '\n').replace('\\r', '\r').replace('\\\\', '\\')
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, '\\N'),
+    (True, 't'),
+    (False, 'f'),
+    (92.35, '92.35'),
+    (datetime(2026, 1, 1, 12, 0, 5), '2026-01-01T12:00:05'),
+    ('tab\there', 'tab\\there'),
+    ('line\nbreak\r', 'line\\nbreak\\r'),
+    ('back\\slash', 'back\\\\slash'),
+])
+def test_copy_value(value, expected):
+    assert DatabaseManager._copy_value(value) == expected
+
+
+def test_copy_rows_round_trip(manager):
+    offers = make_offers(5)
+    offers[0] = dataclasses.replace(offers[0], maker='tab\tand\\back\nslash', merchant_type=None)
+    rows = manager._unique_offer_rows(offers, 'sell', Market('BTC', 'RUB'))
+    cursor = CopyCursor()
+
+    manager._copy_rows(cursor, 'p2p_offers_staging', DatabaseManager.OFFER_COLUMNS, rows)
+
+    assert cursor.sql == f"COPY p2p_offers_staging ({', '.join(DatabaseManager.OFFER_COLUMNS)}) FROM STDIN"
+    lines = cursor.data.split('\n')
+    assert lines[-1] == '' and len(lines) == 6
+    parsed = [[unescape(value) for value in line.split('\t')] for line in lines[:-1]]
+    assert all(len(row) == len(DatabaseManager.OFFER_COLUMNS) for row in parsed)
+    assert parsed[0][DatabaseManager.OFFER_COLUMNS.index('nickname')] == 'tab\tand\\back\nslash'
+    assert parsed[0][DatabaseManager.OFFER_COLUMNS.index('merchant_type')] is None
+    assert [row[1:3] for row in parsed] == [['BTC', 'RUB']] * 5
+
+
+def test_unique_offer_rows_drops_duplicate_ids(manager):
+    offers = make_offers(4)
+    shifted = dataclasses.replace(offers[1], price=offers[1].price + 1)
+    rows = manager._unique_offer_rows(offers + [shifted], 'sell')
+
+    assert [row[0] for row in rows] == [offer.id for offer in offers]
+    assert rows[1][DatabaseManager.OFFER_COLUMNS.index('price')] == offers[1].price
+
+
+@pytest.mark.parametrize('changes', [
+    {'price': 93.01},
+    {'quantity': 1234.5},
+    {'max_amount': 777000.0},
+    {'maker': 'someone_else'},
+    {'maker_id': '99999999'},
+    {'is_online': False},
+    {'total_orders': 42},
+    {'payment_methods': ['YooMoney']},
+])
+def test_offer_hash_changes_with_content(changes):
+    offer = dataclasses.replace(make_offers(1)[0], price=93.0, is_online=True)
+    assert DatabaseManager._offer_hash(dataclasses.replace(offer, **changes)) != DatabaseManager._offer_hash(offer)
+
+
+def test_offer_hash_ignores_identity_and_float_noise():
+    offer = dataclasses.replace(make_offers(1)[0], price=93.0)
+    same = dataclasses.replace(
+        offer, id='other', side='buy', price=93.0 + 1e-9,
+        last_logout_time=None, auth_tags=['VA3'], merchant_badge='x'
+    )
+
+    assert DatabaseManager._offer_hash(same) == DatabaseManager._offer_hash(offer)
+    assert len(DatabaseManager._offer_hash(offer)) == 32
+
+
+@pytest.mark.parametrize('storage_mode', ['snapshot', 'incremental'])
+def test_search_matches_nick_and_maker_id(manager, storage_mode):
+    manager.schema = 't_p69186337_bybit_p2p_scraper'
+    manager.storage_mode = storage_mode
+    query = manager.offers_query('1', search=True)
+    assert 'o.nickname ILIKE %s OR o.maker_id ILIKE %s' in query
+    assert manager.offers_params('1', Market('USDT', 'RUB'), '7700') == ('USDT', 'RUB', '1', '%7700%', '%7700%')
+    assert manager.offers_params('1', Market('USDT', 'RUB'), '77') == ('USDT', 'RUB', '1', '77%', '77%')
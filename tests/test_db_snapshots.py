@@ -0,0 +1,120 @@
+"""
+Снимки стакана на тестовой БД: publish_snapshot переключает указатель update_metadata,
+gc_snapshots хранит snapshot_retention последних и никогда не удаляет текущий
+"""
+
+import dataclasses
+
+from conftest import TEST_FIAT, TEST_TOKEN
+from models import Market
+from synthetic import make_offers
+
+MARKET = Market(TEST_TOKEN, TEST_FIAT)
+
+
+def query(db, sql: str, params: tuple = ()) -> list:
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+    finally:
+        db.put_connection(conn)
+
+
+def pointer(db, side: str = '1'):
+    rows = query(db, f"""
+        SELECT snapshot_id FROM {db.schema}.update_metadata
+        WHERE token = %s AND fiat = %s AND side = %s
+    """, (MARKET.token, MARKET.fiat, side))
+    return rows[0][0] if rows else None
+
+
+def snapshot_ids(db, side: str = '1') -> list:
+    return [row[0] for row in query(db, f"""
+        SELECT snapshot_id FROM {db.schema}.offer_book_snapshots
+        WHERE token = %s AND fiat = %s AND side = %s ORDER BY snapshot_id
+    """, (MARKET.token, MARKET.fiat, side))]
+
+
+def reprice(offers: list, delta: float) -> list:
+    return [dataclasses.replace(offer, price=round(offer.price + delta, 2)) for offer in offers]
+
+
+def test_publish_flips_pointer(make_db):
+    db = make_db(snapshot_retention=3)
+    offers = make_offers(40)
+
+    first = db.publish_snapshot(offers, '1', MARKET)
+    assert pointer(db) == first
+    assert [offer.price for offer in db.get_offers('1', MARKET)] == sorted(offer.price for offer in offers)
+
+    second = db.publish_snapshot(reprice(offers, 10), '1', MARKET)
+    assert second > first
+    assert pointer(db) == second
+    assert min(offer.price for offer in db.get_offers('1', MARKET)) >= 100
+
+    # Другая сторона рынка - свой указатель
+    assert pointer(db, '0') is None
+    assert db.get_offers('0', MARKET) == []
+
+
+def test_empty_book_keeps_pointer(make_db):
+    db = make_db()
+    current = db.publish_snapshot(make_offers(10), '1', MARKET)
+
+    assert db.publish_snapshot([], '1', MARKET) == 0
+    assert pointer(db) == current
+    assert len(db.get_offers('1', MARKET)) == 10
+
+
+def test_gc_keeps_retention(make_db):
+    db = make_db(snapshot_retention=2)
+    offers = make_offers(20)
+    published = [db.publish_snapshot(reprice(offers, step), '1', MARKET) for step in range(4)]
+
+    # publish_snapshot сам собирает старые снимки
+    assert snapshot_ids(db) == published[-2:]
+    assert pointer(db) == published[-1]
+    # Строки удалённых снимков удалены каскадно
+    assert query(db, f"SELECT count(*) FROM {db.schema}.offer_book_rows WHERE snapshot_id = ANY(%s)",
+                 (published[:2],)) == [(0,)]
+
+
+def test_gc_never_drops_current(make_db):
+    db = make_db(snapshot_retention=1)
+    oldest = db.publish_snapshot(make_offers(10), '1', MARKET)
+    db.snapshot_retention = 3
+    db.publish_snapshot(make_offers(10, seed=1), '1', MARKET)
+    newest = db.publish_snapshot(make_offers(10, seed=2), '1', MARKET)
+
+    # Указатель вернули на старый снимок (например, откат): он переживает очистку
+    query(db, f"""
+        UPDATE {db.schema}.update_metadata SET snapshot_id = %s
+        WHERE token = %s AND fiat = %s AND side = %s RETURNING snapshot_id
+    """, (oldest, MARKET.token, MARKET.fiat, '1'))
+    db.snapshot_retention = 1
+
+    assert db.gc_snapshots('1', MARKET) == 1
+    assert snapshot_ids(db) == [oldest, newest]
+    assert len(db.get_offers('1', MARKET)) == 10
+
+
+def test_reader_sees_whole_snapshot_during_publish(make_db, monkeypatch):
+    db = make_db(snapshot_retention=1)
+    offers = make_offers(50)
+    db.publish_snapshot(offers, '1', MARKET)
+    monkeypatch.setattr(db, 'READ_ITERSIZE', 7)
+
+    reader = db.iter_offers('1', market=MARKET)
+    first = next(reader)
+
+    # Новый снимок и очистка старого посреди чтения: читатель дочитывает свой снимок
+    db.publish_snapshot(reprice(offers, 10), '1', MARKET)
+    rest = list(reader)
+
+    assert [offer.price for offer in [first] + rest] == sorted(offer.price for offer in offers)
+    assert min(offer.price for offer in db.get_offers('1', MARKET)) >= 100
+
@@ -0,0 +1,114 @@
+"""
+PageFetchEngine: скользящее окно, остановка на пустой странице, дедлайн
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import TimeoutError
+
+import pytest
+
+from fetch_engine import PageFetchEngine
+
+
+def make_fetch(pages: int, delay: float = 0.01, failed=()):
+    """Корутина загрузки: pages непустых страниц, дальше пустые; счётчики запросов"""
+    state = {'active': 0, 'max_active': 0, 'requested': [], 'cancelled': []}
+
+    async def fetch(page: int):
+        state['requested'].append(page)
+        state['active'] += 1
+        state['max_active'] = max(state['max_active'], state['active'])
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            state['cancelled'].append(page)
+            raise
+        finally:
+            state['active'] -= 1
+        if page in failed:
+            return page, [], False
+        return page, ([f'item{page}'] if page <= pages else []), True
+
+    return fetch, state
+
+
+@pytest.fixture
+def engine():
+    return PageFetchEngine(window=3)
+
+
+def test_window_limits_concurrency(engine):
+    fetch, state = make_fetch(pages=10)
+    result = engine.fetch_pages(max_pages=10, timeout_seconds=5, fetch_async=fetch)
+
+    assert [page for page, _ in result] == list(range(1, 11))
+    assert state['max_active'] == 3
+
+
+def test_empty_page_cancels_later_pages(engine):
+    fetch, state = make_fetch(pages=4, delay=0.02)
+    result = engine.fetch_pages(max_pages=50, timeout_seconds=5, fetch_async=fetch)
+
+    assert [page for page, _ in result] == [1, 2, 3, 4]
+    # После пустой 5-й страницы новые не запускаются, кроме уже бывших в окне
+    assert max(state['requested']) <= 5 + engine.window
+
+
+def test_failed_page_is_skipped(engine):
+    fetch, _ = make_fetch(pages=5, failed={2})
+    result = engine.fetch_pages(max_pages=5, timeout_seconds=5, fetch_async=fetch)
+
+    assert [page for page, _ in result] == [1, 3, 4, 5]
+
+
+def test_deadline_cancels_pending_pages(engine):
+    fetch, state = make_fetch(pages=100, delay=0.5)
+    started = time.monotonic()
+    result = engine.fetch_pages(max_pages=100, timeout_seconds=0.2, fetch_async=fetch)
+
+    assert result == []
+    assert time.monotonic() - started < 1.0
+    time.sleep(0.05)
+    assert sorted(state['cancelled']) == [1, 2, 3]
+
+
+def test_sync_fetch_runs_in_window(engine):
+    lock = threading.Lock()
+    active = {'now': 0, 'max': 0}
+
+    def fetch(page: int):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.01)
+        with lock:
+            active['now'] -= 1
+        return page, ([page] if page <= 6 else []), True
+
+    result = engine.fetch_pages(max_pages=20, timeout_seconds=5, fetch_sync=fetch)
+
+    assert [page for page, _ in result] == [1, 2, 3, 4, 5, 6]
+    assert active['max'] <= 3
+
+
+def test_fetch_function_is_required(engine):
+    with pytest.raises(ValueError):
+        engine.fetch_pages(max_pages=1, timeout_seconds=1)
+
+
+def test_run_timeout_cancels_coroutine(engine):
+    state = {'cancelled': False}
+
+    async def hang():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            state['cancelled'] = True
+            raise
+
+    with pytest.raises(TimeoutError):
+        engine.run(hang(), timeout=0.05)
+    time.sleep(0.05)
+    assert state['cancelled']
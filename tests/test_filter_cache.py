@@ -0,0 +1,38 @@
+"""
+FilterCache: ключи по фильтрам Bybit, TTL по виду фильтра, вытеснение старых ключей
+"""
+
+from datetime import datetime, timedelta
+
+from filter_cache import FilterCache
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def test_key_and_ttl():
+    cache = FilterCache({'payment': 60, 'amount': 30})
+
+    assert FilterCache.key('USDT/RUB', 'sell', {'payment': ['14', '378'], 'amount': '5000'}) == 'USDT/RUB|sell|14,378|5000'
+    assert FilterCache.key('USDT/RUB', 'buy', {'amount': '5000'}) == 'USDT/RUB|buy||5000'
+    assert cache.ttl({'payment': ['14']}) == 60
+    assert cache.ttl({'payment': ['14'], 'amount': '5000'}) == 30
+
+
+def test_entry_expires_after_ttl():
+    cache = FilterCache({'amount': 30})
+    cache.put('k', {'offers': []}, 30, NOW)
+
+    assert cache.get('k', NOW + timedelta(seconds=29))['ttl'] == 30
+    assert cache.get('k', NOW + timedelta(seconds=30)) is None
+    assert cache.get('missing', NOW) is None
+
+
+def test_oldest_keys_evicted():
+    cache = FilterCache({'amount': 30}, max_keys=2)
+    cache.put('a', {}, 30, NOW)
+    cache.put('b', {}, 30, NOW)
+    # Перезапись делает ключ самым новым
+    cache.put('a', {}, 30, NOW)
+    cache.put('c', {}, 30, NOW)
+
+    assert list(cache.entries) == ['a', 'c']
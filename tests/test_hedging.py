@@ -0,0 +1,224 @@
+"""
+Хеджирование медленных запросов (_send_hedged и _send_hedged_async) без сети:
+сессии прокси подменены, задержка и код ответа задаются на каждый прокси
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from async_proxy_manager import AsyncProxyManager, AsyncResponse
+from proxy_health import ProxyHealth
+from proxy_manager import ProxyManager
+
+PROXIES = ['10.0.0.1:1000:user:pass', '10.0.0.2:1000:user:pass']
+URL = 'https://api2.bybit.com/fiat/otc/item/online'
+
+HEDGE_CONFIG = {'default_delay': 0.05, 'min_delay': 0.01, 'max_ratio': 0.1}
+RATE_LIMIT_CONFIG = {'proxy_rate': 1000.0, 'proxy_burst': 1000, 'host_rate': 1000.0, 'host_burst': 1000}
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class FakeSession:
+    """Сессия прокси: отвечает через delay секунд кодом status"""
+
+    def __init__(self, key: str, delay: float, status: int, calls: list):
+        self.key = key
+        self.delay = delay
+        self.status = status
+        self.calls = calls
+
+    def request(self, method, url, timeout, **kwargs):
+        self.calls.append(self.key)
+        time.sleep(self.delay)
+        return FakeResponse(self.status)
+
+
+def make_manager(cls, timings: dict, calls: list):
+    """Менеджер с двумя прокси; timings - {ключ прокси: (задержка, код ответа)}"""
+    manager = cls(
+        PROXIES,
+        use_probability=1.0,
+        timeout=5,
+        enable_logging=False,
+        hedge_config=HEDGE_CONFIG,
+        rate_limit_config=RATE_LIMIT_CONFIG
+    )
+    sessions = {key: FakeSession(key, delay, status, calls) for key, (delay, status) in timings.items()}
+    manager._get_session = lambda proxy: sessions[manager._session_key(proxy)]
+    return manager
+
+
+def slow_primary(primary_status=200, secondary_status=200):
+    return {'10.0.0.1:1000': (0.4, primary_status), '10.0.0.2:1000': (0.01, secondary_status)}
+
+
+def send(manager):
+    primary = manager.proxies[0]
+    return manager._send_hedged(primary, {'10.0.0.1:1000'}, 'GET', URL)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_fast_primary_is_not_hedged():
+    calls = []
+    manager = make_manager(ProxyManager, {'10.0.0.1:1000': (0.0, 200), '10.0.0.2:1000': (0.0, 200)}, calls)
+
+    proxy, _, response = send(manager)
+
+    assert proxy is manager.proxies[0]
+    assert response.status_code == 200
+    assert calls == ['10.0.0.1:1000']
+    assert manager.stats['hedged_requests'] == 0
+
+
+def test_hedge_wins_and_loser_recorded_on_completion():
+    calls = []
+    manager = make_manager(ProxyManager, slow_primary(), calls)
+    primary_health = manager.health['10.0.0.1:1000']
+    hedge_health = manager.health['10.0.0.2:1000']
+
+    proxy, _, response = send(manager)
+
+    assert proxy is manager.proxies[1]
+    assert response.status_code == 200
+    assert manager.stats['hedged_requests'] == 1
+    assert manager.stats['hedge_wins'] == 1
+    # Результат победителя учитывает make_request, проигравшего - done-callback
+    assert hedge_health.requests == 0
+    assert primary_health.requests == 0
+    assert wait_for(lambda: primary_health.requests == 1)
+    assert primary_health.latency_percentile(0.5) >= 0.4
+
+
+def test_failed_hedge_recorded_immediately():
+    calls = []
+    manager = make_manager(ProxyManager, slow_primary(secondary_status=500), calls)
+    hedge_health = manager.health['10.0.0.2:1000']
+
+    proxy, _, response = send(manager)
+
+    assert proxy is manager.proxies[0]
+    assert response.status_code == 200
+    assert manager.stats['hedge_wins'] == 0
+    assert hedge_health.consecutive_failures == 1
+
+
+@pytest.mark.parametrize('total, hedged, allowed', [
+    (0, 0, True),      # Бюджет не меньше одного хеджа
+    (5, 1, False),     # 10% от 5 - всё равно один
+    (20, 1, True),
+    (20, 2, False)
+])
+def test_hedge_budget(total, hedged, allowed):
+    manager = make_manager(ProxyManager, slow_primary(), [])
+    manager.stats['total_requests'] = total
+    manager.stats['hedged_requests'] = hedged
+
+    assert manager._hedge_allowed() is allowed
+
+
+def test_exhausted_budget_waits_for_primary():
+    calls = []
+    manager = make_manager(ProxyManager, slow_primary(), calls)
+    manager.stats['total_requests'] = 10
+    manager.stats['hedged_requests'] = 1
+
+    proxy, response_time, _ = send(manager)
+
+    assert proxy is manager.proxies[0]
+    assert response_time >= 0.4
+    assert calls == ['10.0.0.1:1000']
+    assert manager.stats['hedged_requests'] == 1
+
+
+def make_async_manager(timings: dict, calls: list, cancelled: list):
+    manager = AsyncProxyManager(
+        PROXIES,
+        use_probability=1.0,
+        timeout=5,
+        enable_logging=False,
+        hedge_config=HEDGE_CONFIG,
+        rate_limit_config=RATE_LIMIT_CONFIG
+    )
+
+    async def send_async(proxy, method, url, **kwargs):
+        key = manager._session_key(proxy)
+        delay, status = timings[key]
+        calls.append(key)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(key)
+            raise
+        return AsyncResponse(status, {}, b'{}')
+
+    manager._send_async = send_async
+    return manager
+
+
+def send_async(manager):
+    async def run():
+        result = await manager._send_hedged_async(manager.proxies[0], {'10.0.0.1:1000'}, 'GET', URL)
+        # Отменённая задача успевает обработать CancelledError
+        await asyncio.sleep(0.01)
+        return result
+
+    return asyncio.run(run())
+
+
+def test_async_hedge_wins_and_cancels_loser():
+    calls, cancelled = [], []
+    manager = make_async_manager(slow_primary(), calls, cancelled)
+    primary_health = manager.health['10.0.0.1:1000']
+    # Основной прокси - пробный запрос после остывания: отмена освобождает слот
+    primary_health.state = ProxyHealth.HALF_OPEN
+    primary_health.probe_in_flight = True
+
+    proxy, response_time, response = send_async(manager)
+
+    assert proxy is manager.proxies[1]
+    assert response.status_code == 200
+    assert response_time < 0.4
+    assert calls == ['10.0.0.1:1000', '10.0.0.2:1000']
+    assert cancelled == ['10.0.0.1:1000']
+    assert manager.stats['hedge_wins'] == 1
+    assert not primary_health.probe_in_flight
+    assert primary_health.requests == 0
+
+
+def test_async_failed_hedge_recorded():
+    calls, cancelled = [], []
+    manager = make_async_manager(slow_primary(secondary_status=500), calls, cancelled)
+
+    proxy, _, response = send_async(manager)
+
+    assert proxy is manager.proxies[0]
+    assert response.status_code == 200
+    assert cancelled == []
+    assert manager.stats['hedge_wins'] == 0
+    assert manager.health['10.0.0.2:1000'].consecutive_failures == 1
+
+
+def test_async_exhausted_budget_waits_for_primary():
+    calls, cancelled = [], []
+    manager = make_async_manager(slow_primary(), calls, cancelled)
+    manager.stats['total_requests'] = 10
+    manager.stats['hedged_requests'] = 1
+
+    proxy, response_time, _ = send_async(manager)
+
+    assert proxy is manager.proxies[0]
+    assert response_time >= 0.4
+    assert calls == ['10.0.0.1:1000']
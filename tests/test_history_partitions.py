@@ -0,0 +1,155 @@
+"""
+Секции истории на тестовой БД: создаются до транзакции записи стакана,
+одновременное создание не падает на дубле, ошибка DDL не роняет запись стакана
+"""
+
+import threading
+from datetime import date, datetime
+
+import pytest
+
+from conftest import TEST_FIAT, TEST_TOKEN
+from models import Market
+from order_book import OrderBook
+from synthetic import make_offers
+
+MARKET = Market(TEST_TOKEN, TEST_FIAT)
+
+# День без данных других тестов: его секции создаются и удаляются здесь
+FAR_DAY = date(2099, 1, 1)
+FAR_CAPTURED_AT = datetime(2099, 1, 1, 12, 0)
+
+
+def drop_partitions(db, day: date):
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            for table in db.HISTORY_TABLES:
+                cur.execute(f"DROP TABLE IF EXISTS {db.schema}.{db._partition_name(table, day)}")
+        conn.commit()
+    finally:
+        db.put_connection(conn)
+    db._history_days.discard(day)
+
+
+def partition_exists(db, day: date) -> bool:
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL",
+                        (f"{db.schema}.{db._partition_name('book_summary', day)}",))
+            return cur.fetchone()[0]
+    finally:
+        db.put_connection(conn)
+
+
+def history_count(db, table: str) -> int:
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*) FROM {db.schema}.{table} WHERE token = %s AND fiat = %s",
+                        (TEST_TOKEN, TEST_FIAT))
+            return cur.fetchone()[0]
+    finally:
+        db.put_connection(conn)
+
+
+@pytest.fixture
+def far_day(make_db):
+    db = make_db()
+    drop_partitions(db, FAR_DAY)
+    yield db
+    drop_partitions(db, FAR_DAY)
+
+
+def test_concurrent_partition_creation(far_day, make_db):
+    managers = [make_db() for _ in range(4)]
+    barrier = threading.Barrier(len(managers))
+    results = []
+
+    def ensure(db):
+        barrier.wait()
+        results.append(db._ensure_history_partition(FAR_DAY))
+
+    threads = [threading.Thread(target=ensure, args=(db,)) for db in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert results == [True] * len(managers)
+    assert partition_exists(far_day, FAR_DAY)
+
+
+def test_failed_partition_is_not_cached(far_day, monkeypatch):
+    def fail(cur, day):
+        raise RuntimeError('ddl failed')
+
+    monkeypatch.setattr(far_day, '_create_history_partitions', fail)
+    assert not far_day._ensure_history_partition(FAR_DAY)
+    assert FAR_DAY not in far_day._history_days
+
+    monkeypatch.undo()
+    assert far_day._ensure_history_partition(FAR_DAY)
+    assert FAR_DAY in far_day._history_days
+
+
+@pytest.mark.parametrize('storage_mode', ['snapshot', 'incremental', 'replace'])
+def test_partition_ddl_outside_book_transaction(far_day, make_db, monkeypatch, storage_mode):
+    db = make_db(storage_mode=storage_mode)
+    offers = make_offers(50)
+    summary = OrderBook(offers, 'sell').summary()
+    locks = []
+    record_history = db._record_history
+
+    def check_locks(cur, *args, **kwargs):
+        record_history(cur, *args, **kwargs)
+        # История записана, транзакция стакана ещё открыта: родитель секций не заблокирован для get_history
+        cur.execute("""
+            SELECT count(*) FROM pg_locks
+            WHERE mode = 'AccessExclusiveLock' AND relation = %s::regclass
+        """, (f'{db.schema}.book_summary',))
+        locks.append(cur.fetchone()[0])
+
+    monkeypatch.setattr(db, '_record_history', check_locks)
+    monkeypatch.setattr(db, '_captured_at', lambda rows: FAR_CAPTURED_AT)
+    db.store_offers(offers, '1', MARKET, summary=summary)
+
+    assert locks == [0]
+    assert partition_exists(db, FAR_DAY)
+    assert FAR_DAY in db._history_days
+    assert history_count(db, 'book_summary') == 1
+
+
+@pytest.mark.parametrize('storage_mode', ['snapshot', 'incremental', 'replace'])
+def test_book_saved_when_partition_ddl_fails(far_day, make_db, monkeypatch, storage_mode):
+    db = make_db(storage_mode=storage_mode)
+    offers = make_offers(50)
+    summary = OrderBook(offers, 'sell').summary()
+
+    def fail(cur, day):
+        raise RuntimeError('duplicate relation')
+
+    # Секции дня нет (будто первая запись после полуночи), создать её не удаётся
+    monkeypatch.setattr(db, '_create_history_partitions', fail)
+    monkeypatch.setattr(db, '_captured_at', lambda rows: FAR_CAPTURED_AT)
+
+    db.store_offers(offers, '1', MARKET, summary=summary)
+
+    assert len(db.get_offers('1', MARKET)) == len(offers)
+    assert history_count(db, 'book_summary') == 0
+
+
+def test_book_saved_when_history_write_fails(far_day, monkeypatch):
+    db = far_day
+    offers = make_offers(50)
+    summary = OrderBook(offers, 'sell').summary()
+
+    # Секция пропала между проверкой и записью: INSERT в историю падает, стакан сохраняется
+    monkeypatch.setattr(db, '_ensure_history_partition', lambda day: True)
+    monkeypatch.setattr(db, '_captured_at', lambda rows: FAR_CAPTURED_AT)
+
+    db.store_offers(offers, '1', MARKET, summary=summary)
+
+    assert len(db.get_offers('1', MARKET)) == len(offers)
+    assert history_count(db, 'book_summary') == 0
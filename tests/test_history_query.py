@@ -0,0 +1,76 @@
+"""
+HistoryQuery и HistoryCache: разбор window/step, границы ряда, точки, LRU с TTL
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from history_query import HistoryCache, HistoryQuery, parse_duration
+
+NOW = datetime(2026, 1, 1, 12, 7, 30)
+
+
+def parse(**params):
+    return HistoryQuery.from_params(params, max_points=2000, max_window_days=30)
+
+
+def test_parse_duration():
+    assert parse_duration('5m', 'step') == 300
+    assert parse_duration(' 24H ', 'window') == 86400
+    assert parse_duration('7d', 'window') == 7 * 86400
+    for value in ('0m', '5', '5s', 'm5', ''):
+        with pytest.raises(ValueError):
+            parse_duration(value, 'step')
+
+
+def test_defaults():
+    assert parse() is None
+    query = parse(history='Spread')
+    assert (query.series, query.window, query.step) == ('spread', '24h', '5m')
+
+
+@pytest.mark.parametrize('params', [
+    {'history': 'volume'},
+    {'history': 'spread', 'window': '31d'},
+    {'history': 'spread', 'window': '1h', 'step': '2h'},
+    {'history': 'spread', 'window': '30d', 'step': '1m'},
+])
+def test_invalid_params(params):
+    with pytest.raises(ValueError):
+        HistoryQuery.from_params(params, max_points=2000, max_window_days=30)
+
+
+def test_bounds_end_on_next_step():
+    query = parse(history='price', window='1h', step='5m')
+    start, end = query.bounds(NOW)
+
+    assert end == datetime(2026, 1, 1, 12, 10)
+    assert end - start == timedelta(hours=1)
+    # Запросы внутри одного шага получают один ключ кеша
+    assert query.key('USDT/RUB', end) == query.key('USDT/RUB', query.bounds(NOW + timedelta(minutes=2))[1])
+
+
+def test_points_by_series():
+    bucket = datetime(2026, 1, 1, 12, 0)
+    rows = [(bucket, 95.0, 93.0, 2.0, 1000.0, 800.0), (bucket, None, 93.0, None, None, 800.0)]
+
+    spread = parse(history='spread').points(rows)
+    assert spread[0] == {'t': bucket.isoformat(), 'ask': 95.0, 'bid': 93.0, 'spread': 2.0, 'spread_pct': 2.1277}
+    assert spread[1]['spread_pct'] is None
+    assert set(parse(history='price').points(rows)[0]) == {'t', 'ask', 'bid'}
+    assert parse(history='depth').points(rows)[0] == {'t': bucket.isoformat(), 'ask_depth': 1000.0, 'bid_depth': 800.0}
+
+
+def test_cache_ttl_and_lru():
+    cache = HistoryCache(max_size=2, ttl_seconds=30)
+    cache.put('a', 1, NOW)
+    cache.put('b', 2, NOW)
+    # 'a' стал самым недавним - вытесняется 'b'
+    assert cache.get('a', NOW) == 1
+    cache.put('c', 3, NOW)
+
+    assert cache.get('b', NOW) is None
+    assert cache.get('c', NOW + timedelta(seconds=29)) == 3
+    assert cache.get('c', NOW + timedelta(seconds=30)) is None
+    assert list(cache.entries) == ['a']
@@ -0,0 +1,66 @@
+"""
+JSON-бэкенды (orjson, msgspec, json): одинаковый JSON офферов и одинаковый разбор страниц Bybit
+"""
+
+import json
+
+import pytest
+
+import json_backend
+from models import decode_page, item_from_dict
+from synthetic import make_bybit_page, make_offers
+
+
+@pytest.fixture(params=json_backend.available_backends())
+def backend(request, monkeypatch):
+    monkeypatch.setattr(json_backend, 'BACKEND', request.param)
+    return request.param
+
+
+def item_fields(item):
+    return {name: getattr(item, name) for name in (
+        'id', 'price', 'nick_name', 'user_id', 'last_quantity', 'min_amount', 'max_amount',
+        'payments', 'is_online', 'last_logout_time', 'auth_tag', 'recent_order_num', 'recent_execute_rate'
+    )}
+
+
+def test_dumps_offers(backend):
+    offers = make_offers(20)
+    text = json_backend.dumps({'offers': offers, 'total': 20})
+
+    assert json.loads(text) == {'offers': [offer.to_dict() for offer in offers], 'total': 20}
+    assert json_backend.loads(text.encode('utf-8')) == json.loads(text)
+
+
+def test_decode_page_matches_dicts(backend):
+    page = make_bybit_page(1, size=30)
+    items = decode_page(json.dumps(page).encode('utf-8'))
+
+    expected = [item_from_dict(item) for item in page['result']['items']]
+    assert [item_fields(item) for item in items] == [item_fields(item) for item in expected]
+    assert isinstance(items[0].price, float)
+
+
+def test_decode_page_unexpected_types(backend):
+    page = make_bybit_page(1, size=3)
+    page['result']['items'][0]['payments'] = 'not-a-list'
+    page['result']['items'][1]['recentOrderNum'] = '17'
+    items = decode_page(json.dumps(page))
+
+    assert len(items) == 3
+    assert items[0].payments == []
+    assert items[1].recent_order_num == 17
+
+
+@pytest.mark.parametrize('page', [
+    {'ret_code': 10001, 'ret_msg': 'error', 'result': None},
+    {'ret_code': 0, 'result': None},
+])
+def test_decode_page_failed_response(backend, page):
+    assert decode_page(json.dumps(page)) is None
+
+
+def test_use_backend_falls_back(monkeypatch):
+    monkeypatch.setattr(json_backend, 'BACKEND', json_backend.BACKEND)
+    assert json_backend.use_backend('json') == 'json'
+    assert json_backend.use_backend('ujson') == json_backend.available_backends()[0]
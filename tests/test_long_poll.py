@@ -0,0 +1,118 @@
+"""
+Long-poll (?wait=): BookFeed.wait, очередь проверки источника и index.wait_response
+без БД - новую версию публикует другой поток, poll_book подменён
+"""
+
+import dataclasses
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from book_feed import BookFeed
+from book_query import BookQuery
+from models import Market
+from synthetic import make_offers
+
+index = pytest.importorskip('index')
+
+MARKET = Market('USDT', 'TEST')
+
+
+def test_wait_wakes_on_publish():
+    feed = BookFeed()
+    seq = feed.publish(make_offers(5))
+    woke = []
+
+    waiter = threading.Thread(target=lambda: woke.append(feed.wait(seq, 5)))
+    waiter.start()
+    time.sleep(0.05)
+    feed.publish(make_offers(6))
+    waiter.join(1)
+
+    assert woke == [True]
+
+
+def test_wait_timeout_and_stale_seq():
+    feed = BookFeed()
+    seq = feed.publish(make_offers(5))
+
+    assert not feed.wait(seq, 0.05)
+    assert feed.wait(seq - 1, 0)
+
+
+def test_claim_check_once_per_interval():
+    feed = BookFeed()
+    assert feed.claim_check(60)
+    assert not feed.claim_check(60)
+    assert feed.claim_check(0)
+
+
+@pytest.fixture
+def book(monkeypatch):
+    """Стакан тестового рынка в памяти; poll_book только считает вызовы"""
+    polls = []
+    monkeypatch.setattr(index, 'poll_book', lambda *args: polls.append(args))
+    monkeypatch.setitem(index.PUSH_CONFIG, 'poll_seconds', 0.05)
+    offers = make_offers(30)
+    index.publish_book(MARKET, 'sell', index.cache_entry(offers, 'sell', MARKET), datetime.now())
+    yield offers, polls
+    index.db_cache.pop(f'{MARKET.key}:sell', None)
+    index.book_feeds.pop(f'{MARKET.key}:sell', None)
+
+
+def publish_later(offers, delay=0.1):
+    def publish():
+        time.sleep(delay)
+        index.publish_book(MARKET, 'sell', index.cache_entry(offers, 'sell', MARKET), datetime.now())
+    thread = threading.Thread(target=publish)
+    thread.start()
+    return thread
+
+
+def test_wait_response_push_with_delta(book):
+    offers, _ = book
+    seq = index.book_cache(MARKET, 'sell')['data']['seq']
+    changed = dataclasses.replace(offers[0], price=offers[0].price + 1)
+    publisher = publish_later([changed] + offers[1:])
+
+    query = BookQuery.from_params({'since': str(seq)}, 100)
+    response = index.wait_response(MARKET, '1', query, 5, False, False)
+    publisher.join()
+    body = json.loads(response['body'])
+
+    assert response['headers']['X-Cache'] == 'PUSH'
+    assert body['seq'] == seq + 1
+    assert [delta['seq'] for delta in body['deltas']] == [seq + 1]
+    assert [offer['id'] for offer in body['deltas'][0]['changed']] == [changed.id]
+
+
+def test_unchanged_book_does_not_wake(book):
+    offers, polls = book
+    publisher = publish_later(list(offers), delay=0.05)
+
+    started = time.time()
+    response = index.wait_response(MARKET, '1', None, 0.3, False, False)
+    publisher.join()
+
+    assert response['headers']['X-Cache'] == 'PUSH-TIMEOUT'
+    assert time.time() - started >= 0.3
+    # Один ожидающий проверяет источник раз в poll_seconds
+    assert 1 <= len(polls) <= 7
+
+
+def test_lagging_client_answered_by_normal_path(book):
+    seq = index.book_cache(MARKET, 'sell')['data']['seq']
+    query = BookQuery.from_params({'since': str(seq - 1)}, 100)
+
+    assert index.wait_response(MARKET, '1', query, 5, False, False) is None
+
+
+def test_parse_wait():
+    assert index.parse_wait({}) == 0.0
+    assert index.parse_wait({'wait': '10'}) == 10.0
+    for value in ('soon', '-1', str(index.PUSH_CONFIG['max_wait_seconds'] + 1)):
+        with pytest.raises(ValueError):
+            index.parse_wait({'wait': value})
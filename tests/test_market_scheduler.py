@@ -0,0 +1,74 @@
+"""
+MarketScheduler: доля бюджета по weight, минимальный интервал, бюджет вызова;
+хеш оффера на точности колонок для дробных количеств (BTC/ETH)
+"""
+
+import dataclasses
+from collections import Counter
+from datetime import datetime, timedelta
+
+from db_manager import DatabaseManager
+from market_scheduler import MarketScheduler
+from models import Market
+from synthetic import make_offers
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+MARKETS = [
+    {'token': 'USDT', 'fiat': 'RUB', 'weight': 3, 'max_pages': 1},
+    {'token': 'BTC', 'fiat': 'RUB', 'weight': 1, 'max_pages': 1}
+]
+
+
+def run(scheduler: MarketScheduler, calls: int, step_seconds: float = 60):
+    refreshed = Counter()
+    now = NOW
+    for _ in range(calls):
+        for market, side, pages in scheduler.plan(now):
+            scheduler.charge(market, side, pages, now)
+            refreshed[market.token] += 1
+        now += timedelta(seconds=step_seconds)
+    return refreshed
+
+
+def test_share_follows_weight():
+    scheduler = MarketScheduler(MARKETS, page_budget=2, min_interval_seconds=0)
+    refreshed = run(scheduler, 400)
+
+    assert refreshed['USDT'] / refreshed['BTC'] == 3
+
+
+def test_plan_respects_budget_and_max_pages():
+    markets = [{'token': 'USDT', 'fiat': 'RUB', 'weight': 1, 'max_pages': 5}]
+    scheduler = MarketScheduler(markets + MARKETS[1:], page_budget=7, min_interval_seconds=0)
+    plan = scheduler.plan(NOW)
+
+    assert sum(pages for _, _, pages in plan) == 7
+    assert all(pages <= 5 for _, _, pages in plan)
+
+
+def test_min_interval_skips_fresh_sides():
+    scheduler = MarketScheduler(MARKETS, page_budget=10, min_interval_seconds=120)
+    for market, side, pages in scheduler.plan(NOW):
+        scheduler.charge(market, side, pages, NOW)
+
+    assert scheduler.plan(NOW + timedelta(seconds=60)) == []
+    assert len(scheduler.plan(NOW + timedelta(seconds=120))) == 4
+
+
+def test_pass_values_rebased():
+    scheduler = MarketScheduler(MARKETS[:1], page_budget=2, min_interval_seconds=0)
+    for slot in scheduler.slots.values():
+        slot.pass_value = 2e6
+    scheduler.charge(Market('USDT', 'RUB'), '1', 3, NOW)
+
+    assert sorted(slot.pass_value for slot in scheduler.slots.values()) == [0.0, 1.0]
+
+
+def test_offer_hash_keeps_fractional_quantity():
+    offer = dataclasses.replace(make_offers(1)[0], quantity=0.0549)
+    changed = dataclasses.replace(offer, quantity=0.05491)
+    noise = dataclasses.replace(offer, quantity=0.0549 + 1e-12)
+
+    assert DatabaseManager._offer_hash(offer) != DatabaseManager._offer_hash(changed)
+    assert DatabaseManager._offer_hash(offer) == DatabaseManager._offer_hash(noise)
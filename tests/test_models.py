@@ -0,0 +1,46 @@
+"""
+Offer: компактная модель оффера (слоты, порядок ключей API) и построение из объявления Bybit
+"""
+
+import dataclasses
+
+import pytest
+
+from models import OFFER_FIELDS, PAYMENT_METHOD_MAP, Offer, item_from_dict
+from synthetic import make_bybit_page, make_offers
+
+
+def test_offer_is_slotted():
+    offer = make_offers(1)[0]
+    assert not hasattr(offer, '__dict__')
+    with pytest.raises(AttributeError):
+        offer.unknown = 1
+
+
+def test_to_dict_keeps_api_key_order():
+    offer = make_offers(1)[0]
+    assert tuple(offer.to_dict()) == OFFER_FIELDS
+    assert OFFER_FIELDS[:3] == ('id', 'price', 'maker')
+    assert offer.to_dict() == dataclasses.asdict(offer)
+
+
+@pytest.mark.parametrize('auth_tag, merchant_type, badge, block_trade', [
+    ([], None, None, False),
+    (['VA1'], 'bronze', 'vaBronzeIcon', False),
+    (['VA2'], 'silver', 'vaSilverIcon', False),
+    (['VA3', 'BA'], 'gold', 'vaGoldIcon', True),
+])
+def test_offer_from_item(auth_tag, merchant_type, badge, block_trade):
+    index = pytest.importorskip('index')
+    raw = make_bybit_page(1, size=1)['result']['items'][0]
+    raw.update(authTag=auth_tag, payments=['378', '99999'], minAmount='1000', maxAmount='1000.5')
+    offer = index.offer_from_item(item_from_dict(raw), 'buy')
+
+    assert isinstance(offer, Offer)
+    assert (offer.id, offer.maker, offer.maker_id, offer.side) == (raw['id'], raw['nickName'], raw['userId'], 'buy')
+    assert offer.price == float(raw['price'])
+    assert offer.quantity == float(raw['lastQuantity'])
+    assert offer.payment_methods == [PAYMENT_METHOD_MAP['378'], 'Payment #99999']
+    assert offer.is_triangle
+    assert (offer.merchant_type, offer.merchant_badge, offer.is_block_trade) == (merchant_type, badge, block_trade)
+    assert offer.is_merchant == (merchant_type is not None)
@@ -0,0 +1,122 @@
+"""
+OrderBook: порядок от лучшей цены, векторные фильтры и агрегаты против перебора офферов
+"""
+
+import pytest
+
+from order_book import OrderBook, payment_mask, PAYMENT_BITS, OTHER_PAYMENT_BIT
+from synthetic import make_offers
+
+
+@pytest.fixture(params=['1', '0'], ids=['sell', 'buy'])
+def book(request):
+    offers = make_offers(500, side=request.param)
+    side = 'sell' if request.param == '1' else 'buy'
+    return OrderBook(offers, side)
+
+
+def best_first(book: OrderBook, offers):
+    return sorted(offers, key=lambda offer: offer.price, reverse=book.side == 'buy')
+
+
+def test_order_best_price_first(book):
+    prices = [offer.price for offer in book.select()]
+    assert prices == [offer.price for offer in best_first(book, book.offers)]
+    assert book.best_price() == prices[0]
+
+
+def test_mask_matches_python_filter(book):
+    mask = book.mask(payment=['Sberbank', 'Tinkoff'], online=True, amount=50000, min_completion=90)
+    expected = [
+        offer for offer in book.offers
+        if {'Sberbank', 'Tinkoff'} & set(offer.payment_methods)
+        and offer.is_online
+        and offer.min_amount <= 50000 <= offer.max_amount
+        and offer.total_orders >= 90
+    ]
+    assert {offer.id for offer in book.select(mask)} == {offer.id for offer in expected}
+
+
+def test_merchant_type_filter(book):
+    gold = book.select(book.mask(merchant_type='gold'))
+    merchants = book.select(book.mask(merchant_type='merchant'))
+    none = book.select(book.mask(merchant_type='none'))
+
+    assert gold and all(offer.merchant_type == 'gold' for offer in gold)
+    assert all(offer.is_merchant for offer in merchants)
+    assert len(merchants) + len(none) == len(book)
+    assert book.select(book.mask(merchant_type='platinum')) == []
+
+
+def test_payment_mask_other_bit():
+    assert payment_mask(['Payment #999']) == OTHER_PAYMENT_BIT
+    assert payment_mask(['Sberbank', 'Payment #1']) == PAYMENT_BITS['Sberbank'] | OTHER_PAYMENT_BIT
+
+
+def test_depth_matches_python(book):
+    ordered = book.select()
+    best = ordered[0].price
+    if book.side == 'sell':
+        within = [offer for offer in ordered if offer.price <= best * 1.01]
+    else:
+        within = [offer for offer in ordered if offer.price >= best * 0.99]
+
+    depth = book.depth(1.0)
+    assert depth['offers'] == len(within)
+    assert depth['quantity'] == pytest.approx(sum(offer.quantity for offer in within))
+    assert depth['amount'] == pytest.approx(
+        sum(min(offer.quantity * offer.price, offer.max_amount) for offer in within)
+    )
+
+
+def reference_vwap(offers, amount):
+    """VWAP перебором офферов от лучшей цены"""
+    left = amount
+    bought = 0.0
+    for offer in offers:
+        take = min(left, min(offer.quantity * offer.price, offer.max_amount))
+        bought += take / offer.price
+        left -= take
+        if left <= 1e-9:
+            return amount / bought
+    return None
+
+
+@pytest.mark.parametrize('amount', [100, 10000, 250000, 1000000])
+def test_vwap_matches_python(book, amount):
+    assert book.vwap(amount) == pytest.approx(reference_vwap(book.select(), amount))
+
+
+def test_vwap_without_liquidity(book):
+    total = sum(min(offer.quantity * offer.price, offer.max_amount) for offer in book.offers)
+    assert book.vwap(total * 2) is None
+    assert book.vwap(0) is None
+
+
+def test_empty_book():
+    book = OrderBook([], 'sell')
+    assert len(book) == 0
+    assert book.best_price() is None
+    assert book.vwap(1000) is None
+    assert book.depth(1.0) == {'offers': 0, 'quantity': 0.0, 'amount': 0.0}
+
+
+def test_summary_for_history(book):
+    summary = book.summary()
+
+    assert summary['best_price'] == book.best_price()
+    assert summary['offers_count'] == len(book.offers)
+    assert summary['total_quantity'] == pytest.approx(sum(offer.quantity for offer in book.offers))
+    assert summary['depth_1_quantity'] == book.depth(1.0)['quantity']
+    assert summary['depth_05_amount'] <= summary['depth_1_amount']
+    assert summary['merchant_share'] == pytest.approx(
+        sum(offer.is_merchant for offer in book.offers) / len(book.offers)
+    )
+    assert summary['online_count'] == sum(offer.is_online for offer in book.offers)
+
+
+def test_empty_summary():
+    summary = OrderBook([], 'buy').summary()
+    assert summary['best_price'] is None
+    assert summary['offers_count'] == 0
+    assert summary['merchant_share'] == 0.0
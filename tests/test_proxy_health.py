@@ -0,0 +1,131 @@
+"""
+ProxyHealth: EWMA, circuit breaker (closed -> open -> half-open), 429 вне breaker
+"""
+
+import pytest
+
+from proxy_health import ProxyHealth
+from proxy_manager import ProxyManager
+
+
+@pytest.fixture
+def health():
+    return ProxyHealth(failure_threshold=3, cooldown=30.0, max_cooldown=100.0)
+
+
+def open_breaker(health: ProxyHealth, now: float):
+    for _ in range(health.failure_threshold):
+        health.record_failure(now=now)
+
+
+def test_breaker_opens_after_threshold(health):
+    health.record_failure(now=100.0)
+    health.record_failure(now=100.0)
+    assert health.state == ProxyHealth.CLOSED
+    assert health.try_acquire(100.0)
+
+    health.record_failure(now=100.0)
+    assert health.state == ProxyHealth.OPEN
+    assert not health.is_available(110.0)
+    assert not health.try_acquire(110.0)
+
+
+def test_half_open_admits_single_probe(health):
+    open_breaker(health, 100.0)
+
+    assert health.is_available(130.0)
+    assert health.try_acquire(130.0)
+    assert health.state == ProxyHealth.HALF_OPEN
+    # Пробный слот занят - конкурентный запрос не проходит
+    assert not health.try_acquire(130.0)
+    assert not health.is_available(130.0)
+
+
+def test_probe_success_closes_breaker(health):
+    open_breaker(health, 100.0)
+    assert health.try_acquire(130.0)
+
+    health.record_success(0.2)
+    assert health.state == ProxyHealth.CLOSED
+    assert health.cooldown == 30.0
+    assert health.try_acquire(131.0)
+
+
+def test_probe_failure_reopens_with_longer_cooldown(health):
+    open_breaker(health, 100.0)
+    assert health.try_acquire(130.0)
+
+    health.record_failure(now=130.0)
+    assert health.state == ProxyHealth.OPEN
+    assert health.cooldown == 60.0
+    assert not health.try_acquire(170.0)
+    assert health.try_acquire(190.0)
+
+    health.record_failure(now=190.0)
+    assert health.cooldown == 100.0
+
+
+def test_released_probe_can_be_claimed_again(health):
+    open_breaker(health, 100.0)
+    assert health.try_acquire(130.0)
+
+    health.release_probe()
+    assert health.try_acquire(130.0)
+
+
+def test_rate_limited_does_not_trip_breaker(health):
+    for _ in range(10):
+        health.record_failure(rate_limited=True, now=100.0)
+
+    assert health.state == ProxyHealth.CLOSED
+    assert health.consecutive_failures == 0
+    assert health.score(100.0) > ProxyHealth().score(100.0)
+
+
+def test_rate_limited_probe_releases_slot(health):
+    open_breaker(health, 100.0)
+    assert health.try_acquire(130.0)
+
+    health.record_failure(rate_limited=True, now=130.0)
+    assert health.state == ProxyHealth.HALF_OPEN
+    assert health.try_acquire(130.0)
+
+
+def test_ewma_and_percentile():
+    health = ProxyHealth(ewma_alpha=0.5, initial_latency=1.0)
+    health.record_success(0.2)
+    assert health.latency_ewma == pytest.approx(0.6)
+
+    for latency in (0.1, 0.3, 0.5, 0.7):
+        health.record_success(latency)
+    assert health.latency_percentile(0.5) == 0.3
+    assert health.latency_percentile(0.9, min_samples=10) is None
+
+
+def test_score_penalizes_failures():
+    good = ProxyHealth()
+    bad = ProxyHealth()
+    good.record_success(0.5)
+    bad.record_success(0.5)
+    bad.record_failure(timeout=True, latency=0.5, now=1000.0)
+
+    penalized = bad.score(1000.0)
+    assert penalized > good.score(1000.0)
+    # Таймаут за окном больше не штрафует
+    assert bad.score(1000.0 + bad.window + 1) < penalized
+
+
+def test_select_proxy_skips_open_breaker():
+    manager = ProxyManager(
+        ['10.0.0.1:8000:user:pass', '10.0.0.2:8000:user:pass'],
+        use_probability=1.0,
+        enable_logging=False
+    )
+    broken, healthy = manager.proxies
+    open_breaker(manager.health[broken['_meta']['display']], now=1e12)
+
+    for _ in range(20):
+        assert manager._select_proxy() is healthy
+
+    open_breaker(manager.health[healthy['_meta']['display']], now=1e12)
+    assert manager._select_proxy() is None
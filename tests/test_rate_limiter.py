@@ -0,0 +1,103 @@
+"""
+TokenBucket и RateLimiter: очередь при пустом ведре, AIMD, Retry-After
+"""
+
+import time
+from email.utils import formatdate
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket, parse_retry_after
+
+
+class Clock:
+    """Управляемое time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock)
+    return clock
+
+
+def test_burst_then_queue(clock):
+    bucket = TokenBucket(rate=2.0, capacity=2, min_rate=0.2)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # Ведро пусто: вызывающие выстраиваются с шагом 1/rate
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    # За секунду очередь из двух токенов рассосалась
+    clock.now += 1.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_throttle_decreases_and_success_recovers(clock):
+    bucket = TokenBucket(rate=4.0, capacity=4, min_rate=1.0, decrease_factor=0.5, recovery_step=0.25)
+
+    bucket.on_throttle()
+    assert bucket.rate == 2.0
+    bucket.on_throttle()
+    bucket.on_throttle()
+    assert bucket.rate == 1.0  # не ниже min_rate
+    # Накопленный всплеск сброшен
+    assert bucket.reserve() > 0
+
+    for _ in range(2):
+        bucket.on_success()
+    assert bucket.rate == 3.0
+    for _ in range(5):
+        bucket.on_success()
+    assert bucket.rate == 4.0
+
+
+def test_retry_after_blocks_bucket(clock):
+    bucket = TokenBucket(rate=10.0, capacity=10, min_rate=1.0)
+
+    bucket.on_throttle(retry_after=5.0)
+    clock.now += 1.0
+    assert bucket.reserve() == pytest.approx(4.0)
+
+    clock.now += 5.0
+    assert bucket.reserve() == 0.0
+
+
+def test_limiter_waits_for_both_buckets(clock):
+    limiter = RateLimiter(proxy_rate=1.0, proxy_burst=1, host_rate=10.0, host_burst=10)
+
+    assert limiter.reserve('p1', 'api') == 0.0
+    # Ведро прокси p1 пусто, ведро хоста - нет
+    assert limiter.reserve('p1', 'api') == pytest.approx(1.0)
+    assert limiter.reserve('p2', 'api') == 0.0
+
+
+def test_retry_after_blocks_host_for_all_proxies(clock):
+    limiter = RateLimiter(proxy_rate=5.0, proxy_burst=5, host_rate=10.0, host_burst=10)
+
+    limiter.on_throttle('p1', 'api', retry_after=3.0)
+    assert limiter.reserve('p2', 'api') == pytest.approx(3.0)
+    assert limiter.reserve('p2', 'other') == 0.0
+
+    snapshot = limiter.snapshot()
+    assert snapshot['hosts']['api']['throttles'] == 1
+    assert snapshot['hosts']['api']['rate'] == pytest.approx(8.0)
+    assert snapshot['proxies']['p1']['rate'] == pytest.approx(2.5)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('2.5') == 2.5
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
@@ -0,0 +1,81 @@
+"""
+PreparedBody и accepts_gzip: тело из заранее сериализованной части и полей запроса
+"""
+
+import base64
+import gzip
+import json
+
+import pytest
+
+from response_body import PreparedBody, accepts_gzip
+from synthetic import make_offers
+
+
+@pytest.mark.parametrize('headers, expected', [
+    (None, False),
+    ({}, False),
+    ({'Accept-Encoding': 'gzip, deflate, br'}, True),
+    ({'accept-encoding': 'GZIP'}, True),
+    ({'Accept-Encoding': 'br;q=1.0, gzip;q=0.5'}, True),
+    ({'Accept-Encoding': 'gzip;q=0'}, False),
+    ({'Accept-Encoding': 'gzip; q=bad'}, False),
+    ({'Accept-Encoding': '*'}, True),
+    ({'Accept-Encoding': 'deflate, br'}, False),
+])
+def test_accepts_gzip(headers, expected):
+    assert accepts_gzip(headers) is expected
+
+
+@pytest.fixture
+def payload():
+    offers = make_offers(50)
+    return {'offers': offers, 'total': len(offers), 'side': 'sell'}
+
+
+def expected_body(payload, extra):
+    body = {**payload, 'offers': [offer.to_dict() for offer in payload['offers']]}
+    body.update(extra or {})
+    return body
+
+
+@pytest.mark.parametrize('extra', [None, {}, {'cache_age': 12, 'auto_update_enabled': True}])
+def test_render(payload, extra):
+    body = PreparedBody(payload)
+    assert json.loads(body.render(extra)) == expected_body(payload, extra)
+
+
+@pytest.mark.parametrize('extra', [None, {'cache_age': 3}, {'cache_age': 40, 'proxy_stats': {'requests': 7}}])
+def test_render_gzip_is_single_gzip_member(payload, extra):
+    body = PreparedBody(payload, compress_level=1)
+    compressed = base64.b64decode(body.render_gzip_base64(extra))
+
+    assert compressed[:2] == b'\x1f\x8b'
+    assert json.loads(gzip.decompress(compressed)) == expected_body(payload, extra)
+
+
+def test_render_gzip_reuses_prefix(payload):
+    body = PreparedBody(payload)
+    first = gzip.decompress(base64.b64decode(body.render_gzip_base64({'cache_age': 1})))
+    second = gzip.decompress(base64.b64decode(body.render_gzip_base64({'cache_age': 2})))
+
+    assert json.loads(first)['cache_age'] == 1
+    assert json.loads(second)['cache_age'] == 2
+    assert body.size == len(body.prefix) + 1
+
+
+def test_gzip_prefix_built_lazily(payload):
+    body = PreparedBody(payload)
+    body.render({'cache_age': 1})
+    assert body._gzip_head is None
+
+    first = body.render_gzip_base64({'cache_age': 1})
+    head = body._gzip_head
+    assert head is not None
+    body.render_gzip_base64({'cache_age': 2})
+    assert body._gzip_head is head
+    assert json.loads(gzip.decompress(base64.b64decode(first)))['cache_age'] == 1
+
+
+def test_precompress_builds_prefix_upfront(payload):
+    assert PreparedBody(payload, precompress=True)._gzip_head is not None
@@ -0,0 +1,127 @@
+"""
+Фоновое обновление (revalidate / revalidate_book) и размер загрузки стороны рынка:
+страниц - max_pages рынка из MARKETS, таймаут - BOOK_FETCH_CONFIG. refresh_book подменён
+"""
+
+import threading
+
+import pytest
+
+from config import BOOK_FETCH_CONFIG, MARKETS
+from models import Market
+
+index = pytest.importorskip('index')
+
+MARKET_PAGES = [(Market(config['token'], config['fiat']), config['max_pages']) for config in MARKETS]
+
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    """refresh_book записывает аргументы и возвращает пустую загрузку без записи в БД"""
+    calls = []
+
+    def refresh_book(market, side, max_pages, timeout_seconds, now, hedge=False, store=True):
+        calls.append({'market': market, 'side': side, 'max_pages': max_pages,
+                      'timeout_seconds': timeout_seconds, 'hedge': hedge, 'store': store,
+                      'thread': threading.current_thread().name})
+        return {'offers': [], 'pages': max_pages, 'stored': None}, False
+
+    monkeypatch.setattr(index, 'refresh_book', refresh_book)
+    return calls
+
+
+@pytest.mark.parametrize('market, max_pages', MARKET_PAGES, ids=lambda value: str(value))
+def test_revalidate_book_uses_market_pages(refreshes, market, max_pages):
+    index.revalidate_book(market, '1')
+
+    assert refreshes == [{
+        'market': market, 'side': '1', 'max_pages': max_pages,
+        'timeout_seconds': BOOK_FETCH_CONFIG['timeout_seconds'],
+        'hedge': index.HEDGE_ENABLED, 'store': True, 'thread': threading.current_thread().name
+    }]
+
+
+def test_revalidate_book_charges_scheduler_once(monkeypatch):
+    market = MARKET_PAGES[1][0]
+    charged = []
+    monkeypatch.setattr(index.market_scheduler, 'charge', lambda *args: charged.append(args[:3]))
+
+    for stored, shared in ((5, False), (5, True), (None, False)):
+        monkeypatch.setattr(index, 'refresh_book',
+                            lambda *args, **kwargs: ({'offers': [], 'pages': 3, 'stored': stored}, shared))
+        index.revalidate_book(market, '0')
+
+    assert charged == [(market, '0', 3)]
+
+
+def test_revalidate_book_swallows_errors(monkeypatch):
+    def refresh_book(*args, **kwargs):
+        raise RuntimeError('bybit down')
+
+    monkeypatch.setattr(index, 'refresh_book', refresh_book)
+    index.revalidate_book(MARKET_PAGES[0][0], '1')
+
+
+def test_revalidate_runs_in_background_thread(refreshes, monkeypatch):
+    monkeypatch.setitem(index.STALE_WHILE_REVALIDATE_CONFIG, 'mode', 'thread')
+    market, max_pages = MARKET_PAGES[2]
+
+    assert index.revalidate(market, '0')
+    for thread in threading.enumerate():
+        if thread.name == f'revalidate-{market.key}-0':
+            thread.join(5)
+
+    assert len(refreshes) == 1
+    assert refreshes[0]['thread'] == f'revalidate-{market.key}-0'
+    assert refreshes[0]['max_pages'] == max_pages
+
+
+def test_revalidate_skips_in_flight_refresh(refreshes, monkeypatch):
+    monkeypatch.setitem(index.STALE_WHILE_REVALIDATE_CONFIG, 'mode', 'thread')
+    market = MARKET_PAGES[0][0]
+    started = threading.Event()
+    release = threading.Event()
+
+    def load():
+        started.set()
+        release.wait(5)
+
+    leader = threading.Thread(target=index.refresh_flight.do, args=(index.refresh_key(market, '1'), load))
+    leader.start()
+    try:
+        assert started.wait(5)
+        assert not index.revalidate(market, '1')
+    finally:
+        release.set()
+        leader.join(5)
+
+    assert refreshes == []
+
+
+def test_revalidate_scheduled_mode_leaves_refresh_to_cron(refreshes, monkeypatch):
+    monkeypatch.setitem(index.STALE_WHILE_REVALIDATE_CONFIG, 'mode', 'scheduled')
+
+    assert not index.revalidate(MARKET_PAGES[0][0], '1')
+    assert refreshes == []
+
+
+@pytest.mark.parametrize('limit', ['quick', 'full'])
+@pytest.mark.parametrize('market, max_pages', MARKET_PAGES[:3], ids=lambda value: str(value))
+def test_request_fetch_uses_market_pages(refreshes, monkeypatch, market, max_pages, limit):
+    monkeypatch.setattr(index, 'publish_book', lambda *args, **kwargs: True)
+    event = {'httpMethod': 'GET', 'queryStringParameters': {
+        'side': '1', 'token': market.token, 'fiat': market.fiat, 'force': 'true', 'limit': limit
+    }}
+
+    response = index.handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert len(refreshes) == 1
+    if limit == 'quick':
+        assert refreshes[0]['max_pages'] == min(BOOK_FETCH_CONFIG['quick_max_pages'], max_pages)
+        assert refreshes[0]['timeout_seconds'] == BOOK_FETCH_CONFIG['quick_timeout_seconds']
+        assert not refreshes[0]['store']
+    else:
+        assert refreshes[0]['max_pages'] == max_pages
+        assert refreshes[0]['timeout_seconds'] == BOOK_FETCH_CONFIG['timeout_seconds']
+        assert refreshes[0]['store']
@@ -0,0 +1,95 @@
+"""
+SingleFlight: одна загрузка на ключ, общий результат и исключение, таймаут ведомого
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_load():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'book'
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        leader = pool.submit(flight.do, 'USDT/RUB:1', load)
+        started.wait(5)
+        assert flight.in_flight('USDT/RUB:1')
+        followers = [pool.submit(flight.do, 'USDT/RUB:1', load) for _ in range(7)]
+        # Ведомые успевают встать в ожидание до конца загрузки
+        time.sleep(0.1)
+        release.set()
+
+        assert leader.result() == ('book', False)
+        assert [future.result() for future in followers] == [('book', True)] * 7
+
+    assert len(calls) == 1
+    assert not flight.in_flight('USDT/RUB:1')
+
+
+def test_other_keys_do_not_wait():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        blocked = pool.submit(flight.do, 'a', lambda: release.wait(5))
+        assert flight.do('b', lambda: 'b') == ('b', False)
+        release.set()
+        blocked.result()
+
+
+def test_exception_reaches_followers():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def load():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('bybit down')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'k', load)
+        started.wait(5)
+        follower = pool.submit(flight.do, 'k', load)
+        time.sleep(0.1)
+        release.set()
+
+        with pytest.raises(RuntimeError):
+            leader.result()
+        with pytest.raises(RuntimeError):
+            follower.result()
+
+    # После ошибки следующий вызов снова ведущий
+    assert flight.do('k', lambda: 'ok') == ('ok', False)
+
+
+def test_follower_timeout():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def load():
+        started.set()
+        release.wait(5)
+        return 'late'
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(flight.do, 'k', load)
+        started.wait(5)
+        with pytest.raises(TimeoutError):
+            flight.do('k', load, timeout=0.05)
+        release.set()
+        assert leader.result() == ('late', False)
@@ -0,0 +1,75 @@
+"""
+TraderIndex: поиск по префиксу (короткий запрос) и по подстроке (триграммы)
+"""
+
+import dataclasses
+
+import pytest
+
+from synthetic import make_offers
+from trader_search import TraderIndex, trigrams
+
+
+@pytest.fixture(scope='module')
+def offers():
+    offers = make_offers(300)
+    offers[0] = dataclasses.replace(offers[0], maker='  CryptoKing  ', maker_id='77001')
+    offers[1] = dataclasses.replace(offers[1], maker='', maker_id='')
+    return offers
+
+
+@pytest.fixture(scope='module')
+def index(offers):
+    return TraderIndex(offers)
+
+
+def found(index, query):
+    return set(index.search(query).nonzero()[0].tolist())
+
+
+def expected(offers, match):
+    return {
+        position for position, offer in enumerate(offers)
+        if any(match(key.strip().casefold()) for key in (offer.maker, offer.maker_id) if key)
+    }
+
+
+@pytest.mark.parametrize('query', ['trader_12', 'ader_4', '100001', 'der_99'])
+def test_substring_matches_scan(offers, index, query):
+    assert found(index, query) == expected(offers, lambda key: query in key)
+
+
+@pytest.mark.parametrize('query', ['tr', '1', '77'])
+def test_short_query_is_prefix(offers, index, query):
+    assert found(index, query) == expected(offers, lambda key: key.startswith(query))
+
+
+def test_case_and_spaces_ignored(index):
+    assert found(index, ' cryptoKING ') == {0}
+    assert found(index, 'ptok') == {0}
+    assert found(index, '77001') == {0}
+
+
+def test_no_match(index):
+    assert found(index, 'nobody') == set()
+    assert found(index, '   ') == set()
+
+
+def test_trigrams():
+    assert trigrams('abcd') == {'abc', 'bcd'}
+    assert trigrams('ab') == set()
+
+
+def test_search_outage_is_503(monkeypatch):
+    index = pytest.importorskip('index')
+    market = index.Market('USDT', 'DOWN')
+
+    def unavailable(*args):
+        raise RuntimeError('db down')
+
+    monkeypatch.setattr(index.db_manager, 'search_offers', unavailable)
+    response = index.search_response('trader_1', None, index.datetime.now(), {}, False, market)
+
+    assert response['statusCode'] == 503
+    for side_name in ('sell', 'buy'):
+        index.db_cache.pop(f'{market.key}:{side_name}', None)